@@ -2,15 +2,54 @@
 ASGI config for scraty project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Next to the Django application it serves the boards' Server-Sent Events
+streams and exports, which don't fit Django's request/response cycle.
+
+Run it with uvicorn workers under gunicorn, e.g.::
+
+    gunicorn scraty.asgi:application -k uvicorn.workers.UvicornWorker \
+        --workers 1 --bind 0.0.0.0:8000
+
+The board's read views are async and don't hold a thread while responses are
+sent to slow clients; the other views run on Django's thread pool. Event
+streams only see the writes of their own worker with the default in-process
+event broker, see the EVENT_BROKER setting. Browsers still poll every minute,
+so multiple workers are fine, but a single worker gives the quickest updates.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
 import os
+import re
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "scraty.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from story.events import events_application  # noqa: E402 isort:skip
+from story.transfer import export_application  # noqa: E402 isort:skip
+
+# Paths of the default board and of the boards under /boards/.
+EVENTS_PATH = re.compile(r"(?:/boards/(?P<board>[-a-zA-Z0-9_]+))?/stories/events/")
+EXPORT_PATH = re.compile(r"(?:/boards/(?P<board>[-a-zA-Z0-9_]+))?/export/")
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http":
+        path = scope["path"]
+        script_name = settings.FORCE_SCRIPT_NAME or scope.get("root_path", "")
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name) :]
+        for pattern, app in [
+            (EVENTS_PATH, events_application),
+            (EXPORT_PATH, export_application),
+        ]:
+            match = pattern.fullmatch(path)
+            if match and scope["method"] == "GET":
+                board = match["board"] or settings.DEFAULT_BOARD
+                return await app(scope, receive, send, board)
+    return await django_application(scope, receive, send)
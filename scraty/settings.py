@@ -33,10 +33,14 @@ ALLOWED_HOSTS = [h for h in os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",") if
 # Application definition
 
 INSTALLED_APPS = [
+    "django.contrib.staticfiles",
     "story.apps.StoryConfig",
 ]
 
 MIDDLEWARE = [
+    "story.middleware.PerformanceMiddleware",
+    "story.middleware.ReplicaMiddleware",
+    "story.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -69,6 +73,62 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": os.getenv("DJANGO_DATABASE_URL", os.path.join(BASE_DIR, "db.sqlite3")),
+        "TEST": {"NAME": os.getenv("DJANGO_TEST_DATABASE_URL")},
+    }
+}
+
+# Pragmas applied to every new SQLite connection, see story.db. The production
+# profile allows concurrent readers while a worker writes and makes writers
+# wait for each other instead of failing with "database is locked".
+SQLITE_PRAGMAS = {}
+
+if os.getenv("DJANGO_SQLITE_TUNING", "false").lower() in {"true", "yes", "1"}:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.getenv("DJANGO_DATABASE_CONN_MAX_AGE", "600")
+    )
+    SQLITE_PRAGMAS = {
+        "journal_mode": os.getenv("DJANGO_SQLITE_JOURNAL_MODE", "wal"),
+        "synchronous": os.getenv("DJANGO_SQLITE_SYNCHRONOUS", "normal"),
+        "busy_timeout": int(os.getenv("DJANGO_SQLITE_BUSY_TIMEOUT", "5000")),
+        "mmap_size": int(os.getenv("DJANGO_SQLITE_MMAP_SIZE", str(256 * 1024 ** 2))),
+        # Negative values are in KiB.
+        "cache_size": int(os.getenv("DJANGO_SQLITE_CACHE_SIZE", "-20000")),
+    }
+
+
+# Read replicas
+# Comma-separated SQLite files copied from the primary database, e.g. by
+# replication or "sqlite3 db.sqlite3 '.backup replica.sqlite3'" to try it
+# out locally. The board's read views read from a random one, see
+# story.routers. Clients stay on the primary database for
+# REPLICA_STICKY_SECONDS after writing, so that they read their own writes
+# despite replication lag.
+
+DATABASE_REPLICAS = []
+for name in os.getenv("DJANGO_DATABASE_REPLICAS", "").split(","):
+    if name:
+        alias = f"replica{len(DATABASE_REPLICAS) + 1}"
+        # Tests read the test database instead.
+        DATABASES[alias] = dict(
+            DATABASES["default"], NAME=name, TEST={"MIRROR": "default"}
+        )
+        DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["story.routers.ReplicaRouter"]
+
+REPLICA_STICKY_SECONDS = int(os.getenv("DJANGO_REPLICA_STICKY_SECONDS", "5"))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Holds the encoded board snapshot, see story.views.get_cached_board_snapshot.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", ""),
     }
 }
 
@@ -90,6 +150,53 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
-STATIC_URL = "/static/"
+# Static files are served by story.views.static_view, precompressed and with
+# hashed names, once collected with "manage.py collectstatic". Third-party
+# assets are vendored with "manage.py vendor_assets", see story.assets.
+
+STATIC_URL = "static/"
+
+STATIC_ROOT = os.getenv("DJANGO_STATIC_ROOT", os.path.join(BASE_DIR, "static"))
+
+STATICFILES_STORAGE = "story.storage.CompressedManifestStaticFilesStorage"
+
+# Cache lifetime in seconds of static files without a hash in their name.
+STATIC_MAX_AGE = int(os.getenv("DJANGO_STATIC_MAX_AGE", "300"))
+
+# Load the third-party assets that haven't been vendored from the CDN, by
+# default only with DEBUG. Otherwise missing vendored assets fail the system
+# checks and the page.
+ASSETS_CDN_FALLBACK = os.getenv(
+    "DJANGO_ASSETS_CDN_FALLBACK", "true" if DEBUG else "false"
+).lower() in {"true", "yes", "1"}
 
 FORCE_SCRIPT_NAME = os.getenv("DJANGO_FORCE_SCRIPT_NAME") or None
+
+# Boards
+# Slug of the board served at the root URL. Other boards are served under
+# /boards/<slug>/, see story.models.Board.
+
+DEFAULT_BOARD = os.getenv("DJANGO_DEFAULT_BOARD", "default")
+
+
+# Compression
+# JSON and plain text responses of at least this many bytes are compressed,
+# see story.middleware.CompressionMiddleware.
+
+COMPRESSION_MIN_SIZE = int(os.getenv("DJANGO_COMPRESSION_MIN_SIZE", "1024"))
+
+# Live updates
+# Dotted path to the broker fanning out board changes to the event stream
+# served by scraty.asgi. See story.events.InProcessBroker.
+
+EVENT_BROKER = os.getenv("DJANGO_EVENT_BROKER", "story.events.InProcessBroker")
+
+
+# Performance metrics
+# Requests taking at least this many milliseconds are logged with their SQL,
+# see story.middleware.PerformanceMiddleware. An empty value disables this.
+
+SLOW_REQUEST_THRESHOLD = os.getenv("DJANGO_SLOW_REQUEST_THRESHOLD", "500")
+SLOW_REQUEST_THRESHOLD = (
+    float(SLOW_REQUEST_THRESHOLD) if SLOW_REQUEST_THRESHOLD else None
+)
@@ -13,24 +13,69 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path
 
 from story.views import (
+    archive_cards_detail_view,
+    archive_stories_detail_view,
+    archive_stories_view,
+    burndown_view,
+    cards_bulk_view,
     cards_detail_view,
     cards_move_view,
     cards_view,
+    export_view,
+    import_view,
     index,
+    metrics_view,
+    search_view,
+    slow_requests_view,
+    static_view,
+    stats_view,
+    stories_changes_view,
     stories_detail_view,
     stories_view,
+    sync_view,
     users,
 )
 
-urlpatterns = [
+# The views of a board, which get the board's slug as ``board``.
+board_urlpatterns = [
     path("", index, name="index"),
+    path(
+        "archive/cards/<uuid:id>/",
+        archive_cards_detail_view,
+        name="archive_cards_detail",
+    ),
+    path("archive/stories/", archive_stories_view, name="archive_stories"),
+    path(
+        "archive/stories/<uuid:id>/",
+        archive_stories_detail_view,
+        name="archive_stories_detail",
+    ),
     path("cards/", cards_view, name="cards"),
+    path("cards/bulk/", cards_bulk_view, name="cards_bulk"),
     path("cards/<id>/", cards_detail_view, name="cards_detail"),
     path("cards/<id>/move/", cards_move_view, name="cards_move"),
+    path("export/", export_view, name="export"),
+    path("import/", import_view, name="import"),
+    path("search/", search_view, name="search"),
+    path("stats/", stats_view, name="stats"),
+    path("stats/burndown/", burndown_view, name="burndown"),
     path("stories/", stories_view, name="stories"),
+    path("stories/changes/", stories_changes_view, name="stories_changes"),
     path("stories/<id>/", stories_detail_view, name="stories_detail"),
+    path("sync/", sync_view, name="sync"),
+]
+
+urlpatterns = [
+    path("boards/<slug:board>/", include(board_urlpatterns)),
+    path("metrics/", metrics_view, name="metrics"),
+    path("metrics/slow/", slow_requests_view, name="slow_requests"),
+    path("static/<path:path>", static_view, name="static"),
     path("users/", users, name="users"),
+    # The default board is served at the root, reverse() its URLs without
+    # passing a board.
+    path("", include(board_urlpatterns), {"board": settings.DEFAULT_BOARD}),
 ]
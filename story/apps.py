@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class StoryConfig(AppConfig):
     name = "story"
+    default_auto_field = "django.db.models.AutoField"
+
+    def ready(self):
+        from . import db  # noqa: F401
+        from .assets import check_vendored_assets
+
+        checks.register(check_vendored_assets)
@@ -0,0 +1,64 @@
+"""Third-party frontend assets.
+
+They are downloaded into the story app's static files with the vendor_assets
+management command, e.g. for networks without access to the CDN. Assets that
+haven't been vendored are loaded from jsDelivr only if the
+``ASSETS_CDN_FALLBACK`` setting is enabled, which it is with ``DEBUG``.
+"""
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.checks import Error
+
+CDN_URL = "https://cdn.jsdelivr.net/npm/"
+
+# Static files path of the vendored assets, relative to the CDN_URL.
+VENDOR_PATH = "story/vendor/"
+VENDOR_ROOT = os.path.join(os.path.dirname(__file__), "static", VENDOR_PATH)
+
+# Path on the CDN and Subresource Integrity hash. The fonts are only loaded by
+# foundation-icons.css, which needs them next to it once vendored.
+ASSETS = {
+    "foundation-sites@6.6.3/dist/css/foundation.min.css": (
+        "sha256-ogmFxjqiTMnZhxCqVmcqTvjfe1Y/ec4WaRj/aQPvn+I="
+    ),
+    "foundation-icons@1.0.1/foundation-icons.css": (
+        "sha256-CWltC/W+elkkUKhitcztPiSfE3AEpzAvrkmEqB68Lx0="
+    ),
+    "foundation-icons@1.0.1/foundation-icons.eot": None,
+    "foundation-icons@1.0.1/foundation-icons.svg": None,
+    "foundation-icons@1.0.1/foundation-icons.ttf": None,
+    "foundation-icons@1.0.1/foundation-icons.woff": None,
+    "jquery@3.5.0/dist/jquery.min.js": (
+        "sha256-xNzN2a4ltkB44Mc/Jz3pT4iU1cmeR0FkXs4pru/JxaQ="
+    ),
+    "js-cookie@2.2.1/src/js.cookie.min.js": (
+        "sha256-Obj+Y2RiFyX/kEMaNK8Ph5dtlcAMv9HQ83EaPx+hoHs="
+    ),
+    "vue@2.6.11/dist/vue.js": "sha256-NSuqgY2hCZJUN6hDMFfdxvkexI7+iLxXQbL540RQ/c4=",
+    "vue@2.6.11/dist/vue.min.js": "sha256-ngFW3UnAN0Tnm76mDuu7uUtYEcG3G5H1+zioJw3t+68=",
+}
+
+
+def missing_assets():
+    """Return the names of the assets that haven't been vendored."""
+    return [name for name in ASSETS if finders.find(VENDOR_PATH + name) is None]
+
+
+def check_vendored_assets(app_configs, **kwargs):
+    if settings.ASSETS_CDN_FALLBACK:
+        return []
+    missing = missing_assets()
+    if not missing:
+        return []
+    return [
+        Error(
+            f"{len(missing)} third-party assets are not vendored, e.g. {missing[0]}.",
+            hint=(
+                "Run 'manage.py vendor_assets', or set DJANGO_ASSETS_CDN_FALLBACK "
+                "to load them from the CDN."
+            ),
+            id="story.E001",
+        )
+    ]
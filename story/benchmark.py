@@ -0,0 +1,498 @@
+"""Seeding of synthetic boards and a benchmark of the board's HTTP API.
+
+The benchmark runs either in-process against Django's test client, where it
+also counts the queries per request, or against a running server. The
+throughput of the read endpoints under concurrent clients can only be measured
+against a running server, e.g. to compare WSGI with ASGI workers.
+
+``measure_compression()`` reports the compressed sizes of the board snapshot
+and the CPU time spent compressing it.
+"""
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .compression import compress, get_encodings
+from .models import Board, Card, Story, User
+from .ranks import rank_between
+from .search import update_index
+from .serializers import dumps, serialize_board
+from .stats import update_counts
+
+
+def seed_board(
+    stories=50, cards_per_story=10, users=10, done_ratio=0.2, seed=0, board=None
+):
+    """Create a synthetic board, by default on the ``DEFAULT_BOARD``.
+
+    ``done_ratio`` is the share of stories and cards that are soft-deleted, as
+    if the board had been in use for a while: they were deleted over the last
+    60 days, so that compacting the board archives some of them.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    board = board or settings.DEFAULT_BOARD
+    with transaction.atomic():
+        Board.objects.get_or_create(pk=board)
+        revision = Board.bump(board)
+        user_objs = [
+            User(name=f"user-{seed}-{i}", color=f"{rng.randrange(0x1000000):06x}")
+            for i in range(users)
+        ]
+        # Seeding again with the same seed reuses the users.
+        User.objects.bulk_create(user_objs, ignore_conflicts=True)
+        Board.users_changed()
+        story_objs = []
+        card_objs = []
+        # The last rank of each column.
+        ranks = {}
+        for i in range(stories):
+            done = rng.random() < done_ratio
+            story = Story(
+                board_id=board,
+                title=f"Story {i}",
+                link=f"https://example.com/{i}",
+                done=done,
+                done_at=now - timedelta(days=rng.randrange(60)) if done else None,
+                revision=revision,
+            )
+            story_objs.append(story)
+            for j in range(cards_per_story):
+                done = rng.random() < done_ratio
+                status = rng.choice(Card.Status.values)
+                column = (i, status)
+                ranks[column] = rank_between(ranks.get(column), None)
+                card_objs.append(
+                    Card(
+                        board_id=board,
+                        story=story,
+                        text=f"Card {j} of story {i}",
+                        status=status,
+                        rank=ranks[column],
+                        user=rng.choice(user_objs + [None]) if user_objs else None,
+                        done=done,
+                        done_at=now - timedelta(days=rng.randrange(60))
+                        if done
+                        else None,
+                        revision=revision,
+                    )
+                )
+        Story.objects.bulk_create(story_objs)
+        Card.objects.bulk_create(card_objs, batch_size=500)
+        update_index(story_objs + card_objs)
+        update_counts(added=card_objs)
+    return len(story_objs), len(card_objs)
+
+
+class ClientTarget:
+    """Send requests through Django's test client."""
+
+    name = "client"
+    counts_queries = True
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=b"", content_type=None, headers=None):
+        extra = {
+            f"HTTP_{key.upper().replace('-', '_')}": value
+            for key, value in (headers or {}).items()
+        }
+        response = self.client.generic(
+            method,
+            path,
+            data,
+            content_type or "application/octet-stream",
+            **extra,
+        )
+        body = b"".join(response) if response.streaming else response.content
+        return response.status_code, dict(response.items()), body
+
+
+class HTTPTarget:
+    """Send requests to a running server, e.g. gunicorn."""
+
+    counts_queries = False
+
+    def __init__(self, url):
+        self.name = self.url = url.rstrip("/")
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+        # Fetch the CSRF cookie set by the index view.
+        self.request("GET", "/")
+
+    def request(self, method, path, data=b"", content_type=None, headers=None):
+        headers = dict(headers or {})
+        if content_type:
+            headers["Content-Type"] = content_type
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                headers["X-CSRFToken"] = cookie.value
+        if isinstance(data, str):
+            data = data.encode()
+        request = Request(
+            self.url + path, data=data or None, headers=headers, method=method
+        )
+        try:
+            with self.opener.open(request) as response:
+                return response.status, dict(response.headers), response.read()
+        except HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+
+FORM = "application/x-www-form-urlencoded"
+
+
+class Benchmark:
+    def __init__(self, target, requests=50):
+        self.target = target
+        self.requests = requests
+        status, headers, body = target.request("GET", reverse("stories"))
+        board = json.loads(body)
+        self.stories = [story["id"] for story in board["stories"]]
+        self.cards = [
+            (story["id"], card["id"])
+            for story in board["stories"]
+            for card in story["cards"]
+        ]
+        if not self.stories or not self.cards:
+            raise ValueError("The board needs at least one story with a card.")
+        self.rng = random.Random(0)
+
+    def new_story(self):
+        status, headers, body = self.target.request(
+            "POST", reverse("stories"), urlencode({"title": "Benchmark"}), FORM
+        )
+        return json.loads(body)["id"]
+
+    def new_card(self):
+        story = self.rng.choice(self.stories)
+        data = urlencode({"story": story, "status": "TODO", "text": "Benchmark"})
+        status, headers, body = self.target.request(
+            "POST", reverse("cards"), data, FORM
+        )
+        return story, json.loads(body)["id"]
+
+    def card_form(self, story):
+        return urlencode(
+            {
+                "story": story,
+                "status": self.rng.choice(Card.Status.values),
+                "text": "Benchmark",
+                "user": "benchmark",
+            }
+        )
+
+    def scenarios(self):
+        """Yield ``(name, prepare)`` for each benchmarked endpoint.
+
+        ``prepare()`` may issue untimed requests and returns the arguments of
+        the timed request.
+        """
+        yield "index", lambda: ("GET", reverse("index"))
+
+        def stories_etag():
+            status, headers, body = self.target.request("GET", reverse("stories"))
+            etag = {k.lower(): v for k, v in headers.items()}["etag"]
+            return "GET", reverse("stories"), b"", None, {"If-None-Match": etag}
+
+        yield "stories", lambda: ("GET", reverse("stories"))
+        yield "stories (If-None-Match)", stories_etag
+        for encoding in get_encodings():
+            yield f"stories ({encoding})", lambda encoding=encoding: (
+                "GET",
+                reverse("stories"),
+                b"",
+                None,
+                {"Accept-Encoding": encoding},
+            )
+        yield "stories (limit=25)", lambda: ("GET", reverse("stories") + "?limit=25")
+        yield "stories (POST)", lambda: (
+            "POST",
+            reverse("stories"),
+            urlencode({"title": "Benchmark", "link": ""}),
+            FORM,
+        )
+        yield "stories_changes (since=0)", lambda: (
+            "GET",
+            reverse("stories_changes") + "?since=0",
+        )
+
+        def stories_changes_idle():
+            status, headers, body = self.target.request("GET", reverse("stories"))
+            cursor = json.loads(body)["cursor"]
+            return "GET", reverse("stories_changes") + f"?since={cursor}"
+
+        yield "stories_changes (idle)", stories_changes_idle
+        yield "stories_detail (PUT)", lambda: (
+            "PUT",
+            reverse("stories_detail", args=[self.rng.choice(self.stories)]),
+            urlencode({"title": "Benchmark", "link": ""}),
+            FORM,
+        )
+        yield "stories_detail (DELETE)", lambda: (
+            "DELETE",
+            reverse("stories_detail", args=[self.new_story()]),
+        )
+        yield "cards (POST)", lambda: (
+            "POST",
+            reverse("cards"),
+            self.card_form(self.rng.choice(self.stories)),
+            FORM,
+        )
+
+        def cards_detail_put():
+            story, card = self.rng.choice(self.cards)
+            return (
+                "PUT",
+                reverse("cards_detail", args=[card]),
+                self.card_form(story),
+                FORM,
+            )
+
+        yield "cards_detail (PUT)", cards_detail_put
+        yield "cards_detail (DELETE)", lambda: (
+            "DELETE",
+            reverse("cards_detail", args=[self.new_card()[1]]),
+        )
+
+        def cards_move():
+            story, card = self.rng.choice(self.cards)
+            data = {"story": story, "status": self.rng.choice(Card.Status.values)}
+            return "POST", reverse("cards_move", args=[card]), urlencode(data), FORM
+
+        yield "cards_move", cards_move
+
+        def cards_bulk():
+            operations = []
+            for story, card in self.rng.sample(self.cards, min(10, len(self.cards))):
+                data = {"story": story, "status": self.rng.choice(Card.Status.values)}
+                operations.append({"op": "move", "id": card, "data": data})
+            body = json.dumps({"operations": operations})
+            return "POST", reverse("cards_bulk"), body, "application/json"
+
+        yield "cards_bulk (10 moves)", cards_bulk
+
+        def sync():
+            # A story and cards created offline, and moves of other cards.
+            new_story = str(uuid.uuid4())
+            data = {"title": "Benchmark"}
+            operations = [
+                {"type": "story", "op": "create", "id": new_story, "data": data}
+            ]
+            for _ in range(4):
+                data = {"story": new_story, "status": "TODO", "text": "Benchmark"}
+                card = str(uuid.uuid4())
+                operations.append(
+                    {"type": "card", "op": "create", "id": card, "data": data}
+                )
+            for story, card in self.rng.sample(self.cards, min(5, len(self.cards))):
+                data = {"story": story, "status": self.rng.choice(Card.Status.values)}
+                operations.append(
+                    {"type": "card", "op": "move", "id": card, "data": data}
+                )
+            body = json.dumps({"operations": operations})
+            return "POST", reverse("sync"), body, "application/json"
+
+        yield "sync (10 operations)", sync
+        yield "search", lambda: ("GET", reverse("search") + "?q=story")
+        yield "stats", lambda: ("GET", reverse("stats"))
+        yield "stats_burndown", lambda: ("GET", reverse("burndown") + "?days=30")
+        yield "users", lambda: ("GET", reverse("users"))
+        yield "archive_stories", lambda: ("GET", reverse("archive_stories"))
+
+        # The archive is empty unless the board has been compacted.
+        stories, cards = self.archived()
+        if stories:
+            yield "archive_stories_detail", lambda: (
+                "GET",
+                reverse("archive_stories_detail", args=[self.rng.choice(stories)]),
+            )
+        if cards:
+            yield "archive_cards_detail", lambda: (
+                "GET",
+                reverse("archive_cards_detail", args=[self.rng.choice(cards)]),
+            )
+        yield "export", lambda: ("GET", reverse("export"))
+
+        # Import a copy of part of the board, which the board grows by.
+        body = self.partial_export(stories=10)
+        yield "import (10 stories)", lambda: (
+            "POST",
+            reverse("import") + "?new_ids=1",
+            body,
+            "application/x-ndjson",
+        )
+
+    def archived(self):
+        """Return the ids of the archived stories on the first page of the
+        archive and of their cards."""
+        status, headers, body = self.target.request("GET", reverse("archive_stories"))
+        stories = [story["id"] for story in json.loads(body)["stories"]]
+        cards = []
+        for story in stories[:10]:
+            url = reverse("archive_stories_detail", args=[story])
+            status, headers, body = self.target.request("GET", url)
+            cards += [card["id"] for card in json.loads(body)["cards"]]
+        return stories, cards
+
+    def partial_export(self, stories):
+        """Return the export of the board cut down to its first ``stories``
+        stories and their cards."""
+        status, headers, body = self.target.request("GET", reverse("export"))
+        story_ids = set()
+        lines = []
+        for line in body.splitlines():
+            row = json.loads(line)
+            if row["type"] == "story":
+                if len(story_ids) == stories:
+                    continue
+                story_ids.add(row["id"])
+            elif row["type"] == "card" and row["story"] not in story_ids:
+                continue
+            lines.append(line)
+        return b"\n".join(lines)
+
+    def measure(self, name, prepare):
+        timings = []
+        statuses = Counter()
+        queries = size = None
+        for i in range(self.requests + 1):
+            args = prepare()
+            # Fill in the defaults of data, content_type and headers.
+            args += (b"", None, {})[len(args) - 2 :]
+            method, path, data, content_type, headers = args
+            if i == 0:
+                # Count queries on a separate, untimed warm-up request, as
+                # capturing them slows down the request.
+                if not self.target.counts_queries:
+                    self.target.request(method, path, data, content_type, headers)
+                    continue
+                with CaptureQueriesContext(connection) as captured:
+                    status, _, body = self.target.request(
+                        method, path, data, content_type, headers
+                    )
+                queries = len(captured)
+                size = len(body)
+                continue
+            start = time.perf_counter()
+            status, _, body = self.target.request(
+                method, path, data, content_type, headers
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+            statuses[status] += 1
+            size = len(body)
+        return {
+            "name": name,
+            "method": method,
+            "requests": self.requests,
+            "status": dict(statuses),
+            "latency_ms": summarize(timings),
+            "queries": queries,
+            "bytes": size,
+        }
+
+    def run(self):
+        return [self.measure(name, prepare) for name, prepare in self.scenarios()]
+
+    def read_scenarios(self):
+        status, headers, body = self.target.request("GET", reverse("stories"))
+        etag = {k.lower(): v for k, v in headers.items()}["etag"]
+        cursor = json.loads(body)["cursor"]
+        yield "stories", ("GET", reverse("stories"))
+        yield "stories (If-None-Match)", (
+            "GET",
+            reverse("stories"),
+            b"",
+            None,
+            {"If-None-Match": etag},
+        )
+        yield "stories_changes (idle)", (
+            "GET",
+            reverse("stories_changes") + f"?since={cursor}",
+        )
+
+    def measure_throughput(self, name, args, concurrency):
+        args += (b"", None, {})[len(args) - 2 :]
+
+        def timed_request(i):
+            start = time.perf_counter()
+            status, _, body = self.target.request(*args)
+            return status, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            responses = list(executor.map(timed_request, range(self.requests)))
+        duration = time.perf_counter() - start
+        return {
+            "name": name,
+            "concurrency": concurrency,
+            "requests": self.requests,
+            "status": dict(Counter(status for status, _ in responses)),
+            "requests_per_second": round(self.requests / duration, 1),
+            "latency_ms": summarize([timing for _, timing in responses]),
+        }
+
+    def run_throughput(self, concurrency):
+        """Measure the read endpoints while ``concurrency`` clients wait for
+        responses at the same time. The target must be thread-safe."""
+        return [
+            self.measure_throughput(name, args, concurrency)
+            for name, args in self.read_scenarios()
+        ]
+
+
+def measure_compression(board, repeat=20):
+    """Compress the snapshot of a board with every supported content coding, at the
+    levels used for responses and at those used for static files.
+
+    Return the sizes in bytes and the mean CPU time per compression.
+    """
+    payload = dumps(serialize_board(board, Board.current(board)))
+    results = {"identity": {"bytes": len(payload)}}
+    for encoding in get_encodings():
+        for best in [False, True]:
+            start = time.process_time()
+            for i in range(repeat):
+                compressed = compress(payload, encoding, best=best)
+            cpu_time = (time.process_time() - start) / repeat
+            results[f"{encoding} (best)" if best else encoding] = {
+                "bytes": len(compressed),
+                "ratio": round(len(compressed) / len(payload), 3),
+                "cpu_ms": round(cpu_time * 1000, 3),
+            }
+    return results
+
+
+def percentile(values, p):
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    if not timings:
+        return {}
+    return {
+        "min": round(timings[0], 3),
+        "p50": round(percentile(timings, 50), 3),
+        "p90": round(percentile(timings, 90), 3),
+        "p99": round(percentile(timings, 99), 3),
+        "max": round(timings[-1], 3),
+        "mean": round(sum(timings) / len(timings), 3),
+    }
@@ -0,0 +1,227 @@
+import copy
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .forms import CardForm, CardMoveForm, StoryForm
+from .models import Board, Card, Story, User, user_cache
+from .ranks import place_cards
+from .search import update_index
+from .serializers import (
+    serialize_card,
+    serialize_card_change,
+    serialize_story,
+    serialize_story_change,
+)
+from .stats import update_counts
+
+STORY_FIELDS = ["title", "link", "done", "done_at", "revision"]
+CARD_FIELDS = ["text", "status", "story", "user", "rank", "done", "done_at", "revision"]
+
+MODELS = {"story": Story, "card": Card}
+FORMS = {
+    ("story", "create"): StoryForm,
+    ("story", "update"): StoryForm,
+    ("card", "create"): CardForm,
+    ("card", "update"): CardForm,
+    ("card", "move"): CardMoveForm,
+}
+SERIALIZERS = {"story": serialize_story, "card": serialize_card}
+CHANGE_SERIALIZERS = {"story": serialize_story_change, "card": serialize_card_change}
+
+
+def error(field, message, code="invalid"):
+    return {field: [{"message": message, "code": code}]}
+
+
+def parse_id(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def apply_operations(board, operations):
+    """Validate and apply a list of story and card operations to the board
+    with the slug ``board`` in one transaction, in order.
+
+    Each operation is a dict with a ``type`` of ``story`` or ``card``, an
+    ``op`` of ``create``, ``update``, ``move`` (cards only) or ``delete``, the
+    row's ``id`` and the form ``data`` as accepted by ``StoryForm``,
+    ``CardForm`` or ``CardMoveForm``. Creates may pass the ``id`` of the new
+    row, which makes replaying them harmless: creating an open row of the
+    board again is answered with the row. Invalid operations are skipped and
+    reported; all valid ones share one revision. Updates and moves whose data
+    has a ``revision`` the row is no longer at are reported as conflicts with
+    the current row.
+
+    Return the revision (``None`` if nothing was written), a result per
+    operation and the written stories and cards.
+    """
+    ids = defaultdict(set)
+    new_ids = defaultdict(set)
+    for operation in operations:
+        kind = operation.get("type")
+        if not isinstance(kind, str):
+            # Reported below.
+            continue
+        pk = parse_id(operation.get("id"))
+        ids[kind].add(pk)
+        if operation.get("op") == "create":
+            new_ids[kind].add(pk)
+    revision = None
+    with transaction.atomic():
+        # The open rows the operations refer to, updated as they are written.
+        rows = {}
+        # The ids of other rows, which creates can't take.
+        taken = {}
+        for kind, model in MODELS.items():
+            rows[kind] = {}
+            if kind in ids:
+                rows[kind] = model.objects.filter(
+                    board=board, done=False, pk__in=ids[kind] - {None}
+                ).in_bulk()
+            taken[kind] = set()
+            if new_ids[kind] - {None} - rows[kind].keys():
+                taken[kind] = set(
+                    model.objects.filter(pk__in=new_ids[kind]).values_list(
+                        "pk", flat=True
+                    )
+                )
+        # The cards as they are counted in the board's statistics.
+        counted = dict(rows["card"])
+        # Created stories are saved right away for cards to refer to them.
+        saved = {}
+        created = {}
+        changed = {"story": {}, "card": {}}
+        usernames = {}
+        placements = {}
+        results = []
+        for operation in operations:
+            kind = operation.get("type")
+            op = operation.get("op")
+            data = operation.get("data") or {}
+            if not isinstance(kind, str) or kind not in MODELS:
+                results.append({"status": 400, "errors": error("type", "Unknown.")})
+                continue
+            form_class = FORMS.get((kind, op)) if isinstance(op, str) else None
+            if form_class is None and op != "delete":
+                results.append({"status": 400, "errors": error("op", "Unknown.")})
+                continue
+            if not isinstance(data, dict):
+                results.append(
+                    {"status": 400, "errors": error("data", "Expected an object.")}
+                )
+                continue
+            pk = parse_id(operation.get("id"))
+            row = rows[kind].get(pk)
+            if op == "create":
+                if operation.get("id") is not None:
+                    if row is not None and not row.done:
+                        # Replayed.
+                        results.append({"status": 200, "type": kind, "id": pk})
+                        continue
+                    if pk is None:
+                        results.append(
+                            {
+                                "status": 400,
+                                "errors": error("id", "Enter a valid UUID."),
+                            }
+                        )
+                        continue
+                    if row is not None or pk in taken[kind]:
+                        results.append(
+                            {
+                                "status": 400,
+                                "errors": error("id", "Already exists.", "unique"),
+                            }
+                        )
+                        continue
+                form = form_class(data, board=board)
+                if pk is not None:
+                    form.instance.pk = pk
+            else:
+                if row is None or row.done:
+                    results.append({"status": 404, "errors": error("id", "Not found.")})
+                    continue
+                # Validate against a copy, failing forms modify their instance.
+                row = copy.copy(row)
+                if op == "delete":
+                    row.done = True
+                    row.done_at = timezone.now()
+                    rows[kind][pk] = row
+                    (created if pk in created else changed[kind])[pk] = row
+                    results.append({"status": 204, "id": str(pk)})
+                    continue
+                form = form_class(data, instance=row, board=board)
+
+            if not form.is_valid():
+                results.append({"status": 400, "errors": form.errors.get_json_data()})
+                continue
+            expected = form.cleaned_data["revision"]
+            if op != "create" and expected not in (None, row.revision):
+                current = CHANGE_SERIALIZERS[kind](rows[kind][pk])
+                results.append({"status": 409, kind: current})
+                continue
+            row = form.instance
+            row.board_id = board
+            rows[kind][row.pk] = row
+            results.append({"status": 200, "type": kind, "id": row.pk})
+            if kind == "story" and op == "create":
+                if revision is None:
+                    revision = Board.bump(board)
+                saved[row.pk] = form.save(revision=revision)
+                continue
+            if "user" in form.cleaned_data:
+                usernames[row.pk] = form.cleaned_data["user"]
+            if op == "move":
+                placements[row.pk] = form.placement()
+            if op == "create" or row.pk in created:
+                created[row.pk] = row
+            else:
+                changed[kind][row.pk] = row
+
+        stories = list({**saved, **changed["story"]}.values())
+        cards = list(created.values()) + list(changed["card"].values())
+        if cards or changed["story"]:
+            if revision is None:
+                # Bumping first also validates the user cache.
+                revision = Board.bump(board)
+            names = set(usernames.values()) - {""}
+            missing = [User(name=name) for name in names if name not in user_cache]
+            if missing:
+                User.objects.bulk_create(missing, ignore_conflicts=True)
+                Board.users_changed()
+
+            for row in cards + list(changed["story"].values()):
+                row.revision = revision
+                if row.pk in usernames:
+                    row.user_id = usernames[row.pk] or None
+            place_cards(cards, counted.values(), placements)
+            Story.objects.bulk_update(changed["story"].values(), STORY_FIELDS)
+            Card.objects.bulk_create(created.values())
+            Card.objects.bulk_update(changed["card"].values(), CARD_FIELDS)
+            update_index(list(changed["story"].values()) + cards)
+            update_counts([counted[pk] for pk in changed["card"]], cards)
+
+    # Report the resulting state of each row.
+    for result in results:
+        if result["status"] == 200:
+            kind = result.pop("type")
+            result[kind] = SERIALIZERS[kind](rows[kind][result.pop("id")])
+    return revision, results, stories, cards
+
+
+def apply_card_operations(board, operations):
+    """Validate and apply a list of card operations to the board with the slug
+    ``board`` in one transaction, see ``apply_operations()``; the operations
+    need no ``type``.
+
+    Return the revision (``None`` if nothing was written), a result per
+    operation and the written cards.
+    """
+    operations = [dict(operation, type="card") for operation in operations]
+    revision, results, _, cards = apply_operations(board, operations)
+    return revision, results, cards
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import F, sql
+from django.dispatch import receiver
+
+from .metrics import record_query
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply the ``SQLITE_PRAGMAS`` setting to every new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # The wrappers outlive reconnects of the same connection object.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def can_return_from_update(connection):
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor == "postgresql"
+
+
+def update_returning(queryset, **values):
+    """Like ``queryset.update(**values)``, but return the updated rows.
+
+    On PostgreSQL and SQLite 3.35+ this is a single ``UPDATE ... RETURNING``
+    statement. Other databases read the rows before and after the update,
+    so call it in a transaction there.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    manager = model._base_manager.db_manager(queryset.db)
+    if not can_return_from_update(connection):
+        pks = list(queryset.values_list("pk", flat=True))
+        manager.filter(pk__in=pks).update(**values)
+        return list(manager.filter(pk__in=pks))
+    # This is how QuerySet.update() builds its query.
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    update_sql, params = query.get_compiler(queryset.db).as_sql()
+    columns = ", ".join(
+        connection.ops.quote_name(field.column) for field in model._meta.concrete_fields
+    )
+    return list(manager.raw(f"{update_sql} RETURNING {columns}", params))
+
+
+def can_upsert(connection):
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 24)
+    return connection.vendor == "postgresql"
+
+
+def upsert(model, objs, unique_fields, update_fields=(), increment_fields=()):
+    """Insert the model instances ``objs``, updating existing rows with the
+    same ``unique_fields`` instead: ``update_fields`` are overwritten and
+    ``increment_fields`` are incremented by the instance's value.
+
+    On PostgreSQL and SQLite 3.24+ this is an ``INSERT ... ON CONFLICT``
+    statement per batch. Other databases update and insert row by row, so
+    call it in a transaction there.
+    """
+    if not objs:
+        return
+    using = model.objects.db
+    connection = connections[using]
+    manager = model._base_manager.db_manager(using)
+    if not can_upsert(connection):
+        attnames = {
+            name: model._meta.get_field(name).attname
+            for name in [*unique_fields, *update_fields, *increment_fields]
+        }
+        for obj in objs:
+            values = {
+                attnames[name]: getattr(obj, attnames[name]) for name in update_fields
+            }
+            values.update(
+                (name, F(name) + getattr(obj, attnames[name]))
+                for name in increment_fields
+            )
+            rows = manager.filter(
+                **{
+                    attnames[name]: getattr(obj, attnames[name])
+                    for name in unique_fields
+                }
+            )
+            if not rows.update(**values):
+                obj.save(force_insert=True, using=using)
+        return
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if not field.primary_key or getattr(objs[0], field.attname) is not None
+    ]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+
+    def column(name):
+        return quote(model._meta.get_field(name).column)
+
+    columns = ", ".join(quote(field.column) for field in fields)
+    placeholders = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    updates = ", ".join(
+        [f"{column(name)} = EXCLUDED.{column(name)}" for name in update_fields]
+        + [
+            f"{column(name)} = {table}.{column(name)} + EXCLUDED.{column(name)}"
+            for name in increment_fields
+        ]
+    )
+    conflict = ", ".join(column(name) for name in unique_fields)
+    batch_size = connection.ops.bulk_batch_size(fields, objs)
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start : start + batch_size]
+            params = [
+                field.get_db_prep_save(field.pre_save(obj, True), connection)
+                for obj in batch
+                for field in fields
+            ]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                params,
+            )
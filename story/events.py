@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Board
+
+KEEPALIVE_INTERVAL = 15
+SUBSCRIPTION_BUFFER = 100
+
+
+class Subscription:
+    """A queue of events for one client, bound to the event loop it was
+    created in. ``put()`` may be called from any thread."""
+
+    def __init__(self, broker, board):
+        self.broker = broker
+        self.board = board
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_BUFFER)
+
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow clients lose events. They notice the gap in the cursors and
+            # fetch the missing changes themselves.
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __enter__(self):
+        self.broker.add_subscription(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.broker.remove_subscription(self)
+
+
+class InProcessBroker:
+    """Fan out events to the subscribers of a board within the current process.
+
+    A broker needs ``publish(board, event)`` and ``subscribe(board)``, the
+    latter returning a context manager that yields an object with an async
+    ``get()`` method.
+    Deployments with more than one ASGI worker process need a broker backed by
+    a shared service, e.g. Redis pub/sub, configured via ``EVENT_BROKER``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def publish(self, board, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(board, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, board):
+        return Subscription(self, board)
+
+    def add_subscription(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.board, set()).add(subscription)
+
+    def remove_subscription(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.board, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.board, None)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENT_BROKER)()
+
+
+@receiver(setting_changed)
+def reset_broker(*, setting, **kwargs):
+    if setting == "EVENT_BROKER":
+        get_broker.cache_clear()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def events_application(scope, receive, send, board):
+    """ASGI application streaming the changes of the board with the slug
+    ``board`` as Server-Sent Events.
+
+    Each event has the same shape as a response of ``stories_changes_view``.
+    """
+    try:
+        await sync_to_async(Board.current)(board)
+    except Board.DoesNotExist:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 404,
+                "headers": [(b"content-type", b"text/plain")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"Not found"})
+        return
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    with get_broker().subscribe(board) as subscription:
+        event = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {event, disconnected},
+                    timeout=KEEPALIVE_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    break
+                if event in done:
+                    body = f"data: {json.dumps(event.result())}\n\n"
+                    event = asyncio.ensure_future(subscription.get())
+                else:
+                    body = ": keepalive\n\n"
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": body.encode(),
+                        "more_body": True,
+                    }
+                )
+        finally:
+            event.cancel()
+            disconnected.cancel()
+    await send({"type": "http.response.body", "body": b""})
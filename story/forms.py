@@ -1,31 +1,192 @@
 from django import forms
+from django.db import transaction
 
-from .models import Card, Story, User
+from .db import update_returning
+from .models import Board, Card, Story, User, user_cache
+from .ranks import place_cards
+from .search import update_index
+from .stats import get_counted, update_counts
 
 
-class StoryForm(forms.ModelForm):
+class Conflict(Exception):
+    """The row was written after the revision the client based its changes on.
+    ``instance`` is the current row."""
+
+    def __init__(self, instance):
+        super().__init__(instance)
+        self.instance = instance
+
+
+class BoardFormMixin:
+    """Write to the board with the slug ``board`` and bump its version
+    whenever the form writes to the database.
+
+    The new version is recorded as the instance's ``revision`` so that
+    clients can fetch changes since a given version. The written row is
+    indexed for search and counted in the board's statistics in the same
+    transaction. As every write changes it, the revision doubles as the row's
+    version for optimistic concurrency control, see ``update()``. Stories of
+    other boards are not valid choices.
+    """
+
+    # Model fields set by prepare_instance() next to the form's fields.
+    prepared_fields = []
+    # The written row as it was before, if it is an open card.
+    previous = ()
+
+    def __init__(self, *args, board, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.board = board
+        # The revision the client based its changes on, see update().
+        self.fields["revision"] = forms.IntegerField(required=False, min_value=0)
+        if "story" in self.fields:
+            self.fields["story"].queryset = Story.objects.filter(board=board)
+
+    def save(self, commit=True, revision=None):
+        """Save the instance. Pass the ``revision`` of a write that already
+        bumped the board's version to make the row part of it."""
+        if not commit:
+            self.prepare_instance()
+            return super().save(commit=False)
+        with transaction.atomic():
+            # Bumping first also validates the user cache.
+            if revision is None:
+                revision = Board.bump(self.board)
+            self.instance.revision = revision
+            removed = []
+            if not self.instance._state.adding:
+                removed = get_counted(self._meta.model, [self.instance.pk])
+            self.previous = removed
+            self.prepare_instance()
+            instance = super().save(commit=True)
+            update_index([instance])
+            update_counts(removed, [instance])
+        return instance
+
+    def update(self, pk):
+        """Write the form's fields to the open row ``pk`` with a single UPDATE
+        and return the updated row; the form needs no instance.
+
+        If the client sent a ``revision`` and the row was written since,
+        ``Conflict`` is raised. If there is no such open row, the model's
+        ``DoesNotExist`` is raised.
+        """
+        model = self._meta.model
+        rows = model.objects.filter(pk=pk, board=self.board, done=False)
+        if self.cleaned_data.get("revision") is not None:
+            rows = rows.filter(revision=self.cleaned_data["revision"])
+        fields = [
+            model._meta.get_field(name)
+            for name in list(self._meta.fields) + self.prepared_fields
+        ]
+        with transaction.atomic():
+            self.instance.pk = model._meta.pk.to_python(pk)
+            self.instance.revision = Board.bump(self.board)
+            removed = self.previous = get_counted(model, [pk])
+            self.prepare_instance()
+            values = {
+                field.attname: getattr(self.instance, field.attname) for field in fields
+            }
+            updated = update_returning(rows, revision=self.instance.revision, **values)
+            if not updated:
+                # Roll back the bump.
+                current = model.objects.filter(
+                    pk=pk, board=self.board, done=False
+                ).first()
+                if current is None:
+                    raise model.DoesNotExist
+                raise Conflict(current)
+            update_index(updated)
+            update_counts(removed, updated)
+        return updated[0]
+
+    def prepare_instance(self):
+        """Hook to update the instance right before it is saved. Subclasses
+        must call it."""
+        self.instance.board_id = self.board
+
+
+class StoryForm(BoardFormMixin, forms.ModelForm):
     class Meta:
         model = Story
         fields = ["link", "title"]
 
 
-class CardForm(forms.ModelForm):
+class CardForm(BoardFormMixin, forms.ModelForm):
     user = forms.CharField(required=False)
 
+    prepared_fields = ["user", "rank"]
+
     class Meta:
         model = Card
         fields = ["status", "story", "text"]
 
-    def save(self, commit=True):
+    def prepare_instance(self):
+        super().prepare_instance()
         username = self.cleaned_data.get("user")
-        if username:
-            self.instance.user, _ = User.objects.get_or_create(name=username)
-        else:
+        if not username:
             self.instance.user = None
-        return super().save(commit=commit)
+        elif username in user_cache:
+            self.instance.user_id = username
+        else:
+            self.instance.user, _ = User.objects.get_or_create(name=username)
+        place_cards([self.instance], self.previous)
+
 
+class CardMoveForm(BoardFormMixin, forms.ModelForm):
+    """Move a card to a column, between the cards ``after`` and ``before``
+    if given, e.g. to reorder the column. Otherwise the card stays where it is
+    in its column or goes to the end of another."""
+
+    after = forms.UUIDField(required=False)
+    before = forms.UUIDField(required=False)
+
+    prepared_fields = ["rank"]
 
-class CardMoveForm(forms.ModelForm):
     class Meta:
         model = Card
         fields = ["status", "story"]
+
+    def placement(self):
+        return self.cleaned_data.get("after"), self.cleaned_data.get("before")
+
+    def prepare_instance(self):
+        super().prepare_instance()
+        place_cards(
+            [self.instance], self.previous, {self.instance.pk: self.placement()}
+        )
+
+
+class BoardFilterForm(forms.Form):
+    """Query parameters narrowing down the board returned by stories_view.
+
+    Stories are ordered by id; ``after`` is the id of the last story of the
+    previous page, so that pages don't shift as stories are added or removed.
+    """
+
+    MAX_LIMIT = 200
+
+    user = forms.CharField(required=False)
+    status = forms.MultipleChoiceField(choices=Card.Status.choices, required=False)
+    q = forms.CharField(required=False)
+    after = forms.UUIDField(required=False)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=MAX_LIMIT)
+
+
+class SearchForm(forms.Form):
+    """Query parameters of search_view."""
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 50
+
+    q = forms.CharField()
+    limit = forms.IntegerField(required=False, min_value=1, max_value=MAX_LIMIT)
+
+
+class BurndownForm(forms.Form):
+    """Query parameters of burndown_view."""
+
+    DEFAULT_DAYS = 14
+    MAX_DAYS = 366
+
+    days = forms.IntegerField(required=False, min_value=1, max_value=MAX_DAYS)
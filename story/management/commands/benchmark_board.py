@@ -0,0 +1,84 @@
+import json
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from story.benchmark import Benchmark, ClientTarget, HTTPTarget, seed_board
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every endpoint of the board API and print the results as "
+        "JSON. Without --url, a synthetic board is seeded and compacted into a "
+        "throwaway test database and requests go through Django's test client. "
+        "With --url, requests go to a running server, whose board must have "
+        "been seeded with seed_board beforehand, and compacted with "
+        "compact_board for the archive to be benchmarked; the benchmark writes "
+        "to that board. "
+        "--concurrency additionally measures the throughput of the read "
+        "endpoints of a running server under concurrent clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Base URL of a running server.")
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--stories", type=int, default=50)
+        parser.add_argument("--cards-per-story", type=int, default=10)
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--done-ratio", type=float, default=0.2)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=0,
+            help="Number of concurrent clients, requires --url.",
+        )
+        parser.add_argument("--output", help="Write the results to this file.")
+
+    def handle(self, *args, url, requests, concurrency, output, **options):
+        if concurrency and not url:
+            raise CommandError("--concurrency requires --url.")
+        board = {
+            "stories": options["stories"],
+            "cards_per_story": options["cards_per_story"],
+            "users": options["users"],
+            "done_ratio": options["done_ratio"],
+        }
+        if url:
+            board = None
+            benchmark = Benchmark(HTTPTarget(url), requests)
+            results = benchmark.run()
+            if concurrency:
+                throughput = benchmark.run_throughput(concurrency)
+        else:
+            results = self.run_offline(board, requests)
+        report = {
+            "target": url or "client",
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "board": board,
+            "results": results,
+        }
+        if concurrency:
+            report["throughput"] = throughput
+        data = json.dumps(report, indent=2)
+        if output:
+            with open(output, "w") as f:
+                f.write(data)
+        else:
+            self.stdout.write(data)
+
+    def run_offline(self, board, requests):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seed_board(**board)
+            call_command("compact_board", stdout=StringIO())
+            hosts = settings.ALLOWED_HOSTS + ["testserver"]
+            with override_settings(ALLOWED_HOSTS=hosts):
+                return Benchmark(ClientTarget(), requests).run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
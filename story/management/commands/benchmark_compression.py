@@ -0,0 +1,49 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from story.benchmark import measure_compression, seed_board
+from story.models import Card, Story
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the bytes on the wire and the CPU time of compressing the "
+        "board snapshot for synthetic boards of different sizes as JSON. The "
+        "boards are seeded into a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stories",
+            type=int,
+            nargs="+",
+            default=[10, 50, 200, 1000],
+            help="Number of stories of each board (default: 10 50 200 1000).",
+        )
+        parser.add_argument("--cards-per-story", type=int, default=10)
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, stories, cards_per_story, users, repeat, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = []
+        try:
+            for seed, count in enumerate(stories):
+                Card.objects.all().delete()
+                Story.objects.all().delete()
+                seed_board(count, cards_per_story, users, seed=seed)
+                results.append(
+                    {
+                        "stories": count,
+                        "cards_per_story": cards_per_story,
+                        "encodings": measure_compression(
+                            settings.DEFAULT_BOARD, repeat
+                        ),
+                    }
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps({"results": results}, indent=2))
@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from story.models import ArchivedCard, ArchivedStory, Card, Story
+
+
+def archive_card(card):
+    return ArchivedCard(
+        id=card.pk,
+        board_id=card.board_id,
+        text=card.text,
+        story_id=card.story_id,
+        user_name=card.user_id or "",
+        status=card.status,
+        done_at=card.done_at,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stories and cards that were deleted before the retention window "
+        "into the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Keep deleted stories and cards for this many days (default: 30).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of stories or cards moved per transaction (default: 500).",
+        )
+
+    def handle(self, *args, days, batch_size, **options):
+        cutoff = timezone.now() - timedelta(days=days)
+
+        stories_count = cards_count = 0
+        while True:
+            with transaction.atomic():
+                stories = list(
+                    Story.objects.filter(done=True, done_at__lt=cutoff)[:batch_size]
+                )
+                if not stories:
+                    break
+                # All cards of a deleted story go, whether deleted or not.
+                cards = list(Card.objects.filter(story__in=stories))
+                ArchivedStory.objects.bulk_create(
+                    ArchivedStory(
+                        id=story.pk,
+                        board_id=story.board_id,
+                        title=story.title,
+                        link=story.link,
+                        done_at=story.done_at,
+                    )
+                    for story in stories
+                )
+                ArchivedCard.objects.bulk_create(archive_card(card) for card in cards)
+                Card.objects.filter(pk__in=[card.pk for card in cards]).delete()
+                Story.objects.filter(pk__in=[story.pk for story in stories]).delete()
+            stories_count += len(stories)
+            cards_count += len(cards)
+
+        while True:
+            with transaction.atomic():
+                cards = list(
+                    Card.objects.filter(done=True, done_at__lt=cutoff)[:batch_size]
+                )
+                if not cards:
+                    break
+                ArchivedCard.objects.bulk_create(archive_card(card) for card in cards)
+                Card.objects.filter(pk__in=[card.pk for card in cards]).delete()
+            cards_count += len(cards)
+
+        self.stdout.write(
+            f"Archived {stories_count} stories and {cards_count} cards deleted "
+            f"before {cutoff:%Y-%m-%d %H:%M}."
+        )
@@ -0,0 +1,23 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_slug
+
+from story.models import Board
+
+
+class Command(BaseCommand):
+    help = "Create a board, which is then served under /boards/<slug>/."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug")
+        parser.add_argument("--name", default="")
+
+    def handle(self, *args, slug, name, **options):
+        try:
+            validate_slug(slug)
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+        board, created = Board.objects.get_or_create(pk=slug, defaults={"name": name})
+        if not created:
+            raise CommandError(f"The board '{slug}' exists already.")
+        self.stdout.write(f"Created the board '{board}'.")
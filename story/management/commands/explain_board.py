@@ -0,0 +1,65 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from story.views import board_snapshot_key
+
+EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = "Print the query plan of every query issued by the board's read views."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=int,
+            default=0,
+            help="Cursor passed to the changes view (default: 0).",
+        )
+        parser.add_argument(
+            "--board", help="Slug of the board (default: the DEFAULT_BOARD)."
+        )
+
+    def handle(self, *args, since, board, **options):
+        kwargs = {"board": board} if board else {}
+        requests = [
+            (reverse("stories", kwargs=kwargs), {}),
+            (reverse("stories_changes", kwargs=kwargs), {"since": since}),
+        ]
+        factory = RequestFactory()
+        prefix = connection.ops.explain_query_prefix()
+        for path, params in requests:
+            # Build the snapshot from the database rather than the cache.
+            match = resolve(path)
+            cache.delete(board_snapshot_key(match.kwargs["board"]))
+            recorder = QueryRecorder()
+            view = match.func
+            if asyncio.iscoroutinefunction(view):
+                view = async_to_sync(view)
+            with connection.execute_wrapper(recorder):
+                view(factory.get(path, params), *match.args, **match.kwargs)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"GET {path}"))
+            for sql, sql_params in recorder.queries:
+                if sql.split(None, 1)[0].upper() not in EXPLAINABLE:
+                    continue
+                self.stdout.write(f"  {sql}")
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{prefix} {sql}", sql_params)
+                    for row in cursor.fetchall():
+                        plan = " ".join(str(column) for column in row)
+                        self.stdout.write(f"    {plan}")
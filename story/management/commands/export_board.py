@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from story.models import Board
+from story.transfer import chunked, export_board
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the stories, cards and users of a board as NDJSON, e.g. to move "
+        "the board to another deployment with import_board."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "board", nargs="?", help="Slug of the board (default: the DEFAULT_BOARD)."
+        )
+        parser.add_argument("--output", help="Write the export to this file.")
+
+    def handle(self, *args, board, output, **options):
+        board = board or settings.DEFAULT_BOARD
+        try:
+            lines = export_board(board)
+        except Board.DoesNotExist:
+            raise CommandError(f"There is no board '{board}'.")
+        if output:
+            with open(output, "wb") as f:
+                for chunk in chunked(lines):
+                    f.write(chunk)
+        else:
+            for chunk in chunked(lines):
+                self.stdout.write(chunk.decode(), ending="")
@@ -0,0 +1,49 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_slug
+
+from story.models import Board
+from story.transfer import BATCH_SIZE, InvalidImport, import_board
+from story.views import board_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Import stories, cards and users exported with export_board into a "
+        "board, which is created if needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("board", help="Slug of the board.")
+        parser.add_argument(
+            "input", nargs="?", default="-", help="NDJSON file (default: stdin)."
+        )
+        parser.add_argument(
+            "--new-ids",
+            action="store_true",
+            help="Give stories and cards new ids, e.g. to import an export twice.",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, board, input, new_ids, batch_size, **options):
+        try:
+            validate_slug(board)
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+        Board.objects.get_or_create(pk=board)
+        f = sys.stdin.buffer if input == "-" else open(input, "rb")
+        try:
+            revision, counts = import_board(board, f, new_ids, batch_size)
+        except InvalidImport as e:
+            line = f"Line {e.line}: " if e.line else ""
+            raise CommandError(line + e.message)
+        finally:
+            if f is not sys.stdin.buffer:
+                f.close()
+        board_changed(board, revision)
+        self.stdout.write(
+            f"Imported {counts['story']} stories, {counts['card']} cards and "
+            f"{counts['user']} users into '{board}'."
+        )
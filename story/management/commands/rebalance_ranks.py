@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Length
+
+from story.models import Board, Card
+from story.ranks import REBALANCE_LENGTH, spread
+from story.views import board_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread out the ranks of the card columns whose ranks grew long from "
+        "reordering cards, e.g. periodically from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--board", help="Slug of the board to rebalance (default: all boards)."
+        )
+        parser.add_argument(
+            "--length",
+            type=int,
+            default=REBALANCE_LENGTH,
+            help=(
+                "Rebalance columns with ranks longer than this "
+                f"(default: {REBALANCE_LENGTH})."
+            ),
+        )
+
+    def handle(self, *args, board, length, **options):
+        cards = Card.objects.filter(done=False)
+        if board is not None:
+            cards = cards.filter(board=board)
+        columns = defaultdict(set)
+        rows = (
+            cards.annotate(rank_length=Length("rank"))
+            .filter(rank_length__gt=length)
+            .values_list("board", "story", "status")
+            .distinct()
+        )
+        for board, story, status in rows:
+            columns[board].add((story, status))
+
+        count = 0
+        for board, board_columns in columns.items():
+            # One transaction per board, which blocks writes to it meanwhile.
+            with transaction.atomic():
+                revision = Board.bump(board)
+                written = []
+                for story, status in board_columns:
+                    column = list(
+                        Card.objects.filter(
+                            board=board, story=story, status=status, done=False
+                        ).order_by("rank", "id")
+                    )
+                    for card, rank in zip(column, spread(len(column))):
+                        card.rank = rank
+                        card.revision = revision
+                    written += column
+                Card.objects.bulk_update(written, ["rank", "revision"], batch_size=500)
+                board_changed(board, revision, cards=written)
+            count += len(board_columns)
+        self.stdout.write(f"Rebalanced {count} columns of {len(columns)} boards.")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from story.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Index the open stories and cards for search from scratch, e.g. for "
+        "rows written before the search index existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--board", help="Slug of the board to reindex (default: all boards)."
+        )
+
+    def handle(self, *args, board, **options):
+        # Searches see the old index until the new one is complete.
+        with transaction.atomic():
+            count = rebuild_index(board)
+        self.stdout.write(f"Indexed {count} stories and cards.")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from story.benchmark import seed_board
+
+
+class Command(BaseCommand):
+    help = "Add a synthetic board to the database, e.g. for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stories", type=int, default=50)
+        parser.add_argument("--cards-per-story", type=int, default=10)
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--done-ratio",
+            type=float,
+            default=0.2,
+            help="Share of soft-deleted stories and cards (default: 0.2).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--board",
+            help="Slug of the board, created if needed (default: the DEFAULT_BOARD).",
+        )
+
+    def handle(self, *args, **options):
+        stories, cards = seed_board(
+            stories=options["stories"],
+            cards_per_story=options["cards_per_story"],
+            users=options["users"],
+            done_ratio=options["done_ratio"],
+            seed=options["seed"],
+            board=options["board"],
+        )
+        self.stdout.write(f"Created {stories} stories with {cards} cards.")
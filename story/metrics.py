@@ -0,0 +1,167 @@
+"""Process-local request metrics collected by ``PerformanceMiddleware``.
+
+Each worker process keeps its own numbers; when running several workers, every
+scrape of the metrics endpoint only reflects the worker that answered it.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+current_request = ContextVar("current_request", default=None)
+
+
+class RequestMetrics:
+    def __init__(self, record_sql=False):
+        self.record_sql = record_sql
+        self.queries = 0
+        self.db_time = 0.0
+        self.sql = []
+        self.timings = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if self.record_sql:
+                self.sql.append((sql, duration))
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper that forwards to the current request's metrics.
+
+    It is installed on every connection, see ``story.db``, rather than around
+    the request, as async views run their queries on other threads, each
+    with its own connection.
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+@contextmanager
+def timer(name):
+    """Add the time spent in the block to the current request's ``name``."""
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - start
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class ViewStats:
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.buckets = [0] * len(BUCKETS)
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.response_bytes = 0
+        self.timings = defaultdict(float)
+
+
+class Registry:
+    def __init__(self, slow_requests=50):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+        self.slow_requests = deque(maxlen=slow_requests)
+
+    def record(self, view, method, status, duration, metrics, size):
+        with self.lock:
+            stats = self.views[view]
+            stats.requests[(method, status)] += 1
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+            stats.duration += duration
+            stats.queries += metrics.queries
+            stats.db_time += metrics.db_time
+            stats.response_bytes += size or 0
+            for name, value in metrics.timings.items():
+                stats.timings[name] += value
+
+    def add_slow_request(self, sample):
+        with self.lock:
+            self.slow_requests.append(sample)
+
+    def get_slow_requests(self):
+        with self.lock:
+            return list(self.slow_requests)
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP scraty_{name} {help_text}")
+            lines.append(f"# TYPE scraty_{name} {kind}")
+
+        def sample(name, value, **labels):
+            label = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"scraty_{name}{{{label}}} {value}")
+
+        with self.lock:
+            views = sorted(self.views.items())
+
+            header("requests_total", "counter", "Requests by view, method and status.")
+            for view, stats in views:
+                for (method, status), n in sorted(stats.requests.items()):
+                    sample("requests_total", n, view=view, method=method, status=status)
+
+            name = "request_duration_seconds"
+            header(name, "histogram", "Wall time of requests by view.")
+            for view, stats in views:
+                for bound, n in zip(BUCKETS, stats.buckets):
+                    sample(f"{name}_bucket", n, view=view, le=bound)
+                count = sum(stats.requests.values())
+                sample(f"{name}_bucket", count, view=view, le="+Inf")
+                sample(f"{name}_sum", stats.duration, view=view)
+                sample(f"{name}_count", count, view=view)
+
+            for name, attr, help_text in [
+                ("db_queries_total", "queries", "Database queries by view."),
+                (
+                    "db_duration_seconds_total",
+                    "db_time",
+                    "Time spent in database queries by view.",
+                ),
+                ("response_bytes_total", "response_bytes", "Response sizes by view."),
+            ]:
+                header(name, "counter", help_text)
+                for view, stats in views:
+                    sample(name, getattr(stats, attr), view=view)
+
+            name = "phase_duration_seconds_total"
+            header(name, "counter", "Time spent in phases, e.g. serialize, by view.")
+            for view, stats in views:
+                for phase, value in sorted(stats.timings.items()):
+                    sample(name, value, view=view, phase=phase)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from .compression import compress_response
+from .metrics import RequestMetrics, current_request, registry
+from .routers import current_database
+
+logger = logging.getLogger("story.performance")
+
+# Set for REPLICA_STICKY_SECONDS after a write, see ReplicaMiddleware.
+PRIMARY_COOKIE = "scraty_primary"
+
+
+class PerformanceMiddleware:
+    """Record wall time, database queries, serialization time and response
+    size per view, add them to the process' metrics registry and send them in
+    a ``Server-Timing`` header.
+
+    Requests slower than ``SLOW_REQUEST_THRESHOLD`` milliseconds are logged and
+    kept with their SQL, see ``slow_requests_view``. Recording the SQL of every
+    request is cheap, as only references to the query strings are kept.
+
+    The middleware supports both sync and async requests so that it doesn't
+    push async views back onto a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function, like MiddlewareMixin.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = self.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(metrics.token)
+        return self.finish_request(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = self.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(metrics.token)
+        return self.finish_request(request, response, metrics, start)
+
+    def start_request(self):
+        # Queries are counted by story.metrics.record_query().
+        metrics = RequestMetrics(record_sql=settings.SLOW_REQUEST_THRESHOLD is not None)
+        metrics.token = current_request.set(metrics)
+        return metrics
+
+    def finish_request(self, request, response, metrics, start):
+        duration = time.perf_counter() - start
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+
+        match = request.resolver_match
+        view = match.view_name if match else "<unresolved>"
+        size = None if response.streaming else len(response.content)
+        registry.record(
+            view, request.method, response.status_code, duration, metrics, size
+        )
+
+        timings = [
+            f"total;dur={duration * 1000:.3f}",
+            f'db;dur={metrics.db_time * 1000:.3f};desc="{metrics.queries} queries"',
+        ]
+        timings += [
+            f"{name};dur={value * 1000:.3f}" for name, value in metrics.timings.items()
+        ]
+        response["Server-Timing"] = ", ".join(timings)
+
+        if threshold is not None and duration * 1000 >= threshold:
+            sample = {
+                "view": view,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration": round(duration * 1000, 3),
+                "db_time": round(metrics.db_time * 1000, 3),
+                "sql": [
+                    {"sql": sql, "duration": round(duration * 1000, 3)}
+                    for sql, duration in metrics.sql
+                ],
+            }
+            registry.add_slow_request(sample)
+            logger.warning(
+                "Slow request %s %s: %.1f ms, %d queries",
+                request.method,
+                request.path,
+                duration * 1000,
+                metrics.queries,
+                extra={"sample": sample},
+            )
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress API responses above ``COMPRESSION_MIN_SIZE`` bytes with gzip
+    or Brotli, whichever the client prefers, see story.compression.
+
+    Views may compress responses themselves, e.g. from cached variants, by
+    setting ``Content-Encoding``.
+    """
+
+    def process_response(self, request, response):
+        return compress_response(request, response)
+
+
+class ReplicaMiddleware:
+    """Have safe requests read from a random read replica, see
+    story.routers.ReplicaRouter, unless the client wrote within the last
+    ``REPLICA_STICKY_SECONDS``: writes set a cookie keeping the client on the
+    primary database until the replicas caught up.
+
+    Like PerformanceMiddleware it supports both sync and async requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = self.start_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_database.reset(token)
+        return self.finish_request(request, response)
+
+    async def __acall__(self, request):
+        token = self.start_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_database.reset(token)
+        return self.finish_request(request, response)
+
+    def start_request(self, request):
+        alias = None
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            replicas
+            and request.method in ("GET", "HEAD")
+            and PRIMARY_COOKIE not in request.COOKIES
+        ):
+            alias = random.choice(replicas)
+        return current_database.set(alias)
+
+    def finish_request(self, request, response):
+        sticky = settings.REPLICA_STICKY_SECONDS
+        if (
+            settings.DATABASE_REPLICAS
+            and sticky
+            and request.method
+            not in (
+                "GET",
+                "HEAD",
+                "OPTIONS",
+                "TRACE",
+            )
+        ):
+            response.set_cookie(
+                PRIMARY_COOKIE, "1", max_age=sticky, httponly=True, samesite="Lax"
+            )
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.4 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0003_boardversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="revision",
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name="story",
+            name="revision",
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.4 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0004_revision"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(fields=["story", "done"], name="card_story_done_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                condition=models.Q(("done", False)),
+                fields=["story"],
+                name="card_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="story",
+            index=models.Index(
+                condition=models.Q(("done", False)),
+                fields=["id"],
+                name="story_open_idx",
+            ),
+        ),
+    ]
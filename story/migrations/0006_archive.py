@@ -0,0 +1,66 @@
+# Generated by Django 3.2.4 on 2026-10-18 10:21
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_done_at(apps, schema_editor):
+    # Rows soft-deleted before done_at existed start their retention now.
+    now = timezone.now()
+    for model_name in ("Card", "Story"):
+        model = apps.get_model("story", model_name)
+        model.objects.filter(done=True, done_at=None).update(done_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0005_board_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedCard",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("text", models.TextField()),
+                ("story_id", models.UUIDField(db_index=True)),
+                ("user_name", models.CharField(blank=True, max_length=50)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("TODO", "Todo"),
+                            ("IN_PROGRESS", "In Progress"),
+                            ("VERIFY", "Verify"),
+                            ("DONE", "Done"),
+                        ],
+                        max_length=11,
+                    ),
+                ),
+                ("done_at", models.DateTimeField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedStory",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                ("title", models.TextField()),
+                ("link", models.URLField(blank=True)),
+                ("done_at", models.DateTimeField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="done_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="story",
+            name="done_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_done_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.4 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0006_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="boardversion",
+            name="users_version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 3.2.4 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+import story.models
+
+
+def create_default_board(apps, schema_editor):
+    # The existing board becomes the default board, keeping its version so
+    # that clients' cursors stay valid.
+    Board = apps.get_model("story", "Board")
+    BoardVersion = apps.get_model("story", "BoardVersion")
+    board_version = BoardVersion.objects.filter(pk=1).first()
+    Board.objects.get_or_create(
+        pk=settings.DEFAULT_BOARD,
+        defaults={
+            "version": board_version.version if board_version else 0,
+            "users_version": board_version.users_version if board_version else 0,
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0007_users_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Board",
+            fields=[
+                ("slug", models.SlugField(primary_key=True, serialize=False)),
+                ("name", models.CharField(blank=True, max_length=100)),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("users_version", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_default_board, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name="BoardVersion",
+        ),
+        migrations.RemoveIndex(
+            model_name="card",
+            name="card_open_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="story",
+            name="story_open_idx",
+        ),
+        migrations.AlterField(
+            model_name="card",
+            name="revision",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name="story",
+            name="revision",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="story",
+            name="board",
+            field=models.ForeignKey(
+                default=story.models.get_default_board,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="stories",
+                to="story.board",
+            ),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="board",
+            field=models.ForeignKey(
+                default=story.models.get_default_board,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="story.board",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedcard",
+            name="board_id",
+            field=models.SlugField(default=settings.DEFAULT_BOARD),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="archivedstory",
+            name="board_id",
+            field=models.SlugField(default=settings.DEFAULT_BOARD),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="archivedstory",
+            index=models.Index(
+                fields=["board_id", "done_at"], name="archived_story_board_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                condition=models.Q(("done", False)),
+                fields=["board", "story"],
+                name="card_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(fields=["board", "revision"], name="card_revision_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="story",
+            index=models.Index(
+                condition=models.Q(("done", False)),
+                fields=["board", "id"],
+                name="story_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="story",
+            index=models.Index(fields=["board", "revision"], name="story_revision_idx"),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 3.2.4 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_INDEX = [
+    # An external content table: the text is only stored once, triggers keep
+    # the index in sync with story_searchdocument.
+    "CREATE VIRTUAL TABLE story_search USING fts5(text, "
+    "content='story_searchdocument', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER story_search_insert AFTER INSERT ON story_searchdocument BEGIN "
+    "INSERT INTO story_search(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER story_search_delete AFTER DELETE ON story_searchdocument BEGIN "
+    "INSERT INTO story_search(story_search, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER story_search_update AFTER UPDATE ON story_searchdocument BEGIN "
+    "INSERT INTO story_search(story_search, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO story_search(rowid, text) VALUES (new.id, new.text); END",
+]
+
+POSTGRESQL_INDEX = [
+    "CREATE INDEX story_search_idx ON story_searchdocument "
+    "USING gin (to_tsvector('simple', text))",
+]
+
+
+def create_index(apps, schema_editor):
+    statements = {"sqlite": SQLITE_INDEX, "postgresql": POSTGRESQL_INDEX}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        # The triggers go with story_searchdocument.
+        schema_editor.execute("DROP TABLE story_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0008_boards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("story", "Story"), ("card", "Card")], max_length=5
+                    ),
+                ),
+                ("object_id", models.UUIDField(unique=True)),
+                ("text", models.TextField()),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="story.board",
+                    ),
+                ),
+                (
+                    "story",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="story.story",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
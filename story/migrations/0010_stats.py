@@ -0,0 +1,138 @@
+# Generated by Django 3.2.4 on 2026-10-18 11:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def count_cards(apps, schema_editor):
+    # Counted once here, from then on the write paths update the counts.
+    Card = apps.get_model("story", "Card")
+    CardCount = apps.get_model("story", "CardCount")
+    rows = (
+        Card.objects.filter(done=False)
+        .values_list("board", "story", "status", "user")
+        .annotate(models.Count("id"))
+        .order_by()
+    )
+    CardCount.objects.bulk_create(
+        (
+            CardCount(
+                board_id=board,
+                story_id=story,
+                status=status,
+                user_name=user or "",
+                count=count,
+            )
+            for board, story, status, user, count in rows.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0009_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="board",
+            name="stats_date",
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.CreateModel(
+            name="DailyCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("TODO", "Todo"),
+                            ("IN_PROGRESS", "In Progress"),
+                            ("VERIFY", "Verify"),
+                            ("DONE", "Done"),
+                        ],
+                        max_length=11,
+                    ),
+                ),
+                ("count", models.IntegerField()),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="story.board",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="CardCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("TODO", "Todo"),
+                            ("IN_PROGRESS", "In Progress"),
+                            ("VERIFY", "Verify"),
+                            ("DONE", "Done"),
+                        ],
+                        max_length=11,
+                    ),
+                ),
+                ("user_name", models.CharField(blank=True, max_length=50)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="story.board",
+                    ),
+                ),
+                (
+                    "story",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="story.story",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="dailycount",
+            constraint=models.UniqueConstraint(
+                fields=("board", "date", "status"), name="daily_count_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="cardcount",
+            constraint=models.UniqueConstraint(
+                fields=("story", "status", "user_name"), name="card_count_key"
+            ),
+        ),
+        migrations.RunPython(count_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.4 on 2026-10-18 11:27
+
+from itertools import groupby
+from operator import attrgetter
+
+from django.db import migrations, models
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def spread(count):
+    # story.ranks.spread() as of this migration.
+    width = 1
+    while len(DIGITS) ** width < 8 * (count + 1):
+        width += 1
+    ranks = []
+    for i in range(1, count + 1):
+        value = i * len(DIGITS) ** width // (count + 1)
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, len(DIGITS))
+            digits = DIGITS[digit] + digits
+        ranks.append(digits.rstrip("0"))
+    return ranks
+
+
+def rank_cards(apps, schema_editor):
+    # Open cards had no order, keep the order they were last written in.
+    Card = apps.get_model("story", "Card")
+    cards = Card.objects.filter(done=False).order_by(
+        "story", "status", "revision", "id"
+    )
+    column = attrgetter("story_id", "status")
+    for _, column_cards in groupby(cards.only("story", "status").iterator(), column):
+        column_cards = list(column_cards)
+        for card, rank in zip(column_cards, spread(len(column_cards))):
+            card.rank = rank
+        Card.objects.bulk_update(column_cards, ["rank"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("story", "0010_stats"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="card",
+            name="card_open_idx",
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="rank",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(rank_cards, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                condition=models.Q(("done", False)),
+                fields=["board", "story", "status", "rank"],
+                name="card_open_idx",
+            ),
+        ),
+    ]
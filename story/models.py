@@ -1,6 +1,13 @@
 import uuid
 
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .db import update_returning
 
 
 class User(models.Model):
@@ -8,11 +15,134 @@ class User(models.Model):
     color = models.CharField(max_length=6, blank=True)
 
 
+class UserCache:
+    """Process-local map of user names to colors.
+
+    The cache is validated against ``Board.users_version`` whenever a board's
+    version is read or bumped, which picks up changes made by other processes.
+    Users are shared by all boards, so every board's ``users_version`` is
+    bumped when they change.
+    """
+
+    def __init__(self):
+        self.users = None
+        self.users_versions = {}
+
+    def validate(self, board, users_version):
+        if users_version != self.users_versions.get(board):
+            self.users = None
+            self.users_versions[board] = users_version
+
+    def clear(self):
+        self.users = None
+        self.users_versions = {}
+
+    def load(self):
+        self.users = dict(User.objects.values_list("name", "color"))
+        return self.users
+
+    def get_color(self, name):
+        """Return the color of the user or None if there is no such user."""
+        users = self.users
+        if users is None or name not in users:
+            users = self.load()
+        return users.get(name)
+
+    def __contains__(self, name):
+        return self.get_color(name) is not None
+
+
+user_cache = UserCache()
+
+
+class Board(models.Model):
+    """A team's board.
+
+    Its version is bumped on every write to the board. It lets readers detect
+    changes without querying the Story/Card tables, and the bumped value is
+    stored as the ``revision`` of the written rows. Boards don't share rows or
+    versions, so writes to one board never wait for writes to another.
+
+    Clients poll for rows whose revision is newer than the version they have,
+    so every write must go through the forms, ``story.bulk`` or ``bump()``
+    with the written rows' ``revision`` set to the new version, in one
+    transaction. Rows written otherwise stay invisible until clients reload.
+
+    The board named by the ``DEFAULT_BOARD`` setting is served at the root URL
+    and created on first use.
+    """
+
+    slug = models.SlugField(primary_key=True)
+    name = models.CharField(max_length=100, blank=True)
+    version = models.PositiveBigIntegerField(default=0)
+    users_version = models.PositiveBigIntegerField(default=0)
+    # The day of the last write. The card counts at its end are recorded by
+    # the first write of a later day, see DailyCount.
+    stats_date = models.DateField(default=timezone.localdate)
+
+    def __str__(self):
+        return self.name or self.slug
+
+    @classmethod
+    def current(cls, slug):
+        """Return the version of the board. Raise ``Board.DoesNotExist`` if
+        there is no such board."""
+        try:
+            board = cls.objects.get(pk=slug)
+        except cls.DoesNotExist:
+            if slug != settings.DEFAULT_BOARD:
+                raise
+            board, _ = cls.objects.get_or_create(pk=slug)
+        user_cache.validate(slug, board.users_version)
+        return board.version
+
+    @classmethod
+    def bump(cls, slug):
+        # Call inside a transaction: the UPDATE locks the row until commit, so
+        # revisions become visible to readers in increasing order.
+        rows = update_returning(cls.objects.filter(pk=slug), version=F("version") + 1)
+        if not rows:
+            if slug != settings.DEFAULT_BOARD:
+                raise cls.DoesNotExist
+            cls.objects.get_or_create(pk=slug)
+            return cls.bump(slug)
+        user_cache.validate(slug, rows[0].users_version)
+        if rows[0].stats_date != timezone.localdate():
+            DailyCount.record(slug, rows[0].stats_date)
+        return rows[0].version
+
+    @classmethod
+    def users_changed(cls):
+        cls.objects.update(users_version=F("users_version") + 1)
+        user_cache.clear()
+
+
+def get_default_board():
+    return settings.DEFAULT_BOARD
+
+
 class Story(models.Model):
     id = models.UUIDField(default=uuid.uuid4, primary_key=True)
+    board = models.ForeignKey(
+        Board,
+        default=get_default_board,
+        on_delete=models.CASCADE,
+        related_name="stories",
+    )
     title = models.TextField()
     link = models.URLField(blank=True)
     done = models.BooleanField(default=False)
+    done_at = models.DateTimeField(blank=True, null=True)
+    revision = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # The board only ever shows open stories.
+            models.Index(
+                fields=["board", "id"], condition=Q(done=False), name="story_open_idx"
+            ),
+            models.Index(fields=["board", "revision"], name="story_revision_idx"),
+        ]
 
 
 class Card(models.Model):
@@ -23,6 +153,11 @@ class Card(models.Model):
         DONE = "DONE"
 
     id = models.UUIDField(default=uuid.uuid4, primary_key=True)
+    # Always the story's board, denormalized so that reading a board's cards
+    # needs no join.
+    board = models.ForeignKey(
+        Board, default=get_default_board, on_delete=models.CASCADE, related_name="+"
+    )
     text = models.TextField()
     story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name="cards")
     user = models.ForeignKey(
@@ -31,4 +166,130 @@ class Card(models.Model):
     status = models.CharField(
         max_length=11, choices=Status.choices, default=Status.TODO
     )
+    # The position of the card in its story's status column, see story.ranks.
+    rank = models.CharField(max_length=255, blank=True)
     done = models.BooleanField(default=False)
+    done_at = models.DateTimeField(blank=True, null=True)
+    revision = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["story", "done"], name="card_story_done_idx"),
+            # Also orders the cards of each column.
+            models.Index(
+                fields=["board", "story", "status", "rank"],
+                condition=Q(done=False),
+                name="card_open_idx",
+            ),
+            models.Index(fields=["board", "revision"], name="card_revision_idx"),
+        ]
+
+
+class SearchDocument(models.Model):
+    """The text of an open story or card, indexed for full-text search, see
+    story.search. ``story`` is the card's story, or the story itself."""
+
+    class Kind(models.TextChoices):
+        STORY = "story"
+        CARD = "card"
+
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=5, choices=Kind.choices)
+    object_id = models.UUIDField(unique=True)
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name="+")
+    text = models.TextField()
+
+
+class CardCount(models.Model):
+    """The number of open cards of a story by status and user, updated by
+    every write to cards, see story.stats."""
+
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="+")
+    story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name="+")
+    status = models.CharField(max_length=11, choices=Card.Status.choices)
+    user_name = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["story", "status", "user_name"], name="card_count_key"
+            ),
+        ]
+
+    @classmethod
+    def totals(cls, board):
+        """Return the number of open cards of the board's open stories by
+        status."""
+        counts = dict.fromkeys(Card.Status.values, 0)
+        rows = (
+            cls.objects.filter(board=board, story__done=False)
+            .values_list("status")
+            .annotate(models.Sum("count"))
+        )
+        counts.update(rows)
+        return counts
+
+
+class DailyCount(models.Model):
+    """The number of open cards of a board by status at the end of a day with
+    writes to the board. Later days without writes had the same counts."""
+
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="+")
+    date = models.DateField()
+    status = models.CharField(max_length=11, choices=Card.Status.choices)
+    count = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["board", "date", "status"], name="daily_count_key"
+            ),
+        ]
+
+    @classmethod
+    def record(cls, board, date):
+        """Record the current counts as those at the end of ``date``, the
+        day of the last write, and start a new day. Call it before a write."""
+        cls.objects.bulk_create(
+            [
+                cls(board_id=board, date=date, status=status, count=count)
+                for status, count in CardCount.totals(board).items()
+            ],
+            ignore_conflicts=True,
+        )
+        Board.objects.filter(pk=board).update(stats_date=timezone.localdate())
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(**kwargs):
+    Board.users_changed()
+
+
+class ArchivedStory(models.Model):
+    # Done stories moved out of the live tables by the compact_board command.
+    id = models.UUIDField(primary_key=True)
+    board_id = models.SlugField()
+    title = models.TextField()
+    link = models.URLField(blank=True)
+    done_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["board_id", "done_at"], name="archived_story_board_idx"
+            ),
+        ]
+
+
+class ArchivedCard(models.Model):
+    id = models.UUIDField(primary_key=True)
+    board_id = models.SlugField()
+    text = models.TextField()
+    # Either an archived or a live story.
+    story_id = models.UUIDField(db_index=True)
+    user_name = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=11, choices=Card.Status.choices)
+    done_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,153 @@
+"""Rank keys ordering the open cards of each (story, status) column.
+
+Ranks are strings of base-36 digits compared as strings, i.e. like the
+fractions ``0.<rank>``. As they never end with ``0``, there is a rank between
+any two of them: a card moved between two others gets such a rank and
+reordering writes the moved card only. Appended cards get a rank after the
+last card of their column. Digits and lowercase letters sort the same under
+the usual collations, so databases can order by rank with an index.
+
+Ranks grow longer when cards keep being moved between the same two cards.
+The rebalance_ranks command spreads the ranks of such columns out again.
+"""
+import re
+
+from django.db.models import Max
+
+from .models import Card
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+# Columns with longer ranks are rebalanced by default.
+REBALANCE_LENGTH = 12
+
+RANK_RE = re.compile(r"([0-9a-z]*[1-9a-z])?\Z")
+
+
+def rank_between(before=None, after=None):
+    """Return a rank between the ranks ``before`` and ``after``, where
+    ``None`` is the start or end of the column. ``before`` must be smaller
+    than ``after``."""
+    if after is None:
+        # Increment the first digit that can be, which keeps appended ranks
+        # short, rather than halving the space left at the end.
+        before = before or ""
+        for i, digit in enumerate(before):
+            if digit != DIGITS[-1]:
+                return before[:i] + DIGITS[DIGITS.index(digit) + 1]
+        return before + DIGITS[BASE // 2]
+    return _midpoint(before or "", after)
+
+
+def _midpoint(low, high):
+    # Digits past the end of ``low`` are zeros.
+    prefix = 0
+    while prefix < len(high) and (low[prefix : prefix + 1] or "0") == high[prefix]:
+        prefix += 1
+    if prefix:
+        return high[:prefix] + _midpoint(low[prefix:], high[prefix:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0])
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    if len(high) > 1:
+        # ``high`` is longer than its first digit, which lies in between.
+        return high[0]
+    return DIGITS[low_digit] + rank_between(low[1:] or None, None)
+
+
+def spread(count):
+    """Return ``count`` short ranks in increasing order, evenly spaced so
+    that cards fit in between."""
+    width = 1
+    while BASE ** width < 8 * (count + 1):
+        width += 1
+    ranks = []
+    for i in range(1, count + 1):
+        value = i * BASE ** width // (count + 1)
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits = DIGITS[digit] + digits
+        ranks.append(digits.rstrip("0"))
+    return ranks
+
+
+def place_cards(cards, previous=(), placements=None):
+    """Set the ``rank`` of the written ``cards``, which are open unless
+    deleted, in the write's transaction.
+
+    ``placements`` maps the ids of cards put between two cards of their
+    column to the ids of these cards, ``(None, None)`` meaning nowhere in
+    particular. ``previous`` are the cards as they were before the write, see
+    ``story.stats.get_counted()``. Cards that stayed in their column keep
+    their rank, other cards go to the end of their column.
+    """
+    previous = {card.pk: card for card in previous}
+    placements = placements or {}
+    neighbour_ids = {pk for pair in placements.values() for pk in pair} - {None}
+    # The column and rank of the cards placed relative to, as they are now.
+    neighbours = {}
+    if neighbour_ids:
+        rows = Card.objects.filter(pk__in=neighbour_ids, done=False).values_list(
+            "pk", "story", "status", "rank"
+        )
+        neighbours = {pk: ((story, status), rank) for pk, story, status, rank in rows}
+    appended = []
+    for card in cards:
+        if card.done:
+            continue
+        column = (card.story_id, card.status)
+        old = previous.get(card.pk)
+        moved = old is None or (old.story_id, old.status) != column
+        rank = None
+        if any(placements.get(card.pk, ())):
+            rank = _place(column, *placements[card.pk], neighbours)
+        if rank is None and not moved:
+            rank = old.rank
+        if rank is None:
+            appended.append(card)
+            continue
+        card.rank = rank
+        neighbours[card.pk] = (column, rank)
+    if not appended:
+        return
+
+    board = appended[0].board_id
+    columns = {(card.story_id, card.status) for card in appended}
+    rows = (
+        Card.objects.filter(
+            board=board,
+            done=False,
+            story__in={story for story, _ in columns},
+            status__in={status for _, status in columns},
+        )
+        .values_list("story", "status")
+        .annotate(Max("rank"))
+    )
+    last = {(story, status): rank for story, status, rank in rows}
+    # Cards placed above may have moved to the end of their column.
+    for column, rank in neighbours.values():
+        if rank > last.get(column, ""):
+            last[column] = rank
+    for card in appended:
+        column = (card.story_id, card.status)
+        card.rank = last[column] = rank_between(last.get(column) or None, None)
+
+
+def _place(column, after, before, neighbours):
+    # Return the rank between the cards ``after`` and ``before``, or None if
+    # they are no longer next to each other in the column.
+    ranks = []
+    for pk in after, before:
+        if pk is None:
+            ranks.append(None)
+            continue
+        neighbour_column, rank = neighbours.get(pk, (None, ""))
+        if neighbour_column != column or not rank:
+            return None
+        ranks.append(rank)
+    low, high = ranks
+    if low is not None and high is not None and low >= high:
+        return None
+    return rank_between(low, high)
@@ -0,0 +1,37 @@
+"""Routing of reads to the read replicas named by ``DATABASE_REPLICAS``.
+
+``ReplicaMiddleware`` picks the database a request reads from: safe requests
+read from one of the replicas, the same for the whole request so that it sees
+one consistent, if slightly late, state of the board. Writes and requests of
+clients that wrote within the last ``REPLICA_STICKY_SECONDS`` use the primary
+database ``default``, so clients read their own writes. Everything else, e.g.
+management commands, uses the primary as well.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The alias of the replica the current request reads from, None for the
+# primary.
+current_database = ContextVar("current_database", default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = current_database.get()
+        # Reads in a transaction of the primary belong to its writes.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema from the primary.
+        return db not in settings.DATABASE_REPLICAS
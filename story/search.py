@@ -0,0 +1,178 @@
+"""Full-text search over the open stories and cards of a board.
+
+The text of every open story and card is copied to a ``SearchDocument`` by
+the write paths, see ``update_index()``. On SQLite the documents are indexed
+by the FTS5 table ``story_search``, kept in sync by triggers, and on PostgreSQL
+by a GIN index over their ``tsvector``, see migration 0009. Other databases
+fall back to a substring match without ranking.
+
+Queries match documents containing every word of the query, the last one as a
+prefix as the user may still be typing it.
+"""
+import re
+from html import escape
+
+from django.db import connections
+from django.db.models import F, Q
+
+from .db import upsert
+from .metrics import timed
+from .models import Card, SearchDocument, Story
+
+# Private use characters marking matches in snippets until the snippet is
+# escaped; the text itself can't be escaped inside the database.
+MARK_START = "\ue000"
+MARK_END = "\ue001"
+SNIPPET_WORDS = 12
+
+WORD_RE = re.compile(r"\w+")
+
+
+def update_index(rows):
+    """Index the written stories and cards ``rows``, removing done ones.
+
+    Call it in the transaction writing the rows. Cards of done stories are
+    removed along with the story.
+    """
+    documents = []
+    removed = set()
+    removed_stories = set()
+    for row in rows:
+        if isinstance(row, Story):
+            if row.done:
+                # Also matches the story's own document.
+                removed_stories.add(row.pk)
+            else:
+                documents.append(
+                    SearchDocument(
+                        kind=SearchDocument.Kind.STORY,
+                        object_id=row.pk,
+                        story_id=row.pk,
+                        board_id=row.board_id,
+                        text=row.title,
+                    )
+                )
+        elif row.done:
+            removed.add(row.pk)
+        else:
+            documents.append(
+                SearchDocument(
+                    kind=SearchDocument.Kind.CARD,
+                    object_id=row.pk,
+                    story_id=row.story_id,
+                    board_id=row.board_id,
+                    text=row.text,
+                )
+            )
+    if removed or removed_stories:
+        SearchDocument.objects.filter(
+            Q(object_id__in=removed) | Q(story_id__in=removed_stories)
+        ).delete()
+    # Cards may have moved to another story.
+    upsert(SearchDocument, documents, ["object_id"], ["story", "text"])
+
+
+def rebuild_index(board=None, batch_size=2000):
+    """Index the open stories and cards of the board with the slug ``board``,
+    or of all boards, from scratch. Return the number of indexed documents."""
+    documents = SearchDocument.objects.all()
+    stories = Story.objects.filter(done=False)
+    cards = Card.objects.filter(done=False, story__done=False)
+    if board is not None:
+        documents = documents.filter(board=board)
+        stories = stories.filter(board=board)
+        cards = cards.filter(board=board)
+    documents.delete()
+    count = 0
+    for kind, rows in [
+        (
+            SearchDocument.Kind.STORY,
+            stories.values_list("id", "id", "board_id", "title"),
+        ),
+        (
+            SearchDocument.Kind.CARD,
+            cards.values_list("id", "story_id", "board_id", "text"),
+        ),
+    ]:
+        batch = []
+        for object_id, story_id, board_id, text in rows.iterator(batch_size):
+            batch.append(
+                SearchDocument(
+                    kind=kind,
+                    object_id=object_id,
+                    story_id=story_id,
+                    board_id=board_id,
+                    text=text,
+                )
+            )
+            if len(batch) >= batch_size:
+                SearchDocument.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        count += len(batch)
+    connection = connections[SearchDocument.objects.db]
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO story_search(story_search) VALUES ('optimize')")
+    return count
+
+
+def parse_query(q):
+    return WORD_RE.findall(q)
+
+
+@timed("search")
+def search(board, q, limit=20):
+    """Return the best matches of ``q`` on the board with the slug ``board`` as
+    ``(kind, id, story id, snippet)`` tuples. Snippets are HTML with matches
+    in ``<mark>`` elements."""
+    words = parse_query(q)
+    if not words:
+        return []
+    connection = connections[SearchDocument.objects.db]
+    # Cards of done stories are still indexed if they were imported so.
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{word}"' for word in words) + "*"
+        documents = SearchDocument.objects.raw(
+            "SELECT d.id, d.kind, d.object_id, d.story_id, "
+            f"snippet(story_search, 0, %s, %s, '…', {SNIPPET_WORDS}) AS snippet "
+            "FROM story_search "
+            "JOIN story_searchdocument d ON d.id = story_search.rowid "
+            "JOIN story_story s ON s.id = d.story_id AND NOT s.done "
+            "WHERE story_search MATCH %s AND d.board_id = %s "
+            "ORDER BY story_search.rank LIMIT %s",
+            [MARK_START, MARK_END, match, board, limit],
+        )
+    elif connection.vendor == "postgresql":
+        tsquery = " & ".join(words) + ":*"
+        options = (
+            f"StartSel={MARK_START}, StopSel={MARK_END}, "
+            f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}"
+        )
+        documents = SearchDocument.objects.raw(
+            "SELECT d.id, d.kind, d.object_id, d.story_id, "
+            "ts_headline('simple', d.text, q, %s) AS snippet "
+            "FROM story_searchdocument d "
+            "JOIN story_story s ON s.id = d.story_id AND NOT s.done "
+            "CROSS JOIN to_tsquery('simple', %s) q "
+            "WHERE to_tsvector('simple', d.text) @@ q AND d.board_id = %s "
+            "ORDER BY ts_rank(to_tsvector('simple', d.text), q) DESC LIMIT %s",
+            [options, tsquery, board, limit],
+        )
+    else:
+        documents = SearchDocument.objects.filter(
+            board=board, story__done=False
+        ).annotate(snippet=F("text"))
+        for word in words:
+            documents = documents.filter(text__icontains=word)
+        documents = documents[:limit]
+    return [
+        (document.kind, document.object_id, document.story_id, highlight(document))
+        for document in documents
+    ]
+
+
+def highlight(document):
+    snippet = escape(document.snippet)
+    return snippet.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
@@ -0,0 +1,942 @@
+// The board, rendered by story/board.html, which defines DEBUG and BASE_URL.
+const POLL_INTERVAL = 10000;
+// Stories per request; further pages are loaded while scrolling down.
+const PAGE_SIZE = 25;
+// With several ASGI workers and the in-process event broker, a stream only
+// carries the writes handled by its own worker. Poll now and then anyway.
+const STREAM_POLL_INTERVAL = 60000;
+let lastFetch = 0;
+$(function () {
+  const store = {
+    state: {
+      poll: true,
+      stories: [],
+      cursor: null,
+      // Whether the event stream is connected and whether it delivered
+      // changes that couldn't be applied, e.g. while editing.
+      streaming: false,
+      stale: false,
+      // Id of the last loaded story if there are more, see stories_view.
+      next: null,
+      loading: false,
+      filters: { q: "", user: "", status: "" },
+      // Whether writes are queued for sync_view rather than sent, whether to
+      // go online again on its own once the network is back, and the number
+      // of queued writes.
+      offline: false,
+      reconnect: false,
+      queued: 0,
+    },
+    addStory(story) {
+      DEBUG && console.log("addStory", story);
+      this.state.stories.push(story);
+    },
+    deleteStory(id) {
+      DEBUG && console.log("deleteStory", id);
+      this.state.stories = this.state.stories.filter(s => s.id !== id);
+    },
+    updateStory(id, title, link, revision) {
+      DEBUG && console.log("updateStory", id, title, link, revision);
+      let story = this.state.stories.find(s => s.id === id);
+      story.title = title;
+      story.link = link;
+      story.revision = revision;
+    },
+    addCard(card, storyId) {
+      DEBUG && console.log("addCard", card, storyId);
+      let story = this.state.stories.find(s => s.id === storyId);
+      story.cards.push(card);
+    },
+    deleteCard(id, storyId) {
+      DEBUG && console.log("deleteCard", id, storyId);
+      let story = this.state.stories.find(s => s.id === storyId);
+      story.cards = story.cards.filter(c => c.id !== id);
+    },
+    updateCard(id, text, status, user, revision, storyId) {
+      DEBUG && console.log("updateCard", id, text, status, user, revision, storyId);
+      let story = this.state.stories.find(s => s.id === storyId);
+      let card = story.cards.find(c => c.id === id);
+      card.text = text;
+      card.status = status;
+      card.user = user;
+      card.revision = revision;
+    },
+    moveCard(id, status, revision, fromStoryId, toStoryId, rank) {
+      DEBUG && console.log("moveCard", id, status, revision, fromStoryId, toStoryId, rank);
+      let fromStory = this.state.stories.find(s => s.id === fromStoryId);
+      let card = fromStory.cards.find(c => c.id === id);
+      card.status = status;
+      card.revision = revision;
+      if (rank !== undefined) {
+        card.rank = rank;
+      }
+      if (fromStoryId !== toStoryId) {
+        toStory = this.state.stories.find(s => s.id === toStoryId);
+        fromStory.cards = fromStory.cards.filter(c => c.id !== id);
+        toStory.cards.push(card);
+      }
+    },
+    insertStory(story) {
+      // Keep the order of the pages, stories are sorted by id.
+      let index = this.state.stories.findIndex(s => s.id > story.id);
+      if (index === -1) {
+        this.state.stories.push(story);
+      } else {
+        this.state.stories.splice(index, 0, story);
+      }
+    },
+    isLoaded(id) {
+      // Whether the story belongs to one of the loaded pages.
+      return this.state.next === null || id <= this.state.next;
+    },
+    isFiltered() {
+      let filters = this.state.filters;
+      return Boolean(filters.q || filters.user || filters.status);
+    },
+    set(stories, cursor, next) {
+      DEBUG && console.log("set", cursor, next);
+      this.state.stories = stories;
+      this.state.cursor = cursor;
+      this.state.next = next;
+    },
+    appendPage(stories, next) {
+      DEBUG && console.log("appendPage", next);
+      stories.forEach(story => {
+        // Stories created meanwhile may have been added already.
+        if (!this.state.stories.some(s => s.id === story.id)) {
+          this.insertStory(story);
+        }
+      });
+      this.state.next = next;
+    },
+    merge(changes) {
+      DEBUG && console.log("merge", changes.cursor);
+      if (this.state.cursor !== null && changes.cursor <= this.state.cursor) {
+        return;
+      }
+      changes.stories.forEach(data => this.applyStory(data));
+      changes.cards.forEach(data => this.applyCard(data));
+      this.state.cursor = changes.cursor;
+    },
+    applyStory(data) {
+      // Apply the current state of a story, as sent by the server.
+      let story = this.state.stories.find(s => s.id === data.id);
+      if (data.done) {
+        this.deleteStory(data.id);
+      } else if (story) {
+        story.title = data.title;
+        story.link = data.link;
+        story.revision = data.revision;
+      } else if (this.isLoaded(data.id)) {
+        this.insertStory({ id: data.id, title: data.title, link: data.link, revision: data.revision, cards: [] });
+      }
+    },
+    applyCard(data) {
+      // Apply the current state of a card, as sent by the server.
+      let card = { id: data.id, text: data.text, status: data.status, user: data.user, rank: data.rank, revision: data.revision };
+      let fromStory = this.state.stories.find(s => s.cards.some(c => c.id === data.id));
+      let toStory = this.state.stories.find(s => s.id === data.story);
+      if (fromStory && (data.done || fromStory !== toStory)) {
+        fromStory.cards = fromStory.cards.filter(c => c.id !== data.id);
+      }
+      if (!data.done && toStory) {
+        let existing = toStory.cards.find(c => c.id === data.id);
+        if (existing) {
+          Object.assign(existing, card);
+        } else {
+          toStory.cards.push(card);
+        }
+      }
+    },
+    enablePolling() {
+      DEBUG && console.log("enablePolling");
+      this.state.poll = true;
+    },
+    disablePolling() {
+      DEBUG && console.log("disablePolling");
+      this.state.poll = false;
+    },
+    goOffline(reconnect) {
+      DEBUG && console.log("goOffline", reconnect);
+      this.state.offline = true;
+      this.state.reconnect = reconnect;
+    },
+    goOnline() {
+      DEBUG && console.log("goOnline");
+      this.state.offline = false;
+      this.state.reconnect = false;
+    },
+    isPolling() {
+      return this.state.poll === true && !this.state.offline;
+    },
+  }
+
+  // Writes made while offline as operations of sync_view, kept in IndexedDB
+  // until they are synced so that they survive reloading the page.
+  const queue = {
+    db: null,
+    open() {
+      if (this.db === null) {
+        this.db = new Promise((resolve, reject) => {
+          let request = indexedDB.open("scraty", 1);
+          request.onupgradeneeded = () => request.result.createObjectStore("operations", { autoIncrement: true });
+          request.onsuccess = () => resolve(request.result);
+          request.onerror = () => reject(request.error);
+        });
+      }
+      return this.db;
+    },
+    run(mode, callback) {
+      // Resolve with the result of callback(objectStore) once the
+      // transaction is complete.
+      return this.open().then(db => new Promise((resolve, reject) => {
+        let transaction = db.transaction("operations", mode);
+        let result = callback(transaction.objectStore("operations"));
+        transaction.oncomplete = () => resolve(result);
+        transaction.onerror = () => reject(transaction.error);
+      }));
+    },
+    add(operation) {
+      return this.run("readwrite", operations => {
+        operations.add({ board: BASE_URL, operation: operation });
+      });
+    },
+    load() {
+      // Resolve with the [key, operation] pairs queued for this board.
+      return this.run("readonly", operations => {
+        let records = [];
+        operations.openCursor().onsuccess = event => {
+          let cursor = event.target.result;
+          if (cursor) {
+            if (cursor.value.board === BASE_URL) {
+              records.push([cursor.key, cursor.value.operation]);
+            }
+            cursor.continue();
+          }
+        };
+        return records;
+      });
+    },
+    remove(keys) {
+      return this.run("readwrite", operations => keys.forEach(key => operations.delete(key)));
+    },
+  };
+  let syncing = null;
+
+  function compactOperations(operations) {
+    // Fold the queued operations on each row into one, e.g. a create and the
+    // following edits into a create. Updates keep the revision the first one
+    // was based on, so that the server detects conflicts with other writes.
+    let result = [];
+    let pending = {};
+    operations.forEach(operation => {
+      let key = `${operation.type}:${operation.id}`;
+      let previous = pending[key];
+      if (previous === undefined) {
+        pending[key] = Object.assign({}, operation, { data: Object.assign({}, operation.data) });
+        result.push(pending[key]);
+      } else if (operation.op === "delete") {
+        if (previous.op === "create") {
+          // Never synced, skip it altogether.
+          result.splice(result.indexOf(previous), 1);
+          delete pending[key];
+        } else {
+          previous.op = "delete";
+          previous.data = {};
+        }
+      } else if (previous.op !== "delete") {
+        let revision = previous.data.revision;
+        Object.assign(previous.data, operation.data, { revision: revision });
+        if (previous.op === "move" && operation.op === "update") {
+          previous.op = "update";
+        }
+      }
+    });
+    return result;
+  }
+
+  function newId() {
+    // Rows created offline get their id from the client, see
+    // apply_operations(). randomUUID() needs a secure context.
+    if (window.crypto.randomUUID) {
+      return window.crypto.randomUUID();
+    }
+    let bytes = window.crypto.getRandomValues(new Uint8Array(16));
+    bytes[6] = bytes[6] & 0x0f | 0x40;
+    bytes[8] = bytes[8] & 0x3f | 0x80;
+    let hex = Array.from(bytes, b => b.toString(16).padStart(2, "0")).join("");
+    return `${hex.substr(0, 8)}-${hex.substr(8, 4)}-${hex.substr(12, 4)}-${hex.substr(16, 4)}-${hex.substr(20)}`;
+  }
+
+  function send(request, operation, optimistic) {
+    // Send a write, or queue it as the given sync_view operation while
+    // offline and answer it with the optimistic response. Writes failing for
+    // lack of network take the board offline and are queued as well.
+    let deferred = $.Deferred();
+    if (store.state.offline) {
+      enqueue(operation, optimistic, deferred);
+    } else {
+      $.ajax(request).done(deferred.resolve).fail(function (xhr) {
+        if (xhr.status === 0) {
+          store.goOffline(true);
+          enqueue(operation, optimistic, deferred);
+        } else {
+          deferred.reject(xhr);
+        }
+      });
+    }
+    return deferred.promise();
+  }
+
+  function enqueue(operation, optimistic, deferred) {
+    queue.add(operation).then(
+      function () {
+        store.state.queued++;
+        deferred.resolve(optimistic);
+      },
+      function (error) {
+        console.log(error);
+        deferred.reject({
+          status: 0,
+          responseJSON: { offline: [{ message: "Can't save while offline.", code: "offline" }] },
+        });
+      }
+    );
+  }
+
+  function conflictErrors(message) {
+    return { conflict: [{ message: `${message} Save again to overwrite.`, code: "conflict" }] };
+  }
+
+  function csrfSafeMethod(method) {
+    // these HTTP methods do not require CSRF protection
+    return (/^(GET|HEAD|OPTIONS|TRACE)$/.test(method));
+  }
+
+  $.ajaxSetup({
+    beforeSend(xhr, settings) {
+      if (!csrfSafeMethod(settings.type) && !this.crossDomain) {
+        xhr.setRequestHeader("X-CSRFToken", Cookies.get("csrftoken"));
+      }
+    }
+  });
+
+  Vue.component('story', {
+    props: {
+      story: {
+        type: Object,
+      }
+    },
+    data() {
+      return {
+        id: this.story && this.story.id || null,
+        title: this.story && this.story.title || "",
+        link: this.story && this.story.link || "",
+        revision: this.story && this.story.revision,
+        cards: this.story && this.story.cards || [],
+        oldTitle: "",
+        oldLink: "",
+        editing: !(this.story && this.story.id),
+        errors: {},
+        newCardForm: false,
+      }
+    },
+    watch: {
+      story: {
+        deep: true,
+        handler() {
+          this.id = this.story && this.story.id || null;
+          this.title = this.story && this.story.title || "";
+          this.link = this.story && this.story.link || "";
+          this.revision = this.story && this.story.revision;
+          this.cards = this.story && this.story.cards || [];
+        }
+      }
+    },
+    computed: {
+      sortedCards() {
+        // In the order of their columns, see story.ranks.
+        return this.cards.slice().sort((a, b) => a.rank < b.rank ? -1 : a.rank > b.rank ? 1 : 0);
+      },
+      cardsTodo() {
+        return this.sortedCards.filter(card => card.status === "TODO");
+      },
+      cardsInProgress() {
+        return this.sortedCards.filter(card => card.status === "IN_PROGRESS");
+      },
+      cardsVerify() {
+        return this.sortedCards.filter(card => card.status === "VERIFY");
+      },
+      cardsDone() {
+        return this.sortedCards.filter(card => card.status === "DONE");
+      },
+      progressTotal() {
+        return this.cards.length * 100;
+      },
+      progressCurrent() {
+        return this.cardsTodo.length * 0 + this.cardsInProgress.length * 33 + this.cardsVerify.length * 66 + this.cardsDone.length * 100;
+      },
+    },
+    template: "#story-template",
+    methods: {
+      startEdit() {
+        this.$root.store.disablePolling();
+        this.editing = true
+        this.oldTitle = this.title;
+        this.oldLink = this.link;
+      },
+      abortEdit(event) {
+        if (this.id === null) {
+          this.$emit("close-story-form");
+        } else {
+          this.title = this.oldTitle;
+          this.link = this.oldLink;
+          this.editing = false;
+        }
+        this.$root.store.enablePolling();
+      },
+      save() {
+        var that = this;
+        let id = this.id || newId();
+        let data = { title: this.title, link: this.link, revision: this.revision };
+        send(
+          {
+            type: (this.id === null) ? "POST" : "PUT",
+            url: (this.id === null) ? `${BASE_URL}/stories/` : `${BASE_URL}/stories/${this.id}/`,
+            data: Object.assign({ id: this.id }, data),
+          },
+          { type: "story", op: (this.id === null) ? "create" : "update", id: id, data: data },
+          Object.assign({ id: id }, data),
+        ).done(
+          function (data) {
+            if (that.id === null) {
+              that.$root.store.addStory({ id: data.id, title: data.title, link: data.link, revision: data.revision, cards: [] });
+              that.$emit("close-story-form");
+            } else {
+              that.$root.store.updateStory(data.id, data.title, data.link, data.revision);
+              that.editing = false;
+              that.errors = {};
+            }
+            that.$root.store.enablePolling();
+          }
+        ).fail(
+          function (xhr) {
+            DEBUG && console.log(xhr.responseJSON);
+            if (xhr.status === 409) {
+              // Saving again overwrites the other change.
+              that.revision = xhr.responseJSON.revision;
+              that.errors = conflictErrors(`Changed meanwhile to "${xhr.responseJSON.title}".`);
+            } else {
+              that.errors = xhr.responseJSON;
+            }
+            that.$root.store.enablePolling();
+          }
+        );
+      },
+      remove() {
+        this.$root.store.disablePolling();
+        var that = this;
+        if (window.confirm(`Do you really want to delete the story "${this.title}"`)) {
+          send(
+            { type: "DELETE", url: `${BASE_URL}/stories/${this.id}/` },
+            { type: "story", op: "delete", id: this.id },
+            {},
+          ).done(
+            function (data) {
+              that.$root.store.deleteStory(that.id);
+              that.$root.store.enablePolling();
+            }
+          ).fail(
+            function (xhr) {
+              console.log(xhr.responseText);
+              that.$root.store.enablePolling();
+            }
+          );
+        } else {
+          this.$root.store.enablePolling();
+        }
+      },
+      handleDrop(event, newStatus) {
+        let { cardId, storyId, status, revision } = JSON.parse(event.dataTransfer.getData("data"));
+        // A card dropped onto another goes before it, see CardMoveForm.
+        let placement = {};
+        let target = event.target.closest(".card");
+        if (target !== null && target.id !== `c${cardId}`) {
+          let column = this.sortedCards.filter(card => card.status === newStatus && card.id !== cardId);
+          let index = column.findIndex(card => `c${card.id}` === target.id);
+          if (index !== -1) {
+            placement = { after: index > 0 ? column[index - 1].id : "", before: column[index].id };
+          }
+        }
+        this.moveCard(cardId, storyId, status, revision, newStatus, placement, true);
+      },
+      moveCard(cardId, storyId, status, revision, newStatus, placement, retry) {
+        var that = this;
+        let data = Object.assign({ story: this.id, status: newStatus, revision: revision }, placement);
+        send(
+          { type: "POST", url: `${BASE_URL}/cards/${cardId}/move/`, data: data },
+          { type: "card", op: "move", id: cardId, data: data },
+          { revision: revision },
+        ).done(
+          function (data) {
+            that.$root.store.moveCard(cardId, newStatus, data.revision, storyId, that.id, data.rank);
+          }
+        ).fail(
+          function (xhr) {
+            if (xhr.status !== 409) {
+              console.log(xhr.responseText);
+              return;
+            }
+            let current = xhr.responseJSON;
+            that.$root.store.applyCard(current);
+            // Retry if the other change left the card where it was dragged
+            // from, e.g. it edited the text. Otherwise keep that move.
+            if (retry && current.story === storyId && current.status === status) {
+              that.moveCard(cardId, storyId, status, current.revision, newStatus, placement, false);
+            }
+          }
+        );
+      },
+    }
+  });
+
+  Vue.component('card', {
+    props: {
+      card: {
+        type: Object,
+      },
+      storyId: {
+        type: String,
+        required: true,
+      }
+    },
+    data() {
+      return {
+        id: this.card && this.card.id || null,
+        text: this.card && this.card.text || "",
+        status: this.card && this.card.status || "TODO",
+        user: this.card && this.card.user || { name: "", color: "" },
+        revision: this.card && this.card.revision,
+        oldText: "",
+        oldUserName: "",
+        dragging: false,
+        editing: !(this.card && this.card.id),
+        errors: {},
+      }
+    },
+    watch: {
+      card: {
+        deep: true,
+        handler() {
+          this.id = this.card && this.card.id || null;
+          this.text = this.card && this.card.text || "";
+          this.status = this.card && this.card.status || "TODO";
+          this.user = this.card && this.card.user || { name: "", color: "" };
+          this.revision = this.card && this.card.revision;
+        }
+      },
+    },
+    template: '#card-template',
+    methods: {
+      startEdit() {
+        this.$root.store.disablePolling();
+        this.editing = true
+        this.oldText = this.text;
+        this.oldUserName = this.user.name;
+      },
+      abortEdit(event) {
+        if (this.id === null) {
+          this.$emit("close-card-form");
+        } else {
+          this.text = this.oldText;
+          this.user.name = this.oldUserName;
+          this.editing = false;
+        }
+        this.$root.store.enablePolling();
+      },
+      save() {
+        var that = this;
+        let id = this.id || newId();
+        let data = {
+          story: this.storyId,
+          text: this.text,
+          status: this.status,
+          user: this.user.name,
+          revision: this.revision,
+        };
+        send(
+          {
+            type: (this.id === null) ? "POST" : "PUT",
+            url: (this.id === null) ? `${BASE_URL}/cards/` : `${BASE_URL}/cards/${this.id}/`,
+            data: Object.assign({ id: this.id }, data),
+          },
+          { type: "card", op: (this.id === null) ? "create" : "update", id: id, data: data },
+          {
+            id: id,
+            text: this.text,
+            status: this.status,
+            user: { name: this.user.name, color: this.user.color },
+            revision: this.revision,
+          },
+        ).done(
+          function (data) {
+            if (that.id === null) {
+              that.$root.store.addCard({ id: data.id, status: data.status, text: data.text, user: data.user, rank: data.rank, revision: data.revision }, that.storyId);
+              that.$emit("close-card-form");
+            } else {
+              that.$root.store.updateCard(data.id, data.text, data.status, data.user, data.revision, that.storyId);
+              that.editing = false;
+              that.errors = {};
+            }
+            that.$root.store.enablePolling();
+          }
+        ).fail(
+          function (xhr) {
+            DEBUG && console.log(xhr.responseJSON);
+            let current = xhr.responseJSON;
+            let unchanged = current.story === that.storyId && current.text === that.oldText && current.user.name === that.oldUserName;
+            if (xhr.status === 409 && unchanged) {
+              // Only the status changed meanwhile; keep it.
+              that.revision = current.revision;
+              that.status = current.status;
+              that.save();
+              return;
+            } else if (xhr.status === 409) {
+              // Saving again overwrites the other change.
+              that.revision = current.revision;
+              that.errors = conflictErrors(`Changed meanwhile to "${current.text}" (${current.user.name || "nobody"}).`);
+            } else {
+              that.errors = current;
+            }
+            that.$root.store.enablePolling();
+          }
+        );
+      },
+      remove() {
+        this.$root.store.disablePolling();
+        var that = this;
+        send(
+          { type: "DELETE", url: `${BASE_URL}/cards/${this.id}/` },
+          { type: "card", op: "delete", id: this.id },
+          {},
+        ).done(
+          function (data) {
+            that.$root.store.deleteCard(that.id, that.storyId);
+            that.$root.store.enablePolling();
+          }
+        ).fail(
+          function (xhr) {
+            console.log(xhr.responseText);
+            that.$root.store.enablePolling();
+          }
+        );
+      },
+      dragStart(event) {
+        let data = { cardId: this.id, storyId: this.storyId, status: this.status, revision: this.revision };
+        event.dataTransfer.setData("data", JSON.stringify(data));
+      },
+      scrollTo() {
+        slideToAndHighlightCard(this.id);
+        window.location.hash = `#c${this.id}`;
+      },
+    },
+    mounted() {
+      var that = this;
+      this.$nextTick(function () {
+        if (window.location.hash.substr(2) === that.id) {
+          slideToAndHighlightCard(that.id);
+        }
+      })
+    }
+  });
+
+  var app = new Vue({
+    el: '#app',
+    data: {
+      store: store,
+      newStoryForm: false,
+    },
+    methods: {
+      pageQuery(after) {
+        let filters = this.store.state.filters;
+        let query = { limit: PAGE_SIZE };
+        if (after) {
+          query.after = after;
+        }
+        if (filters.q) {
+          query.q = filters.q;
+        }
+        if (filters.user) {
+          query.user = filters.user;
+        }
+        if (filters.status) {
+          query.status = filters.status;
+        }
+        return query;
+      },
+      fetchData() {
+        var that = this;
+        lastFetch = Date.now();
+        if (this.store.state.cursor === null) {
+          $.ajax({
+            type: "GET",
+            url: `${BASE_URL}/stories/`,
+            data: this.pageQuery(null),
+          }).done(
+            function (data) {
+              that.$root.store.set(data.stories, data.cursor, data.next);
+              that.$nextTick(that.loadMoreIfVisible);
+            }
+          ).fail(
+            function (xhr) {
+              console.log(xhr.responseJSON);
+            }
+          );
+        } else {
+          $.ajax({
+            type: "GET",
+            url: `${BASE_URL}/stories/changes/`,
+            data: { since: this.store.state.cursor },
+          }).done(
+            function (data) {
+              that.$root.store.state.stale = false;
+              that.applyChanges(data);
+            }
+          ).fail(
+            function (xhr) {
+              console.log(xhr.responseJSON);
+            }
+          );
+        }
+      },
+      loadMore() {
+        let state = this.store.state;
+        if (state.next === null || state.loading) {
+          return;
+        }
+        var that = this;
+        state.loading = true;
+        $.ajax({
+          type: "GET",
+          url: `${BASE_URL}/stories/`,
+          data: this.pageQuery(state.next),
+        }).done(
+          function (data) {
+            that.$root.store.appendPage(data.stories, data.next);
+            that.$nextTick(that.loadMoreIfVisible);
+          }
+        ).fail(
+          function (xhr) {
+            console.log(xhr.responseJSON);
+          }
+        ).always(
+          function () {
+            state.loading = false;
+          }
+        );
+      },
+      loadMoreIfVisible() {
+        // Load the next page once the end of the board comes into view.
+        let bottom = window.innerHeight + window.scrollY;
+        if (bottom >= document.body.offsetHeight - window.innerHeight / 2) {
+          this.loadMore();
+        }
+      },
+      applyFilters() {
+        this.store.set([], null, null);
+        this.fetchData();
+      },
+      applyChanges(changes) {
+        if (this.store.isFiltered() && (changes.stories.length || changes.cards.length)) {
+          // Changes move stories in and out of the filtered board, which
+          // can't be told from the changes alone.
+          this.applyFilters();
+        } else {
+          this.store.merge(changes);
+        }
+      },
+      refreshData() {
+        // While the event stream is connected, polling is only needed to
+        // catch up on events that arrived during an edit.
+        let state = this.store.state;
+        let due = !state.streaming || state.stale
+          || Date.now() - lastFetch >= STREAM_POLL_INTERVAL;
+        if (state.offline ? state.reconnect : state.queued) {
+          // Try to sync the writes queued while the network was gone.
+          this.flush();
+        } else if (this.store.isPolling() === true && due) {
+          this.fetchData();
+        }
+        setTimeout(this.refreshData, POLL_INTERVAL);
+      },
+      listen() {
+        if (!window.EventSource) {
+          return;
+        }
+        var that = this;
+        const source = new EventSource(`${BASE_URL}/stories/events/`);
+        source.onopen = function () {
+          DEBUG && console.log("stream open");
+          // Events may have been missed while disconnected.
+          that.store.state.streaming = true;
+          that.store.state.stale = true;
+        };
+        source.onerror = function () {
+          DEBUG && console.log("stream error");
+          that.store.state.streaming = false;
+        };
+        source.onmessage = function (event) {
+          that.handleEvent(JSON.parse(event.data));
+        };
+      },
+      handleEvent(changes) {
+        let cursor = this.store.state.cursor;
+        if (cursor === null || changes.cursor <= cursor) {
+          return;
+        }
+        if (this.store.isPolling() !== true) {
+          this.store.state.stale = true;
+        } else if (changes.cursor === cursor + 1) {
+          this.applyChanges(changes);
+        } else {
+          // Every write bumps the cursor by one, so we missed an event.
+          this.fetchData();
+        }
+      },
+      sync() {
+        // Send the queued writes in one request, see sync_view.
+        if (syncing !== null) {
+          return syncing;
+        }
+        var that = this;
+        syncing = queue.load().then(function (records) {
+          if (!records.length) {
+            return;
+          }
+          let operations = compactOperations(records.map(record => record[1]));
+          return $.ajax({
+            type: "POST",
+            url: `${BASE_URL}/sync/`,
+            data: JSON.stringify({ operations: operations }),
+            contentType: "application/json",
+          }).then(function (data) {
+            return queue.remove(records.map(record => record[0])).then(function () {
+              that.store.state.queued -= records.length;
+              that.applySyncResults(operations, data.results);
+            });
+          });
+        }).finally(function () {
+          syncing = null;
+        });
+        return syncing;
+      },
+      applySyncResults(operations, results) {
+        // Deleting a row deleted meanwhile is fine. Other failures leave
+        // local changes the server didn't take: reload the whole board on
+        // the next fetch.
+        let failed = results.filter(
+          (result, i) => result.status >= 400 && !(result.status === 404 && operations[i].op === "delete")
+        );
+        if (failed.length) {
+          DEBUG && console.log("sync failures", failed);
+          this.store.set([], null, null);
+          window.alert(`${failed.length} of the changes made offline couldn't be saved, they conflict with changes made meanwhile or are no longer valid.`);
+        }
+      },
+      flush() {
+        // Sync and go online, or stay offline while the network is gone.
+        var that = this;
+        return this.sync().then(
+          function () {
+            that.store.goOnline();
+            that.fetchData();
+          },
+          function (error) {
+            console.log(error);
+            if (error.status === 0) {
+              that.store.goOffline(true);
+            }
+          }
+        );
+      },
+      togglePolling() {
+        if (this.store.state.offline) {
+          this.store.goOnline();
+          this.flush();
+        } else {
+          this.store.goOffline(false);
+        }
+      },
+      loadQueue() {
+        // Writes queued before the page was loaded.
+        var that = this;
+        queue.load().then(
+          function (records) {
+            that.store.state.queued = records.length;
+            if (records.length) {
+              that.flush();
+            }
+          },
+          function (error) {
+            DEBUG && console.log(error);
+          }
+        );
+      },
+    },
+    computed: {
+      maxCardsByStatus() {
+        // One pass over all cards rather than one per status and column.
+        var max = { TODO: 1, IN_PROGRESS: 1, VERIFY: 1, DONE: 1 };
+        this.store.state.stories.forEach(story => {
+          var counts = { TODO: 0, IN_PROGRESS: 0, VERIFY: 0, DONE: 0 };
+          story.cards.forEach(card => counts[card.status]++);
+          for (const status in max) {
+            max[status] = Math.max(max[status], counts[status]);
+          }
+        });
+        return max;
+      },
+      maxTodoCards() {
+        return this.maxCardsByStatus.TODO;
+      },
+      maxInProgressCards() {
+        return this.maxCardsByStatus.IN_PROGRESS;
+      },
+      maxVerifyCards() {
+        return this.maxCardsByStatus.VERIFY;
+      },
+      maxDoneCards() {
+        return this.maxCardsByStatus.DONE;
+      },
+      maxCards() {
+        return this.maxTodoCards + this.maxInProgressCards + this.maxVerifyCards + this.maxDoneCards;
+      },
+    },
+    beforeMount() {
+      this.refreshData();
+      this.loadQueue();
+      this.listen();
+      window.addEventListener("scroll", this.loadMoreIfVisible);
+    }
+  })
+  function slideToAndHighlightCard(card) {
+    var e = document.getElementById(`c${card}`);
+    if (e !== null) {
+      color = e.style.backgroundColor;
+      e.scrollIntoView();
+      e.animate([
+        { boxShadow: 'none' },
+        { boxShadow: `0px 0px 10px 7px ${color}`, offset: 0.25 },
+        { boxShadow: `0px 0px 10px 7px ${color}`, offset: 0.75 },
+        { boxShadow: 'none' },
+      ], {
+        delay: 500,
+        direction: 'normal',
+        duration: 4000,
+        easing: 'ease',
+      });
+    }
+  }
+  slideToAndHighlightCard(window.location.hash.substr(1));
+  window.addEventListener('hashchange', function() {slideToAndHighlightCard(window.location.hash.substr(1));});
+});
@@ -0,0 +1,121 @@
+"""Card statistics of boards, maintained incrementally.
+
+``CardCount`` holds the number of open cards per story, status and user. The
+write paths pass the cards before and after each write to ``update_counts()``
+instead of counting cards again, so the statistics of a board only sum its
+count rows, which are few compared to its cards.
+
+The burndown comes from the ``DailyCount`` snapshots recorded by
+``Board.bump()`` on the first write of a day. Days without a snapshot had no
+writes and end like the previous day.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import Subquery
+from django.utils import timezone
+
+from .db import upsert
+from .models import Board, Card, CardCount, DailyCount
+
+
+def card_key(card):
+    return (card.board_id, card.story_id, card.status, card.user_id or "")
+
+
+def update_counts(removed=(), added=()):
+    """Stop counting the cards ``removed`` by a write, which were open before
+    it, and count the cards ``added`` by it, skipping done cards and other
+    rows. Call it in the write's transaction."""
+    deltas = Counter()
+    for card in removed:
+        deltas[card_key(card)] -= 1
+    for card in added:
+        if isinstance(card, Card) and not card.done:
+            deltas[card_key(card)] += 1
+    counts = [
+        CardCount(
+            board_id=board,
+            story_id=story,
+            status=status,
+            user_name=user_name,
+            count=delta,
+        )
+        for (board, story, status, user_name), delta in deltas.items()
+        if delta
+    ]
+    upsert(
+        CardCount, counts, ["story", "status", "user_name"], increment_fields=["count"]
+    )
+
+
+def get_counted(model, pks):
+    """Return the rows ``pks`` of ``model`` as they count before a write, i.e.
+    the open cards. Other models don't count."""
+    if model is not Card:
+        return []
+    return list(
+        Card.objects.filter(pk__in=pks, done=False).only(
+            "board", "story", "status", "user", "rank", "done"
+        )
+    )
+
+
+def get_stats(board):
+    """Return the number of open cards of the board's open stories by status,
+    by user and status, and by story and status, and the largest number of
+    cards in each status of any story."""
+    statuses = Card.Status.values
+    totals = dict.fromkeys(statuses, 0)
+    users = defaultdict(lambda: dict.fromkeys(statuses, 0))
+    stories = defaultdict(lambda: dict.fromkeys(statuses, 0))
+    rows = CardCount.objects.filter(
+        board=board, story__done=False, count__gt=0
+    ).values_list("story", "status", "user_name", "count")
+    for story, status, user_name, count in rows:
+        totals[status] += count
+        users[user_name][status] += count
+        stories[str(story)][status] += count
+    largest = {
+        status: max([counts[status] for counts in stories.values()], default=0)
+        for status in statuses
+    }
+    return {
+        "statuses": totals,
+        "users": dict(users),
+        "stories": dict(stories),
+        "max": largest,
+    }
+
+
+def get_burndown(board, days):
+    """Return the number of open cards by status at the end of each of the
+    last ``days`` days, today's being the current one. Raise
+    ``Board.DoesNotExist`` if there is no such board."""
+    stats_date = Board.objects.values_list("stats_date", flat=True).get(pk=board)
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    # The snapshot of the last day with writes before the start carries over.
+    previous = (
+        DailyCount.objects.filter(board=board, date__lt=start)
+        .order_by("-date")
+        .values("date")[:1]
+    )
+    snapshots = defaultdict(dict)
+    rows = DailyCount.objects.filter(board=board, date__gte=start)
+    rows |= DailyCount.objects.filter(board=board, date=Subquery(previous))
+    for date, status, count in rows.values_list("date", "status", "count"):
+        snapshots[date][status] = count
+    current = CardCount.totals(board)
+
+    counts = dict.fromkeys(Card.Status.values, 0)
+    counts.update(next((snapshots[date] for date in snapshots if date < start), {}))
+    result = []
+    for day in (start + timedelta(days=i) for i in range(days)):
+        if day >= stats_date:
+            # No writes since, the day ends with the current counts.
+            counts = current
+        elif day in snapshots:
+            counts = dict(counts, **snapshots[day])
+        result.append(dict(counts, date=day.isoformat()))
+    return result
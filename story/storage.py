@@ -0,0 +1,59 @@
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import compress, get_encodings
+
+# Fonts like WOFF and images are compressed already.
+COMPRESSIBLE = {".css", ".eot", ".html", ".js", ".json", ".map", ".svg", ".ttf", ".txt"}
+
+# File suffix of the compressed variants by content coding.
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Store static files under names containing a hash of their content, like
+    ManifestStaticFilesStorage, and next to them their gzip and, when brotli is
+    installed, Brotli compressed variants, which static_view serves to clients
+    accepting them.
+
+    Files missing from the manifest, e.g. in tests without collectstatic, are
+    referenced under their original names.
+    """
+
+    _hashed_names = None
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1] in COMPRESSIBLE:
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        for encoding in get_encodings():
+            suffix = SUFFIXES[encoding]
+            compressed = compress(content, encoding, best=True)
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self.save(name + suffix, ContentFile(compressed))
+
+    def is_hashed(self, name):
+        """Whether ``name`` is the hashed name of a file, which never changes
+        its content and can be cached forever."""
+        if self._hashed_names is None:
+            self._hashed_names = frozenset(self.hashed_files.values())
+        return name in self._hashed_names
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from story.assets import ASSETS, CDN_URL, VENDOR_PATH
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def is_vendored(path):
+    return finders.find(path) is not None
+
+
+@receiver(setting_changed)
+def reset_vendored(*, setting, **kwargs):
+    if setting in {"STATICFILES_DIRS", "STATICFILES_FINDERS", "INSTALLED_APPS"}:
+        is_vendored.cache_clear()
+
+
+@register.simple_tag
+def asset(name):
+    """Render the tag loading a third-party asset, see story.assets.
+
+    Vendored assets are served as static files. They come without integrity
+    hash, as collectstatic rewrites the URLs in stylesheets. Other assets are
+    loaded from the CDN if ``ASSETS_CDN_FALLBACK`` is enabled.
+    """
+    path = VENDOR_PATH + name
+    if is_vendored(path):
+        url, attrs = static(path), ""
+    elif not settings.ASSETS_CDN_FALLBACK:
+        raise ImproperlyConfigured(
+            f"The asset {name} is not vendored, run 'manage.py vendor_assets'."
+        )
+    else:
+        url = CDN_URL + name
+        attrs = format_html(' integrity="{}" crossorigin="anonymous"', ASSETS[name])
+    if name.endswith(".css"):
+        return format_html('<link rel="stylesheet" href="{}"{}>', url, attrs)
+    return format_html('<script src="{}"{}></script>', url, attrs)
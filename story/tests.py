@@ -1,17 +1,65 @@
+import asyncio
+import gzip
+import json
 import os
+import random
+import re
+import tempfile
+import threading
 import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from itertools import cycle, islice
+from unittest import SkipTest, mock, skipIf
+from urllib.parse import urlencode
 
-from django.test import LiveServerTestCase
+from django.contrib.staticfiles.testing import StaticLiveServerTestCase
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, Prefetch
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver import Chrome, ChromeOptions, Firefox, FirefoxOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
-from .models import Card, Story, User
+from . import compression, ranks, serializers
+from .assets import ASSETS, CDN_URL, VENDOR_PATH, check_vendored_assets
+from .benchmark import Benchmark, ClientTarget, seed_board
+from .compression import brotli
+from .events import InProcessBroker, events_application, get_broker
+from .forms import CardForm
+from .metrics import registry
+from .middleware import PRIMARY_COOKIE, ReplicaMiddleware
+from .models import (
+    ArchivedCard,
+    ArchivedStory,
+    Board,
+    Card,
+    SearchDocument,
+    Story,
+    User,
+    user_cache,
+)
+from .routers import ReplicaRouter, current_database
+from .transfer import export_application, export_board
+from .views import board_snapshot_key, build_board_snapshot
 
 
-class SeleniumTests(LiveServerTestCase):
+class SeleniumTests(StaticLiveServerTestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -39,6 +87,13 @@ class SeleniumTests(LiveServerTestCase):
             EC.presence_of_element_located((By.CLASS_NAME, "board"))
         )
 
+    def post(self, name, data):
+        # Write through the API: rows inserted with the ORM don't bump the
+        # board's version, so polling clients never get them.
+        response = self.client.post(reverse(name), data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["id"]
+
     def test_empty_board_renders(self):
         board = self.go_to_board()
 
@@ -56,10 +111,10 @@ class SeleniumTests(LiveServerTestCase):
 
     def test_go_offline(self):
         self.go_to_board()
-        story_obj = Story.objects.create(title="My first Story")
+        story_id = self.post("stories", {"title": "My first Story"})
 
         WebDriverWait(self.selenium, 11).until(
-            EC.presence_of_element_located((By.ID, f"s{story_obj.pk}"))
+            EC.presence_of_element_located((By.ID, f"s{story_id}"))
         )
 
         toggle_polling = self.selenium.find_element_by_name("toggle-polling")
@@ -69,12 +124,20 @@ class SeleniumTests(LiveServerTestCase):
         self.assertEqual(toggle_polling.text, "Go Online")
         self.assertIn("alert", toggle_polling.get_attribute("class"))
 
-        card_obj = Card.objects.create(text="My first Task", story=story_obj)
+        card_id = self.post(
+            "cards", {"story": story_id, "status": "TODO", "text": "My first Task"}
+        )
 
         self.assertRaises(
             TimeoutException,
             WebDriverWait(self.selenium, 11).until,
-            EC.presence_of_element_located((By.ID, f"c{card_obj.pk}")),
+            EC.presence_of_element_located((By.ID, f"c{card_id}")),
+        )
+
+        # Back online, the card comes with the changes since the last poll.
+        toggle_polling.click()
+        WebDriverWait(self.selenium, 11).until(
+            EC.presence_of_element_located((By.ID, f"c{card_id}"))
         )
 
     def test_go_online(self):
@@ -84,12 +147,12 @@ class SeleniumTests(LiveServerTestCase):
         self.assertEqual(toggle_polling.text, "Go Online")
         self.assertIn("alert", toggle_polling.get_attribute("class"))
 
-        story_obj = Story.objects.create(title="My first Story")
+        story_id = self.post("stories", {"title": "My first Story"})
 
         self.assertRaises(
             TimeoutException,
             WebDriverWait(self.selenium, 11).until,
-            EC.presence_of_element_located((By.ID, f"s{story_obj.pk}")),
+            EC.presence_of_element_located((By.ID, f"s{story_id}")),
         )
 
         toggle_polling.click()
@@ -97,7 +160,7 @@ class SeleniumTests(LiveServerTestCase):
         self.assertIn("success", toggle_polling.get_attribute("class"))
 
         WebDriverWait(self.selenium, 11).until(
-            EC.presence_of_element_located((By.ID, f"s{story_obj.pk}"))
+            EC.presence_of_element_located((By.ID, f"s{story_id}"))
         )
 
     def test_add_story_button_click(self):
@@ -181,3 +244,1805 @@ class SeleniumTests(LiveServerTestCase):
         self.assertEqual(title.text, "My first Task")
         link = story.find_element_by_css_selector(".display .user")
         self.assertEqual(link.text, "Jane")
+
+
+class BoardETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story = Story.objects.create(title="My first Story")
+        Card.objects.create(story=self.story, text="My first Task")
+
+    def test_unchanged_board_is_not_modified(self):
+        response = self.client.get(reverse("stories"))
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("stories"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_etag(self):
+        etag = self.client.get(reverse("stories"))["ETag"]
+        self.client.post(
+            reverse("cards"),
+            {"story": self.story.pk, "status": "TODO", "text": "Another Task"},
+        )
+        response = self.client.get(reverse("stories"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etag = response["ETag"]
+        card = Card.objects.first()
+        self.client.delete(reverse("cards_detail", args=[card.pk]))
+        response = self.client.get(reverse("stories"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class AsyncViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story = Story.objects.create(title="My first Story")
+        Card.objects.create(story=self.story, text="My first Task")
+
+    async def test_index_sets_csrf_cookie(self):
+        response = await self.async_client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("csrftoken", response.cookies)
+
+    async def test_stories(self):
+        response = await self.async_client.get(reverse("stories"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["stories"][0]["title"], "My first Story")
+        # Queries run on another thread are counted, too.
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+        response = await self.async_client.get(
+            reverse("stories"), **{"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "test_cache",
+            }
+        }
+    )
+    def test_stories_with_database_cache(self):
+        call_command("createcachetable", verbosity=0)
+        for _ in range(2):
+            response = self.client.get(reverse("stories"))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["stories"][0]["title"], "My first Story")
+        self.assertIsNotNone(cache.get(board_snapshot_key("default")))
+
+    async def test_stories_changes(self):
+        response = await self.async_client.get(reverse("stories_changes") + "?since=-1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["stories"]), 1)
+
+        response = await self.async_client.get(reverse("stories_changes"))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_methods(self):
+        response = await self.async_client.put(reverse("stories"))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response["Allow"], "GET, POST")
+        response = await self.async_client.post(reverse("stories_changes"))
+        self.assertEqual(response.status_code, 405)
+
+    def test_create_story(self):
+        response = self.client.post(reverse("stories"), {"title": "Another Story"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Another Story")
+        response = self.client.post(reverse("stories"), {})
+        self.assertEqual(response.status_code, 400)
+
+
+class StoryPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stories = [Story.objects.create(title=f"Story {i}") for i in range(5)]
+        self.stories.sort(key=lambda story: str(story.pk))
+        alice = User.objects.create(name="alice")
+        for story in self.stories:
+            Card.objects.create(story=story, text="Write tests", user=alice)
+            Card.objects.create(story=story, text="Deploy", status="DONE")
+        self.stories[0].title = "Release"
+        self.stories[0].save()
+
+    def get(self, **params):
+        response = self.client.get(reverse("stories"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages(self):
+        ids = []
+        data = self.get(limit=2)
+        while True:
+            self.assertLessEqual(len(data["stories"]), 2)
+            ids += [story["id"] for story in data["stories"]]
+            if data["next"] is None:
+                break
+            data = self.get(limit=2, after=data["next"])
+        self.assertEqual(ids, [str(story.pk) for story in self.stories])
+        self.assertEqual(len(data["stories"][0]["cards"]), 2)
+
+    def test_page_queries(self):
+        # Load the user cache.
+        self.get(limit=2)
+        with self.assertNumQueries(4):
+            self.get(limit=2)
+
+    def test_unpaginated_board(self):
+        data = self.get()
+        self.assertNotIn("next", data)
+        self.assertEqual(len(data["stories"]), 5)
+
+    def test_filters(self):
+        Card.objects.filter(story=self.stories[1], status="DONE").delete()
+        data = self.get(status="DONE")
+        self.assertEqual(len(data["stories"]), 4)
+        for story in data["stories"]:
+            self.assertEqual([card["text"] for card in story["cards"]], ["Deploy"])
+
+        data = self.get(user="alice", status=["TODO", "DONE"])
+        self.assertEqual(len(data["stories"]), 5)
+        for story in data["stories"]:
+            self.assertEqual([card["text"] for card in story["cards"]], ["Write tests"])
+
+        data = self.get(q="deploy")
+        self.assertEqual(len(data["stories"]), 4)
+        data = self.get(q="release")
+        self.assertEqual([story["title"] for story in data["stories"]], ["Release"])
+        self.assertEqual(len(data["stories"][0]["cards"]), 2)
+        self.assertEqual(self.get(user="bob")["stories"], [])
+
+    def test_invalid_parameters(self):
+        for params in [{"limit": 0}, {"limit": 1000}, {"after": "x"}, {"status": "X"}]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("stories"), params)
+                self.assertEqual(response.status_code, 400)
+
+
+class StoryChangesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story = Story.objects.create(title="My first Story")
+        self.other_story = Story.objects.create(title="My second Story")
+        self.card = Card.objects.create(story=self.story, text="My first Task")
+        Card.objects.create(story=self.story, text="My second Task")
+
+    def get_changes(self, since):
+        response = self.client.get(reverse("stories_changes"), {"since": since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_snapshot_contains_cursor(self):
+        cursor = self.client.get(reverse("stories")).json()["cursor"]
+        self.assertEqual(self.get_changes(cursor)["cards"], [])
+
+    def test_move_and_delete(self):
+        cursor = self.client.get(reverse("stories")).json()["cursor"]
+        self.client.post(
+            reverse("cards_move", args=[self.card.pk]),
+            {"story": self.other_story.pk, "status": "VERIFY"},
+        )
+        data = self.get_changes(cursor)
+        self.assertEqual(data["stories"], [])
+        self.assertEqual(len(data["cards"]), 1)
+        self.assertEqual(data["cards"][0]["id"], str(self.card.pk))
+        self.assertEqual(data["cards"][0]["story"], str(self.other_story.pk))
+        self.assertEqual(data["cards"][0]["status"], "VERIFY")
+        self.assertIs(data["cards"][0]["done"], False)
+
+        cursor = data["cursor"]
+        self.client.delete(reverse("stories_detail", args=[self.story.pk]))
+        data = self.get_changes(cursor)
+        self.assertEqual(data["cards"], [])
+        self.assertEqual(len(data["stories"]), 1)
+        self.assertEqual(data["stories"][0]["id"], str(self.story.pk))
+        self.assertIs(data["stories"][0]["done"], True)
+
+    def test_user_change_marks_cards(self):
+        self.client.put(
+            reverse("cards_detail", args=[self.card.pk]),
+            urlencode(
+                {"story": self.story.pk, "status": "TODO", "text": "T", "user": "Jane"}
+            ),
+        )
+        cursor = self.client.get(reverse("stories")).json()["cursor"]
+        self.client.post(
+            reverse("users"),
+            {
+                "form-TOTAL_FORMS": "1",
+                "form-INITIAL_FORMS": "1",
+                "form-0-name": "Jane",
+                "form-0-color": "55d4f5",
+            },
+        )
+        cards = self.get_changes(cursor)["cards"]
+        self.assertEqual(len(cards), 1)
+        self.assertEqual(cards[0]["user"], {"name": "Jane", "color": "55d4f5"})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("stories_changes"), {"since": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, board, event):
+        self.events.append(event)
+
+
+@override_settings(EVENT_BROKER="story.tests.RecordingBroker")
+class EventsTests(TestCase):
+    def test_writes_publish_events(self):
+        story = Story.objects.create(title="My first Story")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("cards"), {"story": story.pk, "status": "TODO", "text": "Task"}
+            )
+        card = Card.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("cards_detail", args=[card.pk]))
+
+        created, deleted = get_broker().events
+        self.assertEqual(created["cards"][0]["id"], str(card.pk))
+        self.assertIs(created["cards"][0]["done"], False)
+        self.assertEqual(deleted["cursor"], created["cursor"] + 1)
+        self.assertIs(deleted["cards"][0]["done"], True)
+
+    @override_settings(EVENT_BROKER="story.events.InProcessBroker")
+    def test_stream(self):
+        messages = []
+
+        async def stream():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+                if message.get("body"):
+                    disconnected.set()
+
+            scope = {"type": "http", "path": "/stories/events/"}
+            task = asyncio.ensure_future(
+                events_application(scope, receive, send, "default")
+            )
+            while not get_broker()._subscriptions:
+                await asyncio.sleep(0)
+            get_broker().publish("default", {"cursor": 1, "stories": [], "cards": []})
+            await task
+
+        asyncio.run(stream())
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual(
+            messages[1]["body"], b'data: {"cursor": 1, "stories": [], "cards": []}\n\n'
+        )
+        self.assertEqual(messages[-1]["body"], b"")
+
+
+class BoardSnapshotCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story = Story.objects.create(title="My first Story")
+        self.card = Card.objects.create(story=self.story, text="My first Task")
+
+    def test_snapshot_is_cached(self):
+        response = self.client.get(reverse("stories"))
+        self.assertEqual(response["Content-Type"], "application/json")
+        data = response.json()
+        self.assertEqual(data["stories"][0]["cards"][0]["text"], "My first Task")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("stories"))
+        self.assertEqual(response.json(), data)
+
+    def test_write_invalidates_snapshot(self):
+        self.client.get(reverse("stories"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("cards_move", args=[self.card.pk]),
+                {"story": self.story.pk, "status": "DONE"},
+            )
+        self.assertIsNone(cache.get(board_snapshot_key("default")))
+        data = self.client.get(reverse("stories")).json()
+        self.assertEqual(data["stories"][0]["cards"][0]["status"], "DONE")
+
+    def test_stale_snapshot_is_ignored(self):
+        # Another process may have written without clearing our cache.
+        self.client.get(reverse("stories"))
+        self.client.delete(reverse("cards_detail", args=[self.card.pk]))
+        data = self.client.get(reverse("stories")).json()
+        self.assertEqual(data["stories"][0]["cards"], [])
+
+
+class SerializerTests(TestCase):
+    def setUp(self):
+        jane = User.objects.create(name="Jane", color="55d4f5")
+        john = User.objects.create(name="John")
+        for i in range(3):
+            story = Story.objects.create(title=f"Story \u00fc{i}", link="http://x/")
+            Card.objects.create(story=story, text='Todo \n"/', user=jane)
+            Card.objects.create(story=story, text="Verify", status="VERIFY")
+            Card.objects.create(story=story, text="In progress", user=john)
+            Card.objects.create(story=story, text="Removed", done=True)
+        Story.objects.create(title="Removed", done=True)
+
+    def test_board_matches_model_serialization(self):
+        cards_qs = Card.objects.filter(done=False).select_related("user")
+        stories = (
+            Story.objects.filter(done=False)
+            .order_by("id")
+            .prefetch_related(Prefetch("cards", queryset=cards_qs))
+        )
+        expected = {
+            "cursor": 42,
+            "stories": [
+                serializers.serialize_story(story, with_cards=True) for story in stories
+            ],
+        }
+        data = serializers.serialize_board("default", 42)
+        # Cards are in the order of the index read.
+        for story in expected["stories"] + data["stories"]:
+            story["cards"].sort(key=lambda card: card["id"])
+        self.assertEqual(data, expected)
+        # Users are looked up in the (now warm) user cache.
+        with self.assertNumQueries(2):
+            serializers.serialize_board("default", 42)
+
+    @skipIf(serializers.orjson is None, "orjson is not installed")
+    def test_encoders_are_identical(self):
+        data = serializers.serialize_board("default", 42)
+        fast = serializers.dumps(data)
+        with mock.patch.object(serializers, "orjson", None):
+            self.assertEqual(serializers.dumps(data), fast)
+
+
+class ExplainBoardTests(TestCase):
+    def test_board_queries_use_indexes(self):
+        story = Story.objects.create(title="My first Story")
+        Card.objects.create(story=story, text="My first Task")
+        stdout = StringIO()
+        call_command("explain_board", since=-1, stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn("GET /stories/changes/", output)
+        self.assertIn("story_open_idx", output)
+        self.assertIn("card_open_idx", output)
+
+
+class CompactBoardTests(TestCase):
+    def setUp(self):
+        old = timezone.now() - timedelta(days=31)
+        recent = timezone.now() - timedelta(days=1)
+        self.old_story = Story.objects.create(title="Old", done=True, done_at=old)
+        self.old_story_card = Card.objects.create(story=self.old_story, text="A")
+        self.recent_story = Story.objects.create(
+            title="Recent", done=True, done_at=recent
+        )
+        self.story = Story.objects.create(title="Open")
+        self.old_card = Card.objects.create(
+            story=self.story, text="B", done=True, done_at=old
+        )
+        self.recent_card = Card.objects.create(
+            story=self.story, text="C", done=True, done_at=recent
+        )
+        self.open_card = Card.objects.create(story=self.story, text="D")
+
+    def test_compact(self):
+        call_command("compact_board", days=30, batch_size=1, stdout=StringIO())
+        self.assertQuerysetEqual(
+            Story.objects.order_by("title"),
+            [self.story, self.recent_story],
+            transform=lambda story: story,
+        )
+        self.assertQuerysetEqual(
+            Card.objects.order_by("text"),
+            [self.recent_card, self.open_card],
+            transform=lambda card: card,
+        )
+        self.assertEqual(ArchivedStory.objects.get().pk, self.old_story.pk)
+        self.assertEqual(
+            set(ArchivedCard.objects.values_list("pk", flat=True)),
+            {self.old_story_card.pk, self.old_card.pk},
+        )
+
+    def test_archive_api(self):
+        call_command("compact_board", stdout=StringIO())
+        data = self.client.get(reverse("archive_stories")).json()
+        self.assertEqual(data["num_pages"], 1)
+        self.assertEqual([s["id"] for s in data["stories"]], [str(self.old_story.pk)])
+
+        url = reverse("archive_stories_detail", args=[self.old_story.pk])
+        data = self.client.get(url).json()
+        self.assertEqual(data["title"], "Old")
+        self.assertEqual([c["text"] for c in data["cards"]], ["A"])
+
+        url = reverse("archive_cards_detail", args=[self.old_card.pk])
+        data = self.client.get(url).json()
+        self.assertEqual(data["story"], str(self.story.pk))
+        self.assertEqual(data["text"], "B")
+
+        for path in ["/archive/stories/x/", "/archive/cards/x/"]:
+            self.assertEqual(self.client.get(path).status_code, 404)
+
+
+class OptimisticConcurrencyTests(TestCase):
+    def setUp(self):
+        self.story = Story.objects.create(title="My first Story")
+        self.card = Card.objects.create(
+            story=self.story,
+            text="My first Task",
+            user=User.objects.create(name="Jane"),
+            revision=3,
+        )
+
+    def put_card(self, **data):
+        data = {"story": self.story.pk, "status": "TODO", "text": "Edited", **data}
+        return self.client.put(
+            reverse("cards_detail", args=[self.card.pk]),
+            urlencode(data),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    def test_update(self):
+        response = self.put_card(revision=3)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["text"], "Edited")
+        self.assertEqual(data["revision"], Board.current("default"))
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.revision, data["revision"])
+        self.assertIsNone(self.card.user)
+
+    def test_update_without_revision(self):
+        self.assertEqual(self.put_card().status_code, 200)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.text, "Edited")
+
+    def test_conflict(self):
+        version = Board.current("default")
+        response = self.put_card(revision=2, user="John")
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertEqual(data["text"], "My first Task")
+        self.assertEqual(data["revision"], 3)
+        self.assertEqual(data["story"], str(self.story.pk))
+        # Nothing was written.
+        self.assertEqual(Board.current("default"), version)
+        self.assertFalse(User.objects.filter(name="John").exists())
+
+    def test_not_found(self):
+        Card.objects.filter(pk=self.card.pk).update(done=True)
+        self.assertEqual(self.put_card(revision=3).status_code, 404)
+
+    def test_move(self):
+        url = reverse("cards_move", args=[self.card.pk])
+        response = self.client.post(url, {"story": self.story.pk, "status": "DONE"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        # Fields not sent are read back.
+        self.assertEqual(data["text"], "My first Task")
+        self.assertEqual(data["user"]["name"], "Jane")
+
+        data = {"story": self.story.pk, "status": "TODO", "revision": 3}
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["status"], "DONE")
+
+    def test_story_conflict(self):
+        url = reverse("stories_detail", args=[self.story.pk])
+        data = {"title": "Edited", "revision": self.story.revision + 1}
+        response = self.client.put(
+            url, urlencode(data), content_type="application/x-www-form-urlencoded"
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["title"], "My first Story")
+
+    def test_bulk_conflict(self):
+        data = {"story": str(self.story.pk), "status": "DONE", "revision": 2}
+        response = self.client.post(
+            reverse("cards_bulk"),
+            json.dumps(
+                {"operations": [{"op": "move", "id": str(self.card.pk), "data": data}]}
+            ),
+            content_type="application/json",
+        )
+        (result,) = response.json()["results"]
+        self.assertEqual(result["status"], 409)
+        self.assertEqual(result["card"]["status"], "TODO")
+
+
+class SingleStatementWriteTests(TestCase):
+    def setUp(self):
+        self.story = Story.objects.create(title="My first Story")
+        self.card = Card.objects.create(
+            story=self.story, text="My first Task", user=User.objects.create(name="J")
+        )
+        # Load the user cache.
+        Board.current("default")
+        serializers.serialize_user("J")
+
+    def assertWrites(self, statements):
+        # Besides the savepoint around the transaction and the write to the
+        # search index.
+        statements += 1
+        return self.assertNumQueries(statements + 2)
+
+    def test_delete_story(self):
+        with self.assertWrites(2):
+            response = self.client.delete(
+                reverse("stories_detail", args=[self.story.pk])
+            )
+        self.assertEqual(response.status_code, 204)
+        self.story.refresh_from_db()
+        self.assertTrue(self.story.done)
+        self.assertIsNotNone(self.story.done_at)
+        self.assertEqual(self.story.revision, Board.current("default"))
+
+    def test_delete_card(self):
+        # Besides bump and UPDATE, the card is no longer counted.
+        with self.assertWrites(3):
+            response = self.client.delete(reverse("cards_detail", args=[self.card.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.card.refresh_from_db()
+        self.assertTrue(self.card.done)
+        self.assertEqual(self.card.revision, Board.current("default"))
+
+    def test_delete_missing(self):
+        version = Board.current("default")
+        Card.objects.filter(pk=self.card.pk).update(done=True)
+        response = self.client.delete(reverse("cards_detail", args=[self.card.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Board.current("default"), version)
+
+    def test_move(self):
+        url = reverse("cards_move", args=[self.card.pk])
+        data = {"story": self.story.pk, "status": "VERIFY"}
+        # The form and the model validate the story, then bump, read the card
+        # as counted in the statistics and the last rank of the column it goes
+        # to, UPDATE and count it again.
+        with self.assertWrites(7):
+            response = self.client.post(url, data)
+        self.assertEqual(response.json()["user"]["name"], "J")
+        self.assertEqual(response.json()["status"], "VERIFY")
+
+        response = self.client.post(url, {"story": self.story.pk, "status": "X"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_returning_fallback(self):
+        with mock.patch("story.db.can_return_from_update", return_value=False):
+            response = self.client.delete(reverse("cards_detail", args=[self.card.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.card.refresh_from_db()
+        self.assertTrue(self.card.done)
+
+
+class CardsBulkTests(TestCase):
+    def setUp(self):
+        self.story = Story.objects.create(title="My first Story")
+        self.card = Card.objects.create(story=self.story, text="My first Task")
+        self.other_card = Card.objects.create(story=self.story, text="Another Task")
+
+    def bulk(self, operations):
+        return self.client.post(
+            reverse("cards_bulk"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+
+    def test_operations(self):
+        story_id = str(self.story.pk)
+        response = self.bulk(
+            [
+                {
+                    "op": "create",
+                    "data": {"story": story_id, "status": "TODO", "text": "New"},
+                },
+                {
+                    "op": "update",
+                    "id": str(self.card.pk),
+                    "data": {
+                        "story": story_id,
+                        "status": "TODO",
+                        "text": "Edited",
+                        "user": "Jane",
+                    },
+                },
+                {
+                    "op": "move",
+                    "id": str(self.card.pk),
+                    "data": {"story": story_id, "status": "VERIFY"},
+                },
+                {"op": "delete", "id": str(self.other_card.pk)},
+                {"op": "move", "id": str(self.other_card.pk), "data": {}},
+                {"op": "create", "data": {"story": story_id}},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [result["status"] for result in data["results"]],
+            [200, 200, 200, 204, 404, 400],
+        )
+        self.assertEqual(data["results"][0]["card"]["text"], "New")
+        self.assertEqual(data["results"][2]["card"]["status"], "VERIFY")
+        self.assertEqual(data["results"][2]["card"]["user"]["name"], "Jane")
+        self.assertIn("text", data["results"][5]["errors"])
+
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.text, "Edited")
+        self.assertEqual(self.card.status, "VERIFY")
+        self.assertEqual(self.card.user_id, "Jane")
+        self.assertEqual(self.card.revision, data["cursor"])
+        self.other_card.refresh_from_db()
+        self.assertIs(self.other_card.done, True)
+        self.assertEqual(Card.objects.filter(done=False).count(), 2)
+
+    def test_invalid_payload(self):
+        response = self.client.post(
+            reverse("cards_bulk"), "[]", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_operations(self):
+        card_id = str(self.card.pk)
+        response = self.bulk(
+            [
+                {"op": ["update"], "id": card_id, "data": {}},
+                {"op": "update", "id": card_id, "data": "x"},
+                {"op": "create", "data": ["a"]},
+                {"op": "delete", "id": card_id, "data": 1},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], [400] * 4)
+        self.assertIn("op", results[0]["errors"])
+        self.assertIn("data", results[1]["errors"])
+        self.assertIn("data", results[2]["errors"])
+        self.assertIn("data", results[3]["errors"])
+        self.card.refresh_from_db()
+        self.assertIs(self.card.done, False)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.story = Story.objects.create(title="My first Story", revision=1)
+        self.card = Card.objects.create(story=self.story, text="Task", revision=1)
+
+    def sync(self, operations):
+        response = self.client.post(
+            reverse("sync"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sync(self):
+        story_id = str(uuid.uuid4())
+        card_id = str(uuid.uuid4())
+        operations = [
+            {"type": "story", "op": "create", "id": story_id, "data": {"title": "New"}},
+            {
+                "type": "card",
+                "op": "create",
+                "id": card_id,
+                "data": {"story": story_id, "status": "TODO", "text": "Offline"},
+            },
+            {
+                "type": "card",
+                "op": "move",
+                "id": card_id,
+                "data": {"story": story_id, "status": "VERIFY"},
+            },
+            {
+                "type": "story",
+                "op": "update",
+                "id": str(self.story.pk),
+                "data": {"title": "Renamed", "revision": 1},
+            },
+            {"type": "card", "op": "delete", "id": str(self.card.pk)},
+        ]
+        data = self.sync(operations)
+        self.assertEqual(
+            [result["status"] for result in data["results"]], [200, 200, 200, 200, 204]
+        )
+        self.assertEqual(data["results"][0]["story"]["id"], story_id)
+        self.assertEqual(data["results"][2]["card"]["status"], "VERIFY")
+        self.assertEqual(data["results"][3]["story"]["title"], "Renamed")
+        cursor = data["cursor"]
+        self.assertEqual(Board.objects.get().version, cursor)
+        card = Card.objects.get(pk=card_id)
+        self.assertEqual((card.status, card.revision), ("VERIFY", cursor))
+        self.story.refresh_from_db()
+        self.assertEqual((self.story.title, self.story.revision), ("Renamed", cursor))
+        self.card.refresh_from_db()
+        self.assertIs(self.card.done, True)
+
+        changes = self.client.get(reverse("stories_changes"), {"since": 0}).json()
+        self.assertEqual(len(changes["stories"]), 2)
+        self.assertEqual(len(changes["cards"]), 2)
+        stats = self.client.get(reverse("stats")).json()
+        self.assertEqual(stats["statuses"]["VERIFY"], 1)
+        self.assertEqual(stats["statuses"]["TODO"], 0)
+        response = self.client.get(reverse("search"), {"q": "offline"})
+        self.assertEqual(response.json()["hits"][0]["id"], card_id)
+
+        # A replayed sync writes nothing new.
+        data = self.sync(operations[:2])
+        self.assertIsNone(data["cursor"])
+        self.assertEqual([result["status"] for result in data["results"]], [200, 200])
+        self.assertEqual(data["results"][1]["card"]["status"], "VERIFY")
+        self.assertEqual(Card.objects.filter(done=False).count(), 1)
+
+    def test_conflict(self):
+        Card.objects.filter(pk=self.card.pk).update(text="Changed", revision=2)
+        data = self.sync(
+            [
+                {
+                    "type": "card",
+                    "op": "update",
+                    "id": str(self.card.pk),
+                    "data": {
+                        "story": str(self.story.pk),
+                        "status": "TODO",
+                        "text": "Mine",
+                        "revision": 1,
+                    },
+                },
+                {
+                    "type": "story",
+                    "op": "update",
+                    "id": str(self.story.pk),
+                    "data": {"title": "Renamed", "revision": 0},
+                },
+            ]
+        )
+        self.assertIsNone(data["cursor"])
+        self.assertEqual([result["status"] for result in data["results"]], [409, 409])
+        self.assertEqual(data["results"][0]["card"]["text"], "Changed")
+        self.assertEqual(data["results"][1]["story"]["title"], "My first Story")
+        self.assertEqual(Board.objects.get().version, 0)
+
+    def test_invalid(self):
+        done = Story.objects.create(title="Done", done=True)
+        data = self.sync(
+            [
+                {"type": "user", "op": "create"},
+                {"type": "story", "op": "move", "id": str(self.story.pk)},
+                {"type": "story", "op": "create", "id": "x", "data": {"title": "T"}},
+                {
+                    "type": "story",
+                    "op": "create",
+                    "id": str(done.pk),
+                    "data": {"title": "T"},
+                },
+                {"type": "story", "op": "delete", "id": str(uuid.uuid4())},
+            ]
+        )
+        self.assertEqual(
+            [result["status"] for result in data["results"]], [400, 400, 400, 400, 404]
+        )
+        self.assertEqual(data["results"][3]["errors"]["id"][0]["code"], "unique")
+        self.assertEqual(Story.objects.count(), 2)
+
+        response = self.client.post(
+            reverse("sync"), "{}", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_type(self):
+        # A bad entry of a client's queue must not fail the whole batch.
+        data = self.sync(
+            [
+                {"type": ["story"], "op": "create", "data": {"title": "T"}},
+                {"type": {"card": 1}, "op": "delete", "id": str(self.card.pk)},
+                {"type": "story", "op": "update", "id": str(self.story.pk), "data": 1},
+                {"type": "story", "op": "create", "data": {"title": "Valid"}},
+            ]
+        )
+        self.assertEqual(
+            [result["status"] for result in data["results"]], [400, 400, 400, 200]
+        )
+        self.assertIn("type", data["results"][0]["errors"])
+        self.assertIn("type", data["results"][1]["errors"])
+        self.assertIn("data", data["results"][2]["errors"])
+        self.assertEqual(Story.objects.filter(title="Valid").count(), 1)
+        self.card.refresh_from_db()
+        self.assertIs(self.card.done, False)
+
+
+class RankTests(TestCase):
+    def setUp(self):
+        self.story = Story.objects.create(title="My first Story")
+        self.cards = [self.create_card(text) for text in ["A", "B", "C"]]
+
+    def create_card(self, text, status="TODO"):
+        data = {"story": self.story.pk, "status": status, "text": text}
+        return self.client.post(reverse("cards"), data).json()["id"]
+
+    def move(self, card, status="TODO", **placement):
+        data = {"story": self.story.pk, "status": status, **placement}
+        response = self.client.post(reverse("cards_move", args=[card]), data)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def column(self, status="TODO"):
+        story = self.client.get(reverse("stories")).json()["stories"][0]
+        return [card["text"] for card in story["cards"] if card["status"] == status]
+
+    def test_rank_between(self):
+        rng = random.Random(0)
+        ranks_list = []
+        for _ in range(500):
+            i = rng.randrange(len(ranks_list) + 1)
+            before = ranks_list[i - 1] if i else None
+            after = ranks_list[i] if i < len(ranks_list) else None
+            rank = ranks.rank_between(before, after)
+            self.assertRegex(rank, ranks.RANK_RE)
+            ranks_list.insert(i, rank)
+        self.assertEqual(ranks_list, sorted(set(ranks_list)))
+        # Appending and moving to the start of a column keep ranks short.
+        rank = None
+        for _ in range(200):
+            rank = ranks.rank_between(rank, None)
+        self.assertLessEqual(len(rank), 12)
+        spread = ranks.spread(100)
+        self.assertEqual(spread, sorted(set(spread)))
+        self.assertLessEqual(max(map(len, spread)), 2)
+
+    def test_reorder(self):
+        self.assertEqual(self.column(), ["A", "B", "C"])
+        # Reordering writes the moved card only.
+        with self.assertNumQueries(9):
+            # The form and the model validate the story, SAVEPOINT, bump, read
+            # the card and its neighbours, UPDATE, upsert the search document,
+            # RELEASE SAVEPOINT
+            card = self.move(self.cards[2], after=self.cards[0], before=self.cards[1])
+        self.assertEqual(self.column(), ["A", "C", "B"])
+        self.move(self.cards[1], before=self.cards[0])
+        self.assertEqual(self.column(), ["B", "A", "C"])
+        # A stale placement leaves the card where it is.
+        self.move(self.cards[0], after=self.cards[2], before=self.cards[1])
+        self.assertEqual(self.column(), ["B", "A", "C"])
+
+        # Cards moved to another column without placement go to its end.
+        other = self.create_card("D", "VERIFY")
+        card = self.move(self.cards[2], "VERIFY")
+        self.assertEqual(self.column("VERIFY"), ["D", "C"])
+        self.assertEqual(Card.objects.get(pk=card["id"]).rank, card["rank"])
+        self.move(self.cards[0], "VERIFY", after=other, before=self.cards[2])
+        self.assertEqual(self.column("VERIFY"), ["D", "A", "C"])
+
+        # Likewise in bulk.
+        response = self.client.post(
+            reverse("cards_bulk"),
+            json.dumps(
+                {
+                    "operations": [
+                        {
+                            "op": "move",
+                            "id": self.cards[2],
+                            "data": {
+                                "story": str(self.story.pk),
+                                "status": "VERIFY",
+                                "after": other,
+                                "before": self.cards[0],
+                            },
+                        },
+                        {
+                            "op": "create",
+                            "data": {
+                                "story": str(self.story.pk),
+                                "status": "VERIFY",
+                                "text": "E",
+                            },
+                        },
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.column("VERIFY"), ["D", "C", "A", "E"])
+
+    def test_rebalance(self):
+        version = Board.current("default")
+        for _ in range(30):
+            self.move(self.cards[2], after=self.cards[0], before=self.cards[1])
+            self.move(self.cards[1], after=self.cards[0], before=self.cards[2])
+        self.assertGreater(len(Card.objects.get(pk=self.cards[1]).rank), 12)
+        stdout = StringIO()
+        call_command("rebalance_ranks", stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "Rebalanced 1 columns of 1 boards.\n")
+        self.assertEqual(self.column(), ["A", "B", "C"])
+        cards = Card.objects.filter(story=self.story)
+        self.assertEqual(max(len(card.rank) for card in cards), 1)
+        self.assertEqual({card.revision for card in cards}, {version + 61})
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.story = Story.objects.create(title="My first Story")
+        User.objects.create(name="Jane", color="55d4f5")
+
+    def test_card_save_uses_cache(self):
+        self.client.get(reverse("stories"))
+        data = {"story": self.story.pk, "status": "TODO", "text": "T", "user": "Jane"}
+        self.client.post(reverse("cards"), data)
+        card = Card.objects.get()
+        self.assertEqual(card.user_id, "Jane")
+
+        form = CardForm(data, instance=card, board="default")
+        self.assertTrue(form.is_valid())
+        with self.assertNumQueries(6):
+            # SAVEPOINT, bump, read the card as counted in the statistics,
+            # UPDATE card, upsert search index, RELEASE SAVEPOINT
+            card = form.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                serializers.serialize_card(card)["user"],
+                {"name": "Jane", "color": "55d4f5"},
+            )
+
+    def test_other_process_changes_are_picked_up(self):
+        Board.current("default")
+        self.assertEqual(user_cache.get_color("Jane"), "55d4f5")
+        # Simulate a change by another process: the local cache isn't cleared.
+        User.objects.filter(pk="Jane").update(color="ff0000")
+        Board.objects.update(users_version=F("users_version") + 1)
+        self.assertEqual(user_cache.get_color("Jane"), "55d4f5")
+        Board.current("default")
+        self.assertEqual(user_cache.get_color("Jane"), "ff0000")
+
+
+@override_settings(
+    SQLITE_PRAGMAS={
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 10000,
+    }
+)
+class SQLiteConcurrencyTests(TransactionTestCase):
+    threads = 8
+    moves = 25
+
+    @classmethod
+    def setUpClass(cls):
+        # Shared-cache in-memory databases fail on concurrent writes instead
+        # of waiting for the lock, so this needs a database file.
+        if connection.vendor != "sqlite" or connection.is_in_memory_db():
+            raise SkipTest("Set DJANGO_TEST_DATABASE_URL to a SQLite file.")
+        super().setUpClass()
+
+    def setUp(self):
+        # Transaction test cases that ran before flushed the migrated board.
+        Board.objects.get_or_create(pk="default")
+
+    def test_concurrent_moves(self):
+        story = Story.objects.create(title="My first Story")
+        cards = [
+            Card.objects.create(story=story, text=f"Task {i}")
+            for i in range(self.threads)
+        ]
+        version = Board.current("default")
+        status_codes = []
+
+        def move(card):
+            client = Client()
+            try:
+                for status in islice(cycle(Card.Status.values), self.moves):
+                    response = client.post(
+                        reverse("cards_move", args=[card.pk]),
+                        {"story": story.pk, "status": status},
+                    )
+                    status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=move, args=(card,)) for card in cards]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes, [200] * self.threads * self.moves)
+        self.assertEqual(Board.current("default"), version + self.threads * self.moves)
+
+
+class BenchmarkTests(TestCase):
+    def test_seed_and_benchmark(self):
+        cache.clear()
+        self.assertEqual(
+            seed_board(stories=8, cards_per_story=3, users=2, done_ratio=0.5), (8, 24)
+        )
+        call_command("compact_board", stdout=StringIO())
+        self.assertEqual(seed_board(stories=1, cards_per_story=1, users=2), (1, 1))
+        self.assertEqual(User.objects.count(), 2)
+        results = Benchmark(ClientTarget(), requests=2).run()
+        names = {result["name"] for result in results}
+        for name in [
+            "archive_cards_detail",
+            "export",
+            "import (10 stories)",
+            "sync (10 operations)",
+        ]:
+            self.assertIn(name, names)
+        for result in results:
+            with self.subTest(result["name"]):
+                self.assertEqual(sum(result["status"].values()), 2)
+                self.assertLess(max(map(int, result["status"])), 400)
+                self.assertIsInstance(result["queries"], int)
+                self.assertIn("p90", result["latency_ms"])
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        story = Story.objects.create(title="My first Story")
+        Card.objects.create(story=story, text="My first Task")
+
+    def test_server_timing(self):
+        response = self.client.get(reverse("stories"))
+        timings = response["Server-Timing"]
+        self.assertIn("total;dur=", timings)
+        self.assertIn("db;dur=", timings)
+        self.assertIn("serialize;dur=", timings)
+        self.assertIn("encode;dur=", timings)
+
+    def test_metrics(self):
+        self.client.get(reverse("stories"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"].split(";")[0], "text/plain")
+        metrics = response.content.decode()
+        self.assertRegex(
+            metrics,
+            r'scraty_requests_total\{view="stories",method="GET",status="200"\} \d+',
+        )
+        self.assertIn('scraty_request_duration_seconds_bucket{view="stories"', metrics)
+        self.assertIn('scraty_db_queries_total{view="stories"}', metrics)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_requests(self):
+        with self.assertLogs("story.performance", "WARNING") as logs:
+            self.client.get(reverse("stories"))
+            data = self.client.get(reverse("slow_requests")).json()
+        self.assertIn("Slow request GET /stories/", logs.output[0])
+        sample = registry.get_slow_requests()[-2]
+        self.assertEqual(sample["view"], "stories")
+        self.assertIn("story_card", " ".join(query["sql"] for query in sample["sql"]))
+        self.assertEqual(data["requests"][-1]["path"], "/stories/")
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        settings = override_settings(STATIC_ROOT=static_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+
+    def test_index_references_hashed_files(self):
+        content = self.client.get(reverse("index")).content.decode()
+        self.assertRegex(content, r'src="/static/story/board\.[0-9a-f]{12}\.js"')
+        self.assertRegex(content, r'href="/static/story/base\.[0-9a-f]{12}\.css"')
+
+    def get_board_js(self, encoding=""):
+        content = self.client.get(reverse("index")).content.decode()
+        url = re.search(r'src="(/static/story/board\.[0-9a-f]{12}\.js)"', content)[1]
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/javascript")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(
+            response["Cache-Control"], "public, max-age=31536000, immutable"
+        )
+        return response, b"".join(response.streaming_content)
+
+    def test_compressed(self):
+        response, plain = self.get_board_js()
+        self.assertNotIn("Content-Encoding", response)
+        response, content = self.get_board_js("gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(content), plain)
+        self.assertLess(len(content), len(plain))
+        if brotli is not None:
+            response, content = self.get_board_js("gzip, deflate, br")
+            self.assertEqual(response["Content-Encoding"], "br")
+            self.assertEqual(brotli.decompress(content), plain)
+
+    def test_unhashed_name(self):
+        response = self.client.get(reverse("static", args=["story/board.js"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=300")
+
+    def test_not_found(self):
+        for path in ["story/missing.js", "../scraty/settings.py", "/etc/passwd"]:
+            with self.subTest(path=path):
+                response = self.client.get(reverse("static", args=[path]))
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get("/static/story/..%2F..%2Fviews.py")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(ASSETS_CDN_FALLBACK=False, STATICFILES_DIRS=[])
+    def test_missing_assets(self):
+        errors = check_vendored_assets(None)
+        self.assertEqual([error.id for error in errors], ["story.E001"])
+        with self.assertRaisesMessage(ImproperlyConfigured, "vendor_assets"):
+            self.client.get(reverse("index"))
+        with override_settings(ASSETS_CDN_FALLBACK=True):
+            self.assertEqual(check_vendored_assets(None), [])
+
+    @override_settings(ASSETS_CDN_FALLBACK=True)
+    def test_vendored_assets(self):
+        name = "jquery@3.5.0/dist/jquery.min.js"
+        content = self.client.get(reverse("index")).content.decode()
+        self.assertIn(
+            f'src="{CDN_URL}{name}" integrity="{ASSETS[name]}" crossorigin="anonymous"',
+            content,
+        )
+        with tempfile.TemporaryDirectory() as static_dir:
+            path = os.path.join(static_dir, VENDOR_PATH, name)
+            os.makedirs(os.path.dirname(path))
+            with open(path, "w") as f:
+                f.write("window.jQuery = {};")
+            with override_settings(STATICFILES_DIRS=[static_dir]):
+                call_command("collectstatic", interactive=False, verbosity=0)
+                content = self.client.get(reverse("index")).content.decode()
+        self.assertRegex(
+            content,
+            r'src="/static/story/vendor/jquery@3\.5\.0/dist/jquery\.min\.[0-9a-f]{12}'
+            r'\.js"></script>',
+        )
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seed_board(stories=10, cards_per_story=5)
+        self.plain = self.client.get(reverse("stories")).content
+        cache.clear()
+
+    def test_snapshot(self):
+        for encoding, decompress in [
+            ("gzip", gzip.decompress),
+            ("br", brotli and brotli.decompress),
+        ]:
+            if decompress is None:
+                continue
+            with self.subTest(encoding=encoding):
+                response = self.client.get(
+                    reverse("stories"), HTTP_ACCEPT_ENCODING=f"deflate, {encoding}"
+                )
+                self.assertEqual(response["Content-Encoding"], encoding)
+                self.assertEqual(response["Vary"], "Accept-Encoding")
+                self.assertEqual(decompress(response.content), self.plain)
+                self.assertLess(len(response.content), len(self.plain) / 3)
+
+                response = self.client.get(
+                    reverse("stories"),
+                    HTTP_ACCEPT_ENCODING=encoding,
+                    HTTP_IF_NONE_MATCH=response["ETag"],
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_snapshot_is_compressed_once(self):
+        with mock.patch(
+            "story.compression.compress", wraps=compression.compress
+        ) as compress:
+            for i in range(3):
+                response = self.client.get(
+                    reverse("stories"), HTTP_ACCEPT_ENCODING="gzip, br"
+                )
+                self.assertIn("Content-Encoding", response)
+        self.assertEqual(compress.call_count, len(compression.get_encodings()))
+
+    def test_page(self):
+        response = self.client.get(
+            reverse("stories") + "?limit=5", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data["stories"]), 5)
+
+    def test_not_compressed(self):
+        for accept_encoding in ["", "identity", "gzip;q=0, br;q=0", "compress"]:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(
+                    reverse("stories"), HTTP_ACCEPT_ENCODING=accept_encoding
+                )
+                self.assertNotIn("Content-Encoding", response)
+                self.assertEqual(response.content, self.plain)
+        # Below COMPRESSION_MIN_SIZE.
+        cursor = json.loads(self.plain)["cursor"]
+        response = self.client.get(
+            reverse("stories_changes") + f"?since={cursor}",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertNotIn("Content-Encoding", response)
+        # The index page contains the CSRF token.
+        response = self.client.get(reverse("index"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
+
+
+class MultiBoardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Board.objects.create(slug="team-a", name="Team A")
+        self.story = Story.objects.create(title="Default story")
+        self.card = Card.objects.create(story=self.story, text="Default card")
+
+    def url(self, name, id=None):
+        kwargs = {"board": "team-a"}
+        if id is not None:
+            kwargs["id"] = id
+        return reverse(name, kwargs=kwargs)
+
+    def test_boards_are_separate(self):
+        default_version = Board.current("default")
+        response = self.client.post(self.url("stories"), {"title": "Team story"})
+        story_id = response.json()["id"]
+        response = self.client.post(
+            self.url("cards"), {"story": story_id, "status": "TODO", "text": "Task"}
+        )
+        self.assertEqual(response.json()["revision"], 2)
+        self.assertEqual(Card.objects.get(pk=response.json()["id"]).board_id, "team-a")
+
+        data = self.client.get(self.url("stories")).json()
+        self.assertEqual(data["cursor"], 2)
+        self.assertEqual([story["title"] for story in data["stories"]], ["Team story"])
+        self.assertEqual(data["stories"][0]["cards"][0]["text"], "Task")
+        data = self.client.get(self.url("stories_changes") + "?since=0").json()
+        self.assertEqual(len(data["stories"]), 1)
+        self.assertEqual(len(data["cards"]), 1)
+
+        data = self.client.get(reverse("stories")).json()
+        self.assertEqual(data["cursor"], default_version)
+        self.assertEqual(
+            [story["title"] for story in data["stories"]], ["Default story"]
+        )
+        self.assertIsNotNone(cache.get(board_snapshot_key("team-a")))
+        self.assertIsNotNone(cache.get(board_snapshot_key("default")))
+
+    def test_rows_of_other_boards(self):
+        data = {"story": self.story.pk, "status": "TODO", "text": "Task"}
+        response = self.client.post(self.url("cards"), data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("story", response.json())
+        response = self.client.post(self.url("cards_move", self.card.pk), data)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(
+            self.url("stories_detail", self.story.pk), urlencode({"title": "Mine"})
+        )
+        self.assertEqual(response.status_code, 404)
+        for name, pk in [
+            ("cards_detail", self.card.pk),
+            ("stories_detail", self.story.pk),
+        ]:
+            response = self.client.delete(self.url(name, pk))
+            self.assertEqual(response.status_code, 404)
+        operations = [{"op": "delete", "id": str(self.card.pk)}]
+        response = self.client.post(
+            self.url("cards_bulk"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["results"][0]["status"], 404)
+        self.assertFalse(Card.objects.get(pk=self.card.pk).done)
+        self.assertEqual(Board.current("team-a"), 0)
+
+    def test_create_board(self):
+        stdout = StringIO()
+        call_command("create_board", "team-b", name="Team B", stdout=stdout)
+        self.assertEqual(Board.objects.get(pk="team-b").name, "Team B")
+        response = self.client.get(reverse("stories", kwargs={"board": "team-b"}))
+        self.assertEqual(response.json(), {"cursor": 0, "stories": []})
+
+    def test_unknown_board(self):
+        kwargs = {"board": "missing"}
+        for method, name in [
+            ("get", "index"),
+            ("get", "stories"),
+            ("get", "stories_changes"),
+            ("post", "stories"),
+        ]:
+            with self.subTest(method=method, name=name):
+                response = getattr(self.client, method)(
+                    reverse(name, kwargs=kwargs), {"since": 0, "title": "T"}
+                )
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(Board.objects.filter(pk="missing").exists())
+
+    def test_index(self):
+        response = self.client.get(self.url("index"))
+        self.assertContains(response, 'const BASE_URL = "/boards/team-a";')
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'const BASE_URL = "";')
+
+    def test_events(self):
+        received = []
+
+        async def subscribe():
+            broker = InProcessBroker()
+            with broker.subscribe("team-a") as team_a, broker.subscribe("default"):
+                broker.publish("default", {"cursor": 1})
+                broker.publish("team-a", {"cursor": 2})
+                received.append(await team_a.get())
+            self.assertEqual(broker._subscriptions, {})
+
+        asyncio.run(subscribe())
+        self.assertEqual(received, [{"cursor": 2}])
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seed_board(stories=5, cards_per_story=4, users=3)
+        Board.objects.create(slug="copy")
+
+    def export(self):
+        response = self.client.get(reverse("export"))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return b"".join(response.streaming_content)
+
+    def board(self, board):
+        data = self.client.get(reverse("stories", kwargs={"board": board})).json()
+        return sorted(
+            (story["title"], sorted(card["text"] for card in story["cards"]))
+            for story in data["stories"]
+        )
+
+    def test_export_import(self):
+        lines = self.export().splitlines()
+        types = [json.loads(line)["type"] for line in lines]
+        self.assertEqual(types[0], "board")
+        self.assertEqual(types.count("story"), 5)
+        self.assertEqual(types.count("card"), 20)
+
+        response = self.client.post(
+            reverse("import", kwargs={"board": "copy"}) + "?new_ids=1",
+            b"\n".join(lines),
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(
+            response.json(),
+            {"cursor": 1, "imported": {"user": 3, "story": 5, "card": 20}},
+        )
+        self.assertEqual(self.board("copy"), self.board("default"))
+        self.assertEqual(
+            Card.objects.filter(board="copy", done=True).count(),
+            Card.objects.filter(board="default", done=True).count(),
+        )
+        self.assertFalse(Card.objects.exclude(board=F("story__board")).exists())
+
+    def test_export_ends_transaction_before_streaming(self):
+        savepoints = len(connection.savepoint_ids)
+        # Spooled to disk, which is read while the rows may change.
+        with mock.patch("story.transfer.SPOOL_SIZE", 100):
+            lines = export_board("default")
+            self.assertEqual(json.loads(next(lines))["type"], "board")
+        self.assertEqual(len(connection.savepoint_ids), savepoints)
+        self.assertEqual(len(list(lines)), 3 + 5 + 20)
+
+    def test_commands(self):
+        stdout = StringIO()
+        call_command("export_board", stdout=stdout)
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as f:
+            f.write(stdout.getvalue())
+            f.flush()
+            with self.assertRaisesMessage(CommandError, "import them with new ids"):
+                call_command("import_board", "copy", f.name, stdout=StringIO())
+            call_command(
+                "import_board",
+                "new",
+                f.name,
+                new_ids=True,
+                batch_size=3,
+                stdout=StringIO(),
+            )
+        self.assertEqual(self.board("new"), self.board("default"))
+        self.assertEqual(Story.objects.filter(board="copy").count(), 0)
+
+        with self.assertRaisesMessage(CommandError, "valid “slug”"):
+            call_command("import_board", "not a slug", os.devnull)
+        self.assertFalse(Board.objects.filter(pk="not a slug").exists())
+
+    def test_invalid_lines(self):
+        story = Story.objects.get(title="Story 0")
+        for body, line in [
+            (b'{"type": "board"}\n\n{"type": "story"}', 3),
+            (b'{"type": "planet", "id": "x"}', 1),
+            (b"[]", 1),
+            (b"{", 1),
+            (
+                b'{"type": "card", "id": "%s", "story": "%s", "text": "T"}'
+                % (str(uuid.uuid4()).encode(), str(story.pk).encode()),
+                None,
+            ),
+        ]:
+            with self.subTest(body=body):
+                response = self.client.post(
+                    reverse("import", kwargs={"board": "copy"}),
+                    body,
+                    content_type="application/x-ndjson",
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["line"], line)
+        self.assertEqual(Board.current("copy"), 0)
+
+
+class ExportApplicationTests(TransactionTestCase):
+    def test_export(self):
+        # The export is read on another thread, which needs committed rows.
+        seed_board(stories=5, cards_per_story=4, users=3)
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async def export(board):
+            await export_application({"type": "http"}, None, send, board)
+
+        asyncio.run(export("default"))
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        self.assertEqual(body, b"".join(self.client.get(reverse("export"))))
+
+        messages.clear()
+        asyncio.run(export("missing"))
+        self.assertEqual(messages[0]["status"], 404)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        response = self.client.post(reverse("stories"), {"title": "Release notes"})
+        self.story_id = response.json()["id"]
+        self.card_id = self.create_card("Write the <b>changelog</b> for the release")
+
+    def create_card(self, text, story_id=None):
+        data = {"story": story_id or self.story_id, "status": "TODO", "text": text}
+        return self.client.post(reverse("cards"), data).json()["id"]
+
+    def search(self, q, board=None, **params):
+        kwargs = {} if board is None else {"board": board}
+        response = self.client.get(reverse("search", kwargs=kwargs), {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["hits"]
+
+    def test_search(self):
+        hits = self.search("chang")
+        self.assertEqual(
+            hits,
+            [
+                {
+                    "type": "card",
+                    "id": self.card_id,
+                    "story": self.story_id,
+                    "snippet": "Write the &lt;b&gt;<mark>changelog</mark>&lt;/b&gt; "
+                    "for the release",
+                }
+            ],
+        )
+        hits = self.search("RELEASE")
+        self.assertEqual({hit["type"] for hit in hits}, {"story", "card"})
+        self.assertEqual(self.search("release notes")[0]["id"], self.story_id)
+        self.assertEqual(self.search("changelog notes"), [])
+        self.assertEqual(self.search("!!"), [])
+        self.assertEqual(len(self.search("release", limit=1)), 1)
+
+    def test_writes_update_the_index(self):
+        data = {"story": self.story_id, "status": "TODO", "text": "Tag the version"}
+        self.client.put(
+            reverse("cards_detail", args=[self.card_id]),
+            urlencode(data),
+            content_type="application/x-www-form-urlencoded",
+        )
+        self.assertEqual(self.search("changelog"), [])
+        self.assertEqual(self.search("tag")[0]["id"], self.card_id)
+
+        other_card_id = self.create_card("Other changelog")
+        self.client.delete(reverse("cards_detail", args=[other_card_id]))
+        self.assertEqual(self.search("other"), [])
+
+        operations = [
+            {
+                "op": "create",
+                "data": {"story": self.story_id, "status": "TODO", "text": "Bulk"},
+            }
+        ]
+        self.client.post(
+            reverse("cards_bulk"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+        self.assertEqual(len(self.search("bulk")), 1)
+
+        self.client.delete(reverse("stories_detail", args=[self.story_id]))
+        self.assertEqual(self.search("release tag bulk"), [])
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_upsert_fallback(self):
+        data = {"story": self.story_id, "status": "TODO", "text": "Tag the version"}
+        with mock.patch("story.db.can_upsert", return_value=False):
+            form = CardForm(data, board="default")
+            self.assertTrue(form.is_valid())
+            form.update(self.card_id)
+        self.assertEqual(self.search("changelog"), [])
+        self.assertEqual(self.search("tag")[0]["id"], self.card_id)
+
+    def test_boards(self):
+        Board.objects.create(slug="team-a")
+        self.assertEqual(self.search("release", board="team-a"), [])
+        response = self.client.get(
+            reverse("search", kwargs={"board": "missing"}), {"q": "release"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_parameters(self):
+        for params in [{}, {"q": ""}, {"q": "x", "limit": 0}, {"q": "x", "limit": 51}]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("search"), params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_imports_are_indexed(self):
+        Board.objects.create(slug="copy")
+        export = b"".join(self.client.get(reverse("export")).streaming_content)
+        self.client.post(
+            reverse("import", kwargs={"board": "copy"}) + "?new_ids=1",
+            export,
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(len(self.search("release", board="copy")), 2)
+
+    def test_rebuild_search_index(self):
+        story = Story.objects.create(title="Written before the index")
+        Card.objects.create(story=story, text="Indexed by the command")
+        Card.objects.create(story=story, text="Done command", done=True)
+        self.assertEqual(self.search("command"), [])
+
+        stdout = StringIO()
+        call_command("rebuild_search_index", stdout=stdout)
+        self.assertEqual(stdout.getvalue(), "Indexed 4 stories and cards.\n")
+        self.assertEqual(len(self.search("command")), 1)
+        self.assertEqual(len(self.search("release")), 2)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stories = [
+            self.client.post(reverse("stories"), {"title": title}).json()["id"]
+            for title in ["First", "Second"]
+        ]
+        self.cards = [
+            self.create_card(self.stories[0], "TODO", "alice"),
+            self.create_card(self.stories[0], "TODO", ""),
+            self.create_card(self.stories[1], "VERIFY", "bob"),
+        ]
+
+    def create_card(self, story, status, user):
+        data = {"story": story, "status": status, "text": "Task", "user": user}
+        return self.client.post(reverse("cards"), data).json()["id"]
+
+    def get_stats(self):
+        data = self.client.get(reverse("stats")).json()
+        del data["cursor"]
+        return data
+
+    def count_cards(self):
+        # The statistics as aggregated from the board.
+        board = self.client.get(reverse("stories")).json()
+        statuses = dict.fromkeys(Card.Status.values, 0)
+        totals = dict(statuses)
+        users = {}
+        stories = {}
+        for story in board["stories"]:
+            for card in story["cards"]:
+                totals[card["status"]] += 1
+                users.setdefault(card["user"]["name"], dict(statuses))
+                users[card["user"]["name"]][card["status"]] += 1
+                stories.setdefault(story["id"], dict(statuses))
+                stories[story["id"]][card["status"]] += 1
+        largest = {
+            status: max([counts[status] for counts in stories.values()], default=0)
+            for status in statuses
+        }
+        return {"statuses": totals, "users": users, "stories": stories, "max": largest}
+
+    def test_stats(self):
+        self.assertEqual(
+            self.get_stats(),
+            {
+                "statuses": {"TODO": 2, "IN_PROGRESS": 0, "VERIFY": 1, "DONE": 0},
+                "users": {
+                    "alice": {"TODO": 1, "IN_PROGRESS": 0, "VERIFY": 0, "DONE": 0},
+                    "": {"TODO": 1, "IN_PROGRESS": 0, "VERIFY": 0, "DONE": 0},
+                    "bob": {"TODO": 0, "IN_PROGRESS": 0, "VERIFY": 1, "DONE": 0},
+                },
+                "stories": {
+                    self.stories[0]: {
+                        "TODO": 2,
+                        "IN_PROGRESS": 0,
+                        "VERIFY": 0,
+                        "DONE": 0,
+                    },
+                    self.stories[1]: {
+                        "TODO": 0,
+                        "IN_PROGRESS": 0,
+                        "VERIFY": 1,
+                        "DONE": 0,
+                    },
+                },
+                "max": {"TODO": 2, "IN_PROGRESS": 0, "VERIFY": 1, "DONE": 0},
+            },
+        )
+        with self.assertNumQueries(1):
+            # Cached for the board's version.
+            self.client.get(reverse("stats"))
+
+    def test_writes_update_the_counts(self):
+        data = {"story": self.stories[1], "status": "DONE", "text": "Task"}
+        self.client.put(
+            reverse("cards_detail", args=[self.cards[0]]),
+            urlencode(dict(data, user="bob")),
+            content_type="application/x-www-form-urlencoded",
+        )
+        self.assertEqual(self.get_stats(), self.count_cards())
+
+        self.client.post(reverse("cards_move", args=[self.cards[1]]), data)
+        self.client.delete(reverse("cards_detail", args=[self.cards[2]]))
+        self.assertEqual(self.get_stats(), self.count_cards())
+
+        operations = [
+            {"op": "create", "data": dict(data, status="TODO", user="carol")},
+            {"op": "move", "id": self.cards[0], "data": dict(data, status="VERIFY")},
+            {"op": "delete", "id": self.cards[1]},
+        ]
+        self.client.post(
+            reverse("cards_bulk"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+        self.assertEqual(self.get_stats(), self.count_cards())
+
+        self.client.post(
+            reverse("users"),
+            {
+                "form-TOTAL_FORMS": 1,
+                "form-INITIAL_FORMS": 1,
+                "form-0-name": "bob",
+                "form-0-color": "",
+                "form-0-DELETE": "on",
+            },
+        )
+        self.assertEqual(self.get_stats(), self.count_cards())
+        self.assertNotIn("bob", self.get_stats()["users"])
+
+        self.client.delete(reverse("stories_detail", args=[self.stories[1]]))
+        self.assertEqual(self.get_stats(), self.count_cards())
+        self.assertEqual(self.get_stats()["statuses"]["TODO"], 0)
+
+    def test_imports_are_counted(self):
+        Board.objects.create(slug="copy")
+        export = b"".join(self.client.get(reverse("export")).streaming_content)
+        self.client.post(
+            reverse("import", kwargs={"board": "copy"}) + "?new_ids=1",
+            export,
+            content_type="application/x-ndjson",
+        )
+        data = self.client.get(reverse("stats", kwargs={"board": "copy"})).json()
+        self.assertEqual(data["statuses"], self.get_stats()["statuses"])
+
+    def test_burndown(self):
+        def burndown(**params):
+            response = self.client.get(reverse("burndown"), params)
+            self.assertEqual(response.status_code, 200)
+            return [
+                (day["date"], day["TODO"], day["DONE"])
+                for day in response.json()["days"]
+            ]
+
+        day = timezone.localdate() - timedelta(days=10)
+        Board.objects.update(stats_date=day)
+        with mock.patch("django.utils.timezone.localdate", return_value=day):
+            self.create_card(self.stories[1], "TODO", "")
+        later = day + timedelta(days=2)
+        with mock.patch("django.utils.timezone.localdate", return_value=later):
+            data = {"story": self.stories[0], "status": "DONE", "text": "Task"}
+            self.client.post(reverse("cards_move", args=[self.cards[0]]), data)
+        with mock.patch(
+            "django.utils.timezone.localdate", return_value=later + timedelta(days=1)
+        ):
+            self.assertEqual(
+                burndown(days=5),
+                [
+                    ((day - timedelta(days=1)).isoformat(), 0, 0),
+                    (day.isoformat(), 3, 0),
+                    ((day + timedelta(days=1)).isoformat(), 3, 0),
+                    (later.isoformat(), 2, 1),
+                    ((later + timedelta(days=1)).isoformat(), 2, 1),
+                ],
+            )
+            self.assertEqual(burndown(days=2), burndown(days=5)[3:])
+        self.assertEqual(len(burndown()), 14)
+
+    def test_invalid_burndown(self):
+        for params in [{"days": 0}, {"days": 1000}, {"days": "x"}]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("burndown"), params)
+                self.assertEqual(response.status_code, 400)
+        url = reverse("burndown", kwargs={"board": "missing"})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        url = reverse("stats", kwargs={"board": "missing"})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaMiddleware(self.record_database)
+
+    def record_database(self, request):
+        self.database = current_database.get()
+        return HttpResponse()
+
+    def test_middleware(self):
+        response = self.middleware(self.factory.get("/stories/"))
+        self.assertIn(self.database, ["replica1", "replica2"])
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+        self.assertIsNone(current_database.get())
+
+        # Writes and the requests shortly after them use the primary.
+        response = self.middleware(self.factory.post("/cards/"))
+        self.assertIsNone(self.database)
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]["max-age"], 5)
+        request = self.factory.get("/stories/")
+        request.COOKIES[PRIMARY_COOKIE] = "1"
+        self.middleware(request)
+        self.assertIsNone(self.database)
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            response = self.middleware(self.factory.post("/cards/"))
+            self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+            self.middleware(self.factory.get("/stories/"))
+            self.assertIsNone(self.database)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Card), "default")
+        token = current_database.set("replica2")
+        try:
+            # Test cases run in a transaction of the primary.
+            self.assertEqual(router.db_for_read(Card), "default")
+            with mock.patch.object(connection, "in_atomic_block", False):
+                self.assertEqual(router.db_for_read(Card), "replica2")
+            self.assertEqual(router.db_for_write(Card), "default")
+        finally:
+            current_database.reset(token)
+        self.assertIs(router.allow_migrate("default", "story"), True)
+        self.assertIs(router.allow_migrate("replica1", "story"), False)
+
+    def test_snapshot_cache_keeps_newer_version(self):
+        cache.clear()
+        Story.objects.create(title="My first Story")
+        build_board_snapshot("default", 5)
+        # Read from a replica lagging behind.
+        build_board_snapshot("default", 4)
+        self.assertEqual(cache.get(board_snapshot_key("default"))[0], 5)
@@ -0,0 +1,273 @@
+"""Streaming export and import of boards as NDJSON.
+
+An export has one JSON object per line: the board, the users assigned to its
+cards, its stories and its cards, each with a ``type``. Rows are read with
+``iterator()`` and written with ``bulk_create()`` in batches, so that memory
+use doesn't grow with the size of the board. Exports larger than
+``SPOOL_SIZE`` are spooled to a temporary file before they are sent.
+"""
+import asyncio
+import json
+import tempfile
+import threading
+import uuid
+
+from django.db import IntegrityError, connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Board, Card, Story, User
+from .ranks import RANK_RE
+from .search import update_index
+from .serializers import dumps
+from .stats import update_counts
+
+CHUNK_SIZE = 2000
+BATCH_SIZE = 500
+# Bytes per chunk of a streamed export.
+STREAM_CHUNK_SIZE = 64 * 1024
+# Bytes of an export kept in memory before it is spooled to disk.
+SPOOL_SIZE = 8 * 1024 * 1024
+
+STORY_FIELDS = ["id", "title", "link", "done", "done_at"]
+CARD_FIELDS = ["id", "story", "text", "status", "user", "rank", "done", "done_at"]
+
+
+class InvalidImport(Exception):
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+
+    def as_json(self):
+        return {"message": self.message, "line": self.line}
+
+
+def serialize_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def export_board(board):
+    """Return an iterator of the NDJSON lines exporting the board with the slug
+    ``board``. Raise ``Board.DoesNotExist`` if there is no such board.
+
+    The rows are read in one transaction, which gives a consistent export on
+    SQLite. PostgreSQL needs the REPEATABLE READ isolation level for that. The
+    export is written out before the transaction ends rather than while it is
+    streamed: on SQLite, the transaction blocks writers until it ends, which
+    would be as late as the slowest download.
+    """
+    board = Board.objects.get(pk=board)
+    f = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+    with transaction.atomic():
+        for line in _export_rows(board):
+            f.write(line)
+    f.seek(0)
+    return _read_lines(f)
+
+
+def _export_rows(board):
+    yield dumps({"type": "board", "slug": board.slug, "name": board.name}) + b"\n"
+    users = User.objects.filter(
+        name__in=Card.objects.filter(board=board).values("user")
+    ).values_list("name", "color")
+    for name, color in users.iterator(CHUNK_SIZE):
+        yield dumps({"type": "user", "name": name, "color": color}) + b"\n"
+    for model, fields, row_type in [
+        (Story, STORY_FIELDS, "story"),
+        (Card, CARD_FIELDS, "card"),
+    ]:
+        rows = model.objects.filter(board=board).values_list(*fields)
+        for row in rows.iterator(CHUNK_SIZE):
+            data = {"type": row_type}
+            data.update(zip(fields, map(serialize_value, row)))
+            yield dumps(data) + b"\n"
+
+
+def _read_lines(f):
+    with f:
+        yield from f
+
+
+def chunked(lines, size=STREAM_CHUNK_SIZE):
+    """Join ``lines`` into chunks of about ``size`` bytes."""
+    chunk = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield b"".join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def import_board(board, lines, new_ids=False, batch_size=BATCH_SIZE):
+    """Import the NDJSON ``lines`` of an export into the existing board with
+    the slug ``board`` in one transaction.
+
+    All rows get the same new revision of the board. Existing users keep their
+    colors. With ``new_ids``, stories and cards get new ids, e.g. to import an
+    export several times; they are derived from the old ids rather than kept
+    in a mapping.
+
+    Return the revision and the number of imported rows by type. Raise
+    ``InvalidImport`` if a line is invalid or the rows conflict with existing
+    ones, ``Board.DoesNotExist`` if there is no such board.
+    """
+    counts = {"user": 0, "story": 0, "card": 0}
+    batches = {"user": [], "story": [], "card": []}
+    models = {"user": User, "story": Story, "card": Card}
+
+    def flush(row_type):
+        objs = batches[row_type]
+        models[row_type].objects.bulk_create(objs, ignore_conflicts=row_type == "user")
+        if row_type != "user":
+            update_index(objs)
+            update_counts(added=objs)
+        counts[row_type] += len(objs)
+        objs.clear()
+
+    try:
+        with transaction.atomic():
+            revision = Board.bump(board)
+            namespace = uuid.uuid5(uuid.NAMESPACE_URL, f"scraty:{board}:{revision}")
+
+            def parse_id(value):
+                value = uuid.UUID(value)
+                return uuid.uuid5(namespace, str(value)) if new_ids else value
+
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                    row_type = data["type"]
+                    if row_type == "board":
+                        if data.get("name"):
+                            Board.objects.filter(pk=board, name="").update(
+                                name=data["name"]
+                            )
+                        continue
+                    obj = build_row(row_type, data, board, revision, parse_id)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    raise InvalidImport(f"Invalid line: {e!r}.", number)
+                batches[row_type].append(obj)
+                if len(batches[row_type]) >= batch_size:
+                    flush(row_type)
+            for row_type in batches:
+                flush(row_type)
+            if counts["user"]:
+                Board.users_changed()
+            if (
+                Card.objects.filter(board=board, revision=revision)
+                .exclude(story__board=board)
+                .exists()
+            ):
+                raise InvalidImport("Cards refer to stories of other boards.")
+    except IntegrityError as e:
+        raise InvalidImport(
+            f"The rows conflict with existing ones, import them with new ids: {e}."
+        )
+    return revision, counts
+
+
+def build_row(row_type, data, board, revision, parse_id):
+    if row_type == "user":
+        return User(name=data["name"], color=data.get("color", ""))
+    done_at = data.get("done_at")
+    common = {
+        "id": parse_id(data["id"]),
+        "board_id": board,
+        "done": bool(data.get("done", False)),
+        "done_at": parse_datetime(done_at) if done_at else None,
+        "revision": revision,
+    }
+    if row_type == "story":
+        return Story(title=data["title"], link=data.get("link", ""), **common)
+    if row_type == "card":
+        if data.get("status", Card.Status.TODO) not in Card.Status.values:
+            raise ValueError(f"Unknown status {data['status']!r}")
+        if not RANK_RE.match(data.get("rank", "")):
+            raise ValueError(f"Invalid rank {data['rank']!r}")
+        return Card(
+            story_id=parse_id(data["story"]),
+            text=data["text"],
+            status=data.get("status", Card.Status.TODO),
+            user_id=data.get("user") or None,
+            rank=data.get("rank", ""),
+            **common,
+        )
+    raise ValueError(f"Unknown type {row_type!r}")
+
+
+async def export_application(scope, receive, send, board):
+    """ASGI application streaming the export of the board with the slug
+    ``board``.
+
+    Django 3.2 iterates streaming responses in the event loop under ASGI, where
+    queries aren't allowed, so the export is read in a thread of its own and
+    handed over through a bounded queue.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=4)
+    stopped = threading.Event()
+
+    def put(chunk):
+        if not stopped.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+
+    def produce():
+        try:
+            try:
+                lines = export_board(board)
+            except Board.DoesNotExist:
+                put(None)
+                return
+            for chunk in chunked(lines):
+                if stopped.is_set():
+                    return
+                put(chunk)
+            put(b"")
+        finally:
+            connections.close_all()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        chunk = await queue.get()
+        if chunk is None:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 404,
+                    "headers": [(b"content-type", b"text/plain")],
+                }
+            )
+            await send({"type": "http.response.body", "body": b"Not found"})
+            return
+        filename = f'attachment; filename="{board}.ndjson"'
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/x-ndjson"),
+                    (b"content-disposition", filename.encode()),
+                ],
+            }
+        )
+        while chunk:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await queue.get()
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        # Unblock the producer if the client went away.
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
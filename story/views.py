@@ -1,114 +1,549 @@
+import json
+import mimetypes
+import os
+import posixpath
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db.models import Prefetch
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q
 from django.forms.models import modelformset_factory
-from django.http import QueryDict
-from django.http.response import HttpResponse, JsonResponse
+from django.http import Http404, QueryDict
+from django.http.response import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.csrf import ensure_csrf_cookie
-from django.views.decorators.http import require_http_methods, require_POST
-
-from .forms import CardForm, CardMoveForm, StoryForm
-from .models import Card, Story, User
-
-
-def serialize_card(card):
-    return {
-        "id": str(card.pk),
-        "text": card.text,
-        "status": card.status,
-        "user": (
-            {"name": card.user.name, "color": card.user.color}
-            if card.user
-            else {"name": "", "color": ""}
-        ),
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import (
+    require_GET,
+    require_http_methods,
+    require_POST,
+    require_safe,
+)
+from django.views.static import was_modified_since
+
+from .bulk import apply_card_operations, apply_operations
+from .compression import choose_encoding, compress_variants, variants_response
+from .db import update_returning
+from .events import get_broker
+from .forms import (
+    BoardFilterForm,
+    BurndownForm,
+    CardForm,
+    CardMoveForm,
+    Conflict,
+    SearchForm,
+    StoryForm,
+)
+from .metrics import registry
+from .models import ArchivedCard, ArchivedStory, Board, Card, Story, User
+from .search import search, update_index
+from .serializers import (
+    dumps,
+    serialize_archived_card,
+    serialize_archived_story,
+    serialize_board,
+    serialize_card,
+    serialize_card_change,
+    serialize_search_hit,
+    serialize_story,
+    serialize_story_change,
+)
+from .stats import get_burndown, get_stats, update_counts
+from .storage import SUFFIXES
+from .transfer import InvalidImport, chunked, export_board, import_board
+
+
+def board_snapshot_key(board):
+    return f"story:board-snapshot:{board}"
+
+
+def board_stats_key(board):
+    return f"story:board-stats:{board}"
+
+
+def board_changed(board, cursor, stories=(), cards=()):
+    """Drop the cached snapshot and statistics of the board and push the
+    written rows to its event stream once they are committed."""
+    event = {
+        "cursor": cursor,
+        "stories": [serialize_story_change(story) for story in stories],
+        "cards": [serialize_card_change(card) for card in cards],
     }
 
+    def notify():
+        cache.delete_many([board_snapshot_key(board), board_stats_key(board)])
+        get_broker().publish(board, event)
+
+    transaction.on_commit(notify)
+
+
+def cache_newer(key, value):
+    """Cache ``value``, a tuple starting with the board's version, unless a
+    newer version is cached, e.g. read from a replica that is further ahead."""
+    cached = cache.get(key)
+    if cached is None or cached[0] < value[0]:
+        cache.set(key, value, timeout=None)
+
+
+def get_cached_board_snapshot(board, version):
+    """Return the encoded board for the given version and its compressed
+    variants if they are cached. Other processes may have newer snapshots in
+    their local caches, hence the version check instead of relying on
+    invalidation alone."""
+    cached = cache.get(board_snapshot_key(board))
+    if cached is not None and cached[0] == version:
+        return cached[1:]
+    return None
 
-def serialize_story(story, with_cards=False):
-    data = {"id": str(story.pk), "title": story.title, "link": story.link}
-    if with_cards:
-        data["cards"] = [serialize_card(card) for card in story.cards.all()]
+
+def build_board_snapshot(board, version):
+    # Compressing once here saves compressing the largest response of the API
+    # on every request.
+    payload = dumps(serialize_board(board, version))
+    variants = compress_variants(payload)
+    cache_newer(board_snapshot_key(board), (version, payload, variants))
+    return payload, variants
+
+
+def build_board_page(board, version, user, status, q, after, limit):
+    """Return the encoded board narrowed down by the cleaned data of a
+    BoardFilterForm, with the id to continue after as ``next`` if there are
+    more stories."""
+    stories = Story.objects.filter(board=board, done=False).order_by("id")
+    cards = Card.objects.filter(board=board, done=False, story__done=False).order_by(
+        "story", "status", "rank"
+    )
+    if user:
+        cards = cards.filter(user=user)
+    if status:
+        cards = cards.filter(status__in=status)
+    if q:
+        cards = cards.filter(Q(text__icontains=q) | Q(story__title__icontains=q))
+    if user or status:
+        stories = stories.filter(pk__in=cards.values("story"))
+    elif q:
+        # Stories are found by their title even if they have no cards.
+        stories = stories.filter(
+            Q(pk__in=cards.values("story")) | Q(title__icontains=q)
+        )
+    if after:
+        stories = stories.filter(pk__gt=after)
+    next_story = None
+    if limit:
+        page = list(stories.values_list("pk", flat=True)[: limit + 1])
+        if len(page) > limit:
+            page = page[:limit]
+            next_story = str(page[-1])
+        stories = Story.objects.filter(pk__in=page).order_by("id")
+        cards = cards.filter(story__in=page)
+    data = serialize_board(board, version, stories, cards)
+    data["next"] = next_story
+    return dumps(data)
+
+
+def get_board_changes(board, since):
+    """Return the rows of the board written since the version ``since``.
+
+    Only rows whose ``revision`` was stamped with a bumped board version are
+    found, see ``Board``: rows inserted or updated with the ORM directly, e.g.
+    from a shell or fixtures, reach connected clients once they reload.
+    """
+    cursor = Board.current(board)
+    data = {"cursor": cursor, "stories": [], "cards": []}
+    if since < cursor:
+        stories = Story.objects.filter(board=board, revision__gt=since)
+        cards = Card.objects.filter(board=board, revision__gt=since)
+        data["stories"] = [serialize_story_change(story) for story in stories]
+        data["cards"] = [serialize_card_change(card) for card in cards]
     return data
 
 
-@ensure_csrf_cookie
-def index(request):
-    context = {"debug": settings.DEBUG, "base_url": settings.FORCE_SCRIPT_NAME or ""}
+# The read views are async so that they don't hold a thread while waiting for
+# slow clients under ASGI. Django 3.2 has neither an async ORM nor async-aware
+# view decorators: queries run through sync_to_async() and the checks done by
+# require_http_methods(), condition() and ensure_csrf_cookie() are inlined.
+#
+# All views of a board get the slug of the board as ``board``, see
+# scraty.urls. Unknown boards are answered with 404 by the first query.
+
+
+def get_board_version(board):
+    try:
+        return Board.current(board)
+    except Board.DoesNotExist:
+        raise Http404
+
+
+async def index(request, board):
+    await sync_to_async(get_board_version)(board)
+    # Send the CSRF cookie, like ensure_csrf_cookie().
+    get_token(request)
+    # The API of the board lives under the path of its index page.
+    context = {
+        "debug": settings.DEBUG,
+        "base_url": request.path.rstrip("/"),
+        "board": board,
+    }
     return render(request, "story/board.html", context=context)
 
 
-@require_http_methods(["GET", "POST"])
-def stories_view(request):
+def board_view(view):
+    """Answer requests to boards that don't exist with 404, as writes only
+    notice when bumping the board's version."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Board.DoesNotExist:
+            raise Http404
+
+    return wrapper
+
+
+@board_view
+def create_story(request, board):
+    form = StoryForm(request.POST, board=board)
+    if form.is_valid():
+        story = form.save()
+        board_changed(board, story.revision, stories=[story])
+        return JsonResponse(serialize_story(story))
+    return JsonResponse(form.errors.get_json_data(), status=400)
+
+
+async def stories_view(request, board):
     if request.method == "POST":
-        form = StoryForm(request.POST)
-        if form.is_valid():
-            story = form.save()
-            return JsonResponse(serialize_story(story))
+        return await sync_to_async(create_story)(request, board)
+    elif request.method != "GET":
+        return HttpResponseNotAllowed(["GET", "POST"])
+    form = BoardFilterForm(request.GET)
+    if not form.is_valid():
         return JsonResponse(form.errors.get_json_data(), status=400)
-    else:
-        cards_qs = Card.objects.filter(done=False).select_related("user")
-        stories = Story.objects.filter(done=False).prefetch_related(
-            Prefetch("cards", queryset=cards_qs),
+    # The version is read before the rows: rows written meanwhile are sent
+    # again by the next call to stories_changes_view, which is harmless.
+    version = await sync_to_async(get_board_version)(board)
+    # Weak, as the bytes depend on the negotiated Content-Encoding.
+    etag = "W/" + quote_etag(str(version))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if any(form.cleaned_data.values()):
+            # Compressed by CompressionMiddleware.
+            payload = await sync_to_async(build_board_page)(
+                board, version, **form.cleaned_data
+            )
+            response = HttpResponse(payload, content_type="application/json")
+        else:
+            # The cache backend may be the database.
+            snapshot = await sync_to_async(get_cached_board_snapshot)(board, version)
+            if snapshot is None:
+                snapshot = await sync_to_async(build_board_snapshot)(board, version)
+            payload, variants = snapshot
+            response = HttpResponse(payload, content_type="application/json")
+            variants_response(request, response, variants)
+    response["ETag"] = etag
+    return response
+
+
+async def stories_changes_view(request, board):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        since = int(request.GET.get("since", ""))
+    except ValueError:
+        return JsonResponse(
+            {"since": [{"message": "Enter a whole number.", "code": "invalid"}]},
+            status=400,
         )
-        data = {
-            "stories": [serialize_story(story, with_cards=True) for story in stories],
-        }
-        return JsonResponse(data)
+    try:
+        data = await sync_to_async(get_board_changes)(board, since)
+    except Board.DoesNotExist:
+        raise Http404
+    return HttpResponse(dumps(data), content_type="application/json")
+
+
+def get_board_stats(board):
+    """Return the encoded statistics of the board, cached like the board
+    snapshot."""
+    version = get_board_version(board)
+    cached = cache.get(board_stats_key(board))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    payload = dumps(dict(get_stats(board), cursor=version))
+    cache_newer(board_stats_key(board), (version, payload))
+    return payload
+
+
+async def stats_view(request, board):
+    """Return the number of open cards by status, by user and by story, see
+    story.stats."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    payload = await sync_to_async(get_board_stats)(board)
+    return HttpResponse(payload, content_type="application/json")
+
+
+def get_board_burndown(board, days):
+    try:
+        return get_burndown(board, days)
+    except Board.DoesNotExist:
+        raise Http404
+
+
+async def burndown_view(request, board):
+    """Return the number of open cards by status at the end of each of the
+    last ``days`` days."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    form = BurndownForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors.get_json_data(), status=400)
+    days = form.cleaned_data["days"] or BurndownForm.DEFAULT_DAYS
+    data = await sync_to_async(get_board_burndown)(board, days)
+    return HttpResponse(dumps({"days": data}), content_type="application/json")
+
+
+def get_search_hits(board, q, limit):
+    get_board_version(board)
+    return [serialize_search_hit(*hit) for hit in search(board, q, limit)]
+
+
+async def search_view(request, board):
+    """Return the open stories and cards matching ``q``, best first, with a
+    snippet of their text, see story.search."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    form = SearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors.get_json_data(), status=400)
+    hits = await sync_to_async(get_search_hits)(
+        board,
+        form.cleaned_data["q"],
+        form.cleaned_data["limit"] or SearchForm.DEFAULT_LIMIT,
+    )
+    return HttpResponse(dumps({"hits": hits}), content_type="application/json")
 
 
 @require_http_methods(["PUT", "DELETE"])
-def stories_detail_view(request, id):
+@board_view
+def stories_detail_view(request, board, id):
     if request.method == "DELETE":
-        story = get_object_or_404(Story, id=id, done=False)
-        story.done = True
-        story.save()
+        with transaction.atomic():
+            revision = Board.bump(board)
+            stories = update_returning(
+                Story.objects.filter(id=id, board=board, done=False),
+                done=True,
+                done_at=timezone.now(),
+                revision=revision,
+            )
+            if not stories:
+                # Roll back the bump.
+                raise Http404
+            update_index(stories)
+            board_changed(board, revision, stories=stories)
         return HttpResponse(status=204)
     elif request.method == "PUT":
-        story = get_object_or_404(Story, id=id, done=False)
-        form = StoryForm(QueryDict(request.body), instance=story)
-        if form.is_valid():
-            story = form.save()
-            return JsonResponse(serialize_story(story))
-        return JsonResponse(form.errors.get_json_data(), status=400)
+        form = StoryForm(QueryDict(request.body), board=board)
+        if not form.is_valid():
+            return JsonResponse(form.errors.get_json_data(), status=400)
+        try:
+            story = form.update(id)
+        except Story.DoesNotExist:
+            raise Http404
+        except Conflict as e:
+            return JsonResponse(serialize_story_change(e.instance), status=409)
+        board_changed(board, story.revision, stories=[story])
+        return JsonResponse(serialize_story(story))
     else:
         return HttpResponse(status=405)
 
 
 @require_POST
-def cards_view(request):
-    form = CardForm(request.POST)
+@board_view
+def cards_view(request, board):
+    form = CardForm(request.POST, board=board)
     if form.is_valid():
         card = form.save()
+        board_changed(board, card.revision, cards=[card])
         return JsonResponse(serialize_card(card))
     return JsonResponse(form.errors.get_json_data(), status=400)
 
 
 @require_http_methods(["PUT", "DELETE"])
-def cards_detail_view(request, id):
+@board_view
+def cards_detail_view(request, board, id):
     if request.method == "DELETE":
-        card = get_object_or_404(Card, id=id, done=False)
-        card.done = True
-        card.save()
+        with transaction.atomic():
+            revision = Board.bump(board)
+            cards = update_returning(
+                Card.objects.filter(id=id, board=board, done=False),
+                done=True,
+                done_at=timezone.now(),
+                revision=revision,
+            )
+            if not cards:
+                # Roll back the bump.
+                raise Http404
+            update_index(cards)
+            update_counts(removed=cards)
+            board_changed(board, revision, cards=cards)
         return HttpResponse(status=204)
     elif request.method == "PUT":
-        card = get_object_or_404(Card, id=id, done=False)
-        form = CardForm(QueryDict(request.body), instance=card)
-        if form.is_valid():
-            card = form.save()
-            return JsonResponse(serialize_card(card))
-        return JsonResponse(form.errors.get_json_data(), status=400)
+        form = CardForm(QueryDict(request.body), board=board)
+        if not form.is_valid():
+            return JsonResponse(form.errors.get_json_data(), status=400)
+        try:
+            card = form.update(id)
+        except Card.DoesNotExist:
+            raise Http404
+        except Conflict as e:
+            return JsonResponse(serialize_card_change(e.instance), status=409)
+        board_changed(board, card.revision, cards=[card])
+        return JsonResponse(serialize_card(card))
     else:
         return HttpResponse(status=405)
 
 
 @require_POST
-def cards_move_view(request, id):
-    card = get_object_or_404(Card, id=id, done=False)
-    form = CardMoveForm(request.POST, instance=card)
-    if form.is_valid():
-        card = form.save()
-        return JsonResponse(serialize_card(card))
-    return JsonResponse(form.errors.get_json_data(), status=400)
+@board_view
+def cards_move_view(request, board, id):
+    form = CardMoveForm(request.POST, board=board)
+    if not form.is_valid():
+        return JsonResponse(form.errors.get_json_data(), status=400)
+    try:
+        card = form.update(id)
+    except Card.DoesNotExist:
+        raise Http404
+    except Conflict as e:
+        return JsonResponse(serialize_card_change(e.instance), status=409)
+    board_changed(board, card.revision, cards=[card])
+    return JsonResponse(serialize_card(card))
+
+
+def read_operations(request):
+    """Return the list of operations in the JSON body of the request, or None
+    if there is none."""
+    try:
+        operations = json.loads(request.body)["operations"]
+        if not all(isinstance(operation, dict) for operation in operations):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return None
+    return operations
+
+
+def invalid_operations():
+    return JsonResponse(
+        {"operations": [{"message": "Expected a list.", "code": "invalid"}]},
+        status=400,
+    )
+
+
+@require_POST
+@board_view
+def cards_bulk_view(request, board):
+    operations = read_operations(request)
+    if operations is None:
+        return invalid_operations()
+    revision, results, cards = apply_card_operations(board, operations)
+    if cards:
+        board_changed(board, revision, cards=cards)
+    return JsonResponse({"cursor": revision, "results": results})
+
+
+@require_POST
+@board_view
+def sync_view(request, board):
+    """Apply the story and card writes a client queued while offline, in one
+    transaction, see story.bulk.apply_operations."""
+    operations = read_operations(request)
+    if operations is None:
+        return invalid_operations()
+    revision, results, stories, cards = apply_operations(board, operations)
+    if revision is not None:
+        board_changed(board, revision, stories=stories, cards=cards)
+    return JsonResponse({"cursor": revision, "results": results})
+
+
+@require_GET
+@board_view
+def export_view(request, board):
+    """Stream the board as NDJSON, see story.transfer.
+
+    Under ASGI, scraty.asgi serves exports instead.
+    """
+    response = StreamingHttpResponse(
+        chunked(export_board(board)), content_type="application/x-ndjson"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{board}.ndjson"'
+    return response
+
+
+@require_POST
+@board_view
+def import_view(request, board):
+    """Import an NDJSON export sent as the request body, which is read line by
+    line. ``?new_ids=1`` gives the stories and cards new ids."""
+    new_ids = request.GET.get("new_ids", "").lower() in {"1", "true", "yes"}
+    try:
+        revision, counts = import_board(board, request, new_ids=new_ids)
+    except InvalidImport as e:
+        return JsonResponse(e.as_json(), status=400)
+    board_changed(board, revision)
+    return JsonResponse({"cursor": revision, "imported": counts})
+
+
+@require_GET
+def archive_stories_view(request, board):
+    stories = ArchivedStory.objects.filter(board_id=board).order_by("-done_at", "pk")
+    paginator = Paginator(stories, 50)
+    page = paginator.get_page(request.GET.get("page"))
+    data = {
+        "page": page.number,
+        "num_pages": paginator.num_pages,
+        "stories": [serialize_archived_story(story) for story in page],
+    }
+    return JsonResponse(data)
+
+
+@require_GET
+def archive_stories_detail_view(request, board, id):
+    story = get_object_or_404(ArchivedStory, id=id, board_id=board)
+    cards = ArchivedCard.objects.filter(story_id=story.pk)
+    return JsonResponse(serialize_archived_story(story, cards=cards))
+
+
+@require_GET
+def archive_cards_detail_view(request, board, id):
+    card = get_object_or_404(ArchivedCard, id=id, board_id=board)
+    return JsonResponse(serialize_archived_card(card))
+
+
+@require_GET
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@require_GET
+def slow_requests_view(request):
+    return JsonResponse({"requests": registry.get_slow_requests()})
 
 
 def users(request):
@@ -118,8 +553,86 @@ def users(request):
     if request.method == "POST":
         formset = FormSet(request.POST)
         if formset.is_valid():
-            formset.save()
+            # User names and colors are part of the board snapshot, so the
+            # cards of changed users need a new revision.
+            names = [
+                form.initial.get("name")
+                for form in formset.initial_forms
+                if form.has_changed() or form in formset.deleted_forms
+            ]
+            with transaction.atomic():
+                removed = defaultdict(list)
+                for card in Card.objects.filter(done=False, user__in=names):
+                    removed[card.board_id].append(card)
+                # Saving users invalidates the user cache.
+                formset.save()
+                for board, cards in removed.items():
+                    revision = Board.bump(board)
+                    added = Card.objects.filter(pk__in=[card.pk for card in cards])
+                    added.update(revision=revision)
+                    # Deleted users are unassigned from their cards.
+                    added = list(added)
+                    update_counts(removed=cards, added=added)
+                    board_changed(board, revision, cards=added)
             return redirect("index")
     else:
         formset = FormSet(queryset=User.objects.all())
     return render(request, "story/users.html", context={"formset": formset})
+
+
+def find_static_file(path):
+    """Return the absolute path of a collected static file, falling back to
+    the static files finders for uncollected files, e.g. during development."""
+    try:
+        fullpath = staticfiles_storage.path(path)
+    except SuspiciousFileOperation:
+        return None
+    if os.path.isfile(fullpath):
+        return fullpath
+    return finders.find(path)
+
+
+@require_safe
+def static_view(request, path):
+    """Serve a static file, precompressed if the client accepts it.
+
+    Files with a hash in their name are cached for a year, see
+    story.storage.CompressedManifestStaticFilesStorage.
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    fullpath = find_static_file(path)
+    if fullpath is None:
+        raise Http404
+    content_type, _ = mimetypes.guess_type(path)
+    content_encoding = choose_encoding(
+        request,
+        [
+            encoding
+            for encoding, suffix in SUFFIXES.items()
+            if os.path.isfile(fullpath + suffix)
+        ],
+    )
+    if content_encoding is not None:
+        fullpath += SUFFIXES[content_encoding]
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(
+        request.headers.get("If-Modified-Since"), stat.st_mtime, stat.st_size
+    ):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            open(fullpath, "rb"),
+            content_type=content_type or "application/octet-stream",
+            filename=posixpath.basename(path),
+        )
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        if content_encoding:
+            response["Content-Encoding"] = content_encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    is_hashed = getattr(staticfiles_storage, "is_hashed", lambda name: False)
+    if is_hashed(path):
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={settings.STATIC_MAX_AGE}"
+    return response